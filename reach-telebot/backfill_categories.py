@@ -0,0 +1,85 @@
+# backfill_categories.py
+"""
+Re-map stored expenses onto the canonical category taxonomy (utils/categories.py).
+
+Streams the users collection page by page and sets each expense's
+category_id from its category label. Only users with an expense whose ID is
+missing or differs from what the current synonyms give are rewritten, so the
+job is cheap to re-run after the taxonomy changes. The original labels are
+kept. Interrupted runs resume with --start-after (the last user id logged).
+
+    python backfill_categories.py --dry-run
+    python backfill_categories.py --start-after 123456789
+"""
+import argparse
+import logging
+import sys
+from collections import Counter
+from utils import categories, firebase_client
+
+logger = logging.getLogger(__name__)
+
+def remap(raw_expenses: list) -> tuple:
+    """Returns (expenses with category IDs set, number changed)."""
+    changed = 0
+    remapped = []
+    for raw in raw_expenses:
+        category_id = categories.resolve(raw.get('category') or "")
+        if raw.get('category_id') != category_id:
+            raw = dict(raw, category_id=category_id)
+            changed += 1
+        remapped.append(raw)
+    return remapped, changed
+
+def backfill(page_size: int, start_after: str = None, dry_run: bool = False) -> Counter:
+    """Re-maps every user's expenses; returns counts of users, rewritten users, expenses and changes."""
+    totals = Counter()
+    for page in firebase_client.iter_user_documents(page_size, start_after):
+        for user_id, data in page:
+            totals["users"] += 1
+            raw_expenses = data.get('expenses') or []
+            totals["expenses"] += len(raw_expenses)
+            _, changed = remap(raw_expenses)
+            if not changed:
+                continue
+            if not dry_run:
+                # Remap what is stored now, inside a transaction, so an expense saved since the page
+                # was fetched is neither dropped nor overwritten
+                changes = {"count": 0}
+
+                def apply(stored):
+                    expenses, changes["count"] = remap(stored.get('expenses') or [])
+                    return {'expenses': expenses} if changes["count"] else None
+
+                try:
+                    firebase_client.update_user_document(int(user_id), apply)
+                except Exception as e:
+                    logger.error("Could not update user %s, skipped; re-run to retry: %s", user_id, e)
+                    totals["skipped_users"] += 1
+                    continue
+                changed = changes["count"]
+            totals["changed_expenses"] += changed
+            totals["rewritten_users"] += 1
+        logger.info("Backfilled through user %s: %s", page[-1][0], dict(totals))
+    return totals
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Re-map stored expenses onto the canonical categories.")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--start-after", help="Resume after this user id")
+    parser.add_argument("--dry-run", action="store_true", help="Count the changes without writing them")
+    args = parser.parse_args(argv)
+
+    if args.page_size < 1:
+        parser.error("--page-size must be positive")
+    totals = backfill(args.page_size, args.start_after, args.dry_run)
+    verb = "Would rewrite" if args.dry_run else "Rewrote"
+    print(f"{verb} {totals['changed_expenses']} of {totals['expenses']} expenses "
+          f"for {totals['rewritten_users']} of {totals['users']} users")
+    if totals["skipped_users"]:
+        print(f"Skipped {totals['skipped_users']} users that could not be updated; re-run to retry them")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# batch_jobs.py
+"""
+Offline pre-generation of goal suggestions and preset advice answers.
+
+Content that does not depend on a particular user is generated in bulk and
+served from utils.content_cache instead of calling OpenAI in real time:
+
+  1. prepare  - write every request in OpenAI batch JSONL format
+  2. run      - execute a request file against OPENAI_BASE_URL (or --base-url),
+                e.g. devtools/fake_openai.py; alternatively upload the file to the
+                OpenAI Batch API and download its output file
+  3. load     - read a results file and fill the suggestion and advice caches
+
+Every step is resumable: prepare skips content that is already cached, run
+skips requests that already have a successful result, and load is idempotent.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import uuid
+from config import SUPPORTED_LANGUAGES, OPENAI_API_KEY, OPENAI_BASE_URL
+from utils import content_cache
+from utils.openai_client import (
+    JSON_OBJECT, build_goal_suggestion_messages, build_advice_messages, parse_goal_suggestions
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+def _batch_line(custom_id: str, body: dict) -> dict:
+    return {"custom_id": custom_id, "method": "POST", "url": CHAT_COMPLETIONS_URL, "body": body}
+
+def iter_requests(model: str):
+    """Yields (section, cache_key, batch_request) for all pre-generatable content."""
+    # Imported here so the handlers' dependencies are only needed for `prepare`
+    from handlers.goals import INCOME_OPTIONS, FAMILY_OPTIONS, SPENDING_OPTIONS, CURRENT_SITUATION
+    from handlers.advice import PRESET_CATEGORIES, _build_ai_context
+    from utils.localization import get_text
+
+    for lang_code in SUPPORTED_LANGUAGES:
+        for income_level, income_text in INCOME_OPTIONS.items():
+            for family_option, family_text in FAMILY_OPTIONS.items():
+                for spending_option, spending_text in SPENDING_OPTIONS.items():
+                    key = content_cache.suggestion_key(income_level, family_option, spending_option, lang_code)
+                    messages = build_goal_suggestion_messages(
+                        income_text, family_text, f"{spending_text}. {CURRENT_SITUATION}", lang_code
+                    )
+                    body = {"model": model, "messages": messages, "response_format": JSON_OBJECT}
+                    yield "suggestions", key, _batch_line(f"suggestions|{key}", body)
+
+        for category in PRESET_CATEGORIES:
+            key = content_cache.advice_key(category, lang_code)
+            question = get_text(f"advice_question_{category}", lang_code)
+            prompt = _build_ai_context(None, [], [], question, lang_code)
+            body = {"model": model, "messages": build_advice_messages(prompt, lang_code)}
+            yield "advice", key, _batch_line(f"advice|{key}", body)
+
+def prepare(out_path: str, model: str, include_cached: bool = False) -> int:
+    """Writes a batch request file, skipping content that is already cached."""
+    count = 0
+    with open(out_path, 'w', encoding='utf-8') as f:
+        for section, key, line in iter_requests(model):
+            if not include_cached and content_cache.has_entry(section, key):
+                continue
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    logger.info("Wrote %s batch requests to %s", count, out_path)
+    return count
+
+def _completed_ids(results_path: str) -> set:
+    """Returns custom_ids that already have a successful result."""
+    done = set()
+    if os.path.exists(results_path):
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                if (result.get("response") or {}).get("status_code") == 200:
+                    done.add(result["custom_id"])
+    return done
+
+def run(requests_path: str, results_path: str, base_url: str = None) -> int:
+    """Executes a request file locally, appending results in batch output format."""
+    from openai import OpenAI
+
+    client = OpenAI(api_key=OPENAI_API_KEY, base_url=base_url or OPENAI_BASE_URL, max_retries=0)
+    done = _completed_ids(results_path)
+    processed = 0
+    with open(requests_path, 'r', encoding='utf-8') as requests_file, \
+            open(results_path, 'a', encoding='utf-8') as results_file:
+        for line in requests_file:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            custom_id = request["custom_id"]
+            if custom_id in done:
+                continue
+            result = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": custom_id, "response": None, "error": None}
+            try:
+                response = client.chat.completions.create(**request["body"])
+                result["response"] = {"status_code": 200, "request_id": response.id, "body": response.model_dump()}
+            except Exception as e:
+                logger.error("Request %s failed: %s", custom_id, e)
+                result["error"] = {"code": type(e).__name__, "message": str(e)}
+            # Flush per line so an interrupted run resumes where it stopped
+            results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            results_file.flush()
+            processed += 1
+    logger.info("Processed %s requests (%s already completed)", processed, len(done))
+    return processed
+
+def load(results_path: str) -> int:
+    """Loads successful results into the content cache."""
+    loaded = 0
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            section, key = result["custom_id"].split("|", 1)
+            choices = response["body"].get("choices") or []
+            if not choices:
+                continue
+            content = (choices[0]["message"].get("content") or "").strip()
+            if section == "suggestions":
+                suggestions = parse_goal_suggestions(content)
+                if not suggestions:
+                    logger.warning("Skipping %s: no usable suggestions", key)
+                    continue
+                content_cache.put_suggestions(key, suggestions)
+            elif section == "advice" and content:
+                content_cache.put_advice(key, content)
+            else:
+                continue
+            loaded += 1
+    content_cache.save()
+    logger.info("Loaded %s cache entries from %s", loaded, results_path)
+    return loaded
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate goal suggestions and advice answers offline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prepare_parser = subparsers.add_parser("prepare", help="Write OpenAI batch request JSONL")
+    prepare_parser.add_argument("--out", required=True)
+    prepare_parser.add_argument("--model", default=DEFAULT_MODEL)
+    prepare_parser.add_argument("--include-cached", action="store_true", help="Also regenerate cached entries")
+
+    run_parser = subparsers.add_parser("run", help="Execute a request file against an OpenAI-compatible endpoint")
+    run_parser.add_argument("--requests", required=True)
+    run_parser.add_argument("--results", required=True)
+    run_parser.add_argument("--base-url", help="Defaults to OPENAI_BASE_URL")
+
+    load_parser = subparsers.add_parser("load", help="Load a batch results file into the content cache")
+    load_parser.add_argument("--results", required=True)
+
+    args = parser.parse_args(argv)
+    if args.command == "prepare":
+        prepare(args.out, args.model, args.include_cached)
+    elif args.command == "run":
+        run(args.requests, args.results, args.base_url)
+    elif args.command == "load":
+        load(args.results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# benchmark_providers.py
+"""
+Compare LLM providers (utils/llm_providers.py) on a fixed sample set.
+
+Each sample is sent straight to each provider, skipping the routes, the
+request coalescing and the rate limits. The report gives latency (p50, p95)
+and a quality score per provider and task:
+
+    parse   - the amount matches and the category maps to the expected
+              canonical category (utils/categories.py)
+    suggest - at least three goals with a name and a description come back
+    advise  - a non-empty answer, mostly in the script of the asked language
+
+    python benchmark_providers.py
+    LOCAL_LLM_MODEL_PATH=models/qwen2.5-1.5b-instruct-q4_k_m.gguf python benchmark_providers.py --providers local,openai --repeat 3
+"""
+import argparse
+import json
+import sys
+import time
+import unicodedata
+from utils import categories, llm_providers
+from utils.llm_pipeline import LLMUnavailableError
+from utils.openai_client import (
+    build_expense_messages, build_goal_suggestion_messages, build_advice_messages, parse_goal_suggestions
+)
+
+PARSE_SAMPLES = (
+    ("en", "12.50 lunch at the hawker centre", 12.5, "food"),
+    ("en", "Paid 450 for dorm rent", 450, "housing"),
+    ("en", "MRT top up 20", 20, "transport"),
+    ("en", "sent 300 home to my mother", 300, "remittance"),
+    ("en", "30 sgd phone bill", 30, "utilities"),
+    ("en", "medicine from the pharmacy 8.90", 8.9, "health"),
+    ("en", "groceries at NTUC 46.20", 46.2, "groceries"),
+    ("bn", "দুপুরের খাবার 6", 6, "food"),
+    ("bn", "বাসা ভাড়া 400", 400, "housing"),
+    ("bn", "বাড়িতে টাকা পাঠালাম 250", 250, "remittance"),
+    ("ta", "மதிய உணவு 5.50", 5.5, "food"),
+    ("ta", "பேருந்து கட்டணம் 2", 2, "transport"),
+    ("ta", "மருந்து 15", 15, "health"),
+)
+SUGGEST_SAMPLES = (
+    ("en", "1000-1500 SGD per month", "Supporting parents and two children", "Spends most income on living costs"),
+    ("bn", "Below 1000 SGD per month", "Supporting a spouse", "Has a loan from the recruitment agent"),
+    ("ta", "1500-2000 SGD per month", "No dependants", "Wants to start saving"),
+)
+ADVISE_SAMPLES = (
+    ("en", "How can I save money when my salary is small?"),
+    ("en", "Is it better to pay off my agent loan or save first?"),
+    ("bn", "আমি কীভাবে প্রতি মাসে কিছু টাকা জমাতে পারি?"),
+    ("ta", "வீட்டுக்கு பணம் அனுப்ப மலிவான வழி எது?"),
+)
+# Unicode script names to look for in answers, by language
+SCRIPTS = {"bn": "BENGALI", "ta": "TAMIL", "en": "LATIN"}
+
+def score_parse(content: str, amount: float, category: str) -> float:
+    try:
+        data = json.loads(content)
+        parsed_amount = float(data.get("amount"))
+    except (TypeError, ValueError, AttributeError):
+        return 0.0
+    amount_ok = abs(parsed_amount - amount) < 0.01
+    category_ok = categories.key_for(categories.resolve(str(data.get("category") or ""))) == category
+    return (amount_ok + category_ok) / 2
+
+def score_suggest(content: str) -> float:
+    goals = [g for g in parse_goal_suggestions(content) if isinstance(g, dict) and g.get("goal") and g.get("description")]
+    return 1.0 if len(goals) >= 3 else len(goals) / 3
+
+def score_advise(content: str, lang_code: str) -> float:
+    letters = [c for c in content if c.isalpha()]
+    if not letters:
+        return 0.0
+    script = SCRIPTS.get(lang_code, "LATIN")
+    in_script = sum(unicodedata.name(c, "").startswith(script) for c in letters)
+    return 1.0 if in_script / len(letters) >= 0.5 else 0.5
+
+def cases(task: str):
+    """Yields (messages, json_mode, scorer) for a task's samples."""
+    if task == "parse":
+        for lang_code, text, amount, category in PARSE_SAMPLES:
+            yield build_expense_messages(text, lang_code), True, lambda c, a=amount, k=category: score_parse(c, a, k)
+    elif task == "suggest":
+        for lang_code, income, family, situation in SUGGEST_SAMPLES:
+            yield build_goal_suggestion_messages(income, family, situation, lang_code), True, score_suggest
+    elif task == "advise":
+        for lang_code, question in ADVISE_SAMPLES:
+            yield build_advice_messages(question, lang_code), False, lambda c, l=lang_code: score_advise(c, l)
+
+def _percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+def benchmark(provider: str, task: str, repeat: int) -> dict:
+    latencies, scores, errors = [], [], 0
+    for _ in range(repeat):
+        for messages, json_mode, scorer in cases(task):
+            started = time.perf_counter()
+            try:
+                content = llm_providers.complete(task, messages, json_mode=json_mode, providers=[provider])
+            except LLMUnavailableError:
+                errors += 1
+                scores.append(0.0)
+                continue
+            latencies.append(time.perf_counter() - started)
+            scores.append(scorer(content))
+    return {
+        "provider": provider, "task": task, "requests": len(scores), "errors": errors,
+        "p50_s": round(_percentile(latencies, 0.5), 3), "p95_s": round(_percentile(latencies, 0.95), 3),
+        "quality": round(sum(scores) / len(scores), 3) if scores else 0.0,
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare LLM providers on latency and quality.")
+    parser.add_argument("--providers", default="openai,local", help="Comma-separated provider names")
+    parser.add_argument("--tasks", default=",".join(llm_providers.TASKS), help="Comma-separated tasks")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs over the sample set")
+    parser.add_argument("--json", dest="json_out", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    tasks = [t.strip() for t in args.tasks.split(",") if t.strip()]
+    if set(tasks) - set(llm_providers.TASKS) or args.repeat < 1:
+        parser.error(f"--tasks must be among {', '.join(llm_providers.TASKS)} and --repeat positive")
+    results = []
+    for provider in (p.strip() for p in args.providers.split(",") if p.strip()):
+        instance = llm_providers.get_provider(provider)
+        if instance is None or not instance.available():
+            print(f"{provider}: unavailable, skipped", file=sys.stderr)
+            continue
+        for task in tasks:
+            results.append(benchmark(provider, task, args.repeat))
+
+    print(f"{'provider':<10}{'task':<10}{'requests':>9}{'errors':>8}{'p50 s':>9}{'p95 s':>9}{'quality':>9}")
+    for r in results:
+        print(f"{r['provider']:<10}{r['task']:<10}{r['requests']:>9}{r['errors']:>8}"
+              f"{r['p50_s']:>9.3f}{r['p95_s']:>9.3f}{r['quality']:>9.3f}")
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0 if results else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# campaign.py
+"""
+Broadcast announcements to user segments.
+
+    python campaign.py backfill-index                 # index existing users once
+    python campaign.py segment "language=ta,income<=2,goal_type=remittance"
+    python campaign.py create --segment "language=ta,income<=2" --text en="..." --text ta="..."
+    python campaign.py start <id>                     # sends; Ctrl-C or `pause` stops at a checkpoint
+    python campaign.py pause <id> | cancel <id> | status [<id>]
+
+Starting a paused campaign resumes where it stopped. Admins can also list,
+start, pause and cancel campaigns from the bot with /campaigns.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from telegram import Bot
+import config
+from utils import campaigns, segments
+
+logger = logging.getLogger(__name__)
+
+def _parse_texts(values: list) -> dict:
+    texts = {}
+    for value in values:
+        language, sep, text = value.partition("=")
+        if not sep or not text.strip():
+            raise ValueError(f"--text must look like LANG=TEXT, got '{value}'")
+        texts[language.strip()] = text.replace("\\n", "\n")
+    return texts
+
+async def _start(campaign_id: str, force: bool) -> dict:
+    kwargs = {"base_url": config.TELEGRAM_API_BASE_URL} if config.TELEGRAM_API_BASE_URL else {}
+    async with Bot(config.TELEGRAM_BOT_TOKEN, **kwargs) as bot:
+        return await campaigns.run(bot, campaign_id, force)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Send announcements to user segments.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backfill_parser = subparsers.add_parser("backfill-index", help="Index all existing users")
+    backfill_parser.add_argument("--page-size", type=int, default=500)
+
+    segment_parser = subparsers.add_parser("segment", help="Count the users in a segment")
+    segment_parser.add_argument("segment")
+
+    create_parser = subparsers.add_parser("create", help="Create a campaign for a segment")
+    create_parser.add_argument("--segment", required=True)
+    create_parser.add_argument("--text", action="append", required=True,
+                               help="LANG=TEXT; repeat per language. Users get their language or the default")
+
+    start_parser = subparsers.add_parser("start", help="Send a ready or paused campaign")
+    start_parser.add_argument("campaign_id")
+    start_parser.add_argument("--force", action="store_true", help="Take over a campaign left running by a dead runner")
+
+    for name, help_text in (("pause", "Pause a campaign at its next checkpoint"), ("cancel", "Cancel a campaign")):
+        subparsers.add_parser(name, help=help_text).add_argument("campaign_id")
+
+    status_parser = subparsers.add_parser("status", help="Show campaign progress and delivery stats")
+    status_parser.add_argument("campaign_id", nargs="?")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "backfill-index":
+            print(f"Indexed {segments.backfill(args.page_size)} users")
+        elif args.command == "segment":
+            print(f"{len(segments.resolve(args.segment))} users match {args.segment}")
+        elif args.command == "create":
+            campaign = campaigns.create(args.segment, _parse_texts(args.text))
+            print(campaigns.format_campaign(campaign))
+        elif args.command == "start":
+            try:
+                print(campaigns.format_campaign(asyncio.run(_start(args.campaign_id, args.force))))
+            except KeyboardInterrupt:
+                print(campaigns.format_campaign(campaigns.get(args.campaign_id)))
+        elif args.command == "pause":
+            print(campaigns.format_campaign(campaigns.pause(args.campaign_id)))
+        elif args.command == "cancel":
+            print(campaigns.format_campaign(campaigns.cancel(args.campaign_id)))
+        elif args.command == "status":
+            found = [campaigns.get(args.campaign_id)] if args.campaign_id else campaigns.list_campaigns()
+            for campaign in filter(None, found):
+                print(campaigns.format_campaign(campaign))
+    except (ValueError, campaigns.CampaignError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,34 +2,186 @@
 import os
 import logging
 from dotenv import load_dotenv
+from utils.logging_setup import setup_logging
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Logging (see utils/logging_setup.py). LOG_LEVELS sets per-logger levels, e.g. "httpx=WARNING,handlers.goals=DEBUG";
+# LOG_FORMAT is json or text; only every LOG_DEBUG_SAMPLE_EVERY-th DEBUG record per message is kept
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = {
+    name.strip(): level.strip().upper()
+    for name, level in (item.split('=', 1) for item in os.getenv("LOG_LEVELS", "httpx=WARNING").split(',') if '=' in item)
+}
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_DEBUG_SAMPLE_EVERY = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "10"))
+if LOG_FORMAT not in ("json", "text"):
+    raise ValueError(f"Unknown LOG_FORMAT '{LOG_FORMAT}'")
+setup_logging(LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_DEBUG_SAMPLE_EVERY)
+logger = logging.getLogger(__name__)
 
 # Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")  # Optional, e.g. http://127.0.0.1:8081/bot for devtools/fake_telegram.py
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Optional, e.g. a local stub server for testing
 FIREBASE_SERVICE_ACCOUNT_KEY_PATH = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY_PATH")
+# "firestore" (default), "emulator" (uses FIRESTORE_EMULATOR_HOST) or "memory" (in-process fake)
+FIRESTORE_BACKEND = os.getenv("FIRESTORE_BACKEND", "firestore").lower()
+FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID", "reach-telebot-local")
+
+def _parse_mapping(value: str) -> dict:
+    """Parses 'key=value,key=value' settings into a dict of floats."""
+    mapping = {}
+    for item in (value or "").split(','):
+        if '=' in item:
+            key, val = item.split('=', 1)
+            mapping[key.strip()] = float(val)
+    return mapping
+
+# OpenAI call pipeline
+OPENAI_FALLBACK_MODELS = [m.strip() for m in os.getenv("OPENAI_FALLBACK_MODELS", "").split(',') if m.strip()]
+OPENAI_MODEL_TIMEOUTS = _parse_mapping(os.getenv("OPENAI_MODEL_TIMEOUTS", "gpt-3.5-turbo=20"))
+OPENAI_DEFAULT_TIMEOUT = float(os.getenv("OPENAI_DEFAULT_TIMEOUT", "30"))
+OPENAI_HEDGE_DELAY = float(os.getenv("OPENAI_HEDGE_DELAY", "0"))  # Seconds; 0 disables hedged requests
+OPENAI_BREAKER_FAILURES = int(os.getenv("OPENAI_BREAKER_FAILURES", "5"))
+OPENAI_BREAKER_COOLDOWN = float(os.getenv("OPENAI_BREAKER_COOLDOWN", "30"))
+
+def _parse_routes(value: str) -> dict:
+    """Parses 'task=provider,provider;task=provider' into {task: [provider, ...]}."""
+    routes = {}
+    for item in (value or "").split(';'):
+        if '=' in item:
+            task, providers = item.split('=', 1)
+            routes[task.strip()] = [p.strip() for p in providers.split(',') if p.strip()]
+    return routes
+
+# LLM providers (see utils/llm_providers.py). LLM_ROUTES lists the providers tried in order for each task
+# (parse, suggest, advise), e.g. "parse=local,openai;advise=local,openai"; tasks not listed use openai.
+# "local" runs the GGUF model at LOCAL_LLM_MODEL_PATH on the CPU with llama.cpp (LOCAL_LLM_THREADS=0: its default)
+LLM_ROUTES = _parse_routes(os.getenv("LLM_ROUTES", ""))
+LLM_PROVIDER_CONCURRENCY = _parse_mapping(os.getenv("LLM_PROVIDER_CONCURRENCY", "openai=16,local=1"))
+LLM_PROVIDER_TIMEOUTS = _parse_mapping(os.getenv("LLM_PROVIDER_TIMEOUTS", "openai=60,local=20"))
+LOCAL_LLM_MODEL_PATH = os.getenv("LOCAL_LLM_MODEL_PATH", "")
+LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", "0"))
+LOCAL_LLM_CONTEXT = int(os.getenv("LOCAL_LLM_CONTEXT", "2048"))
+LOCAL_LLM_MAX_TOKENS = int(os.getenv("LOCAL_LLM_MAX_TOKENS", "384"))
+
+# Advice sessions (see utils/advice_sessions.py): each /ask prompt stays under ADVICE_PROMPT_TOKENS; turns beyond
+# the latest ADVICE_SESSION_TURNS are folded into a summary of about ADVICE_SUMMARY_TOKENS; idle sessions end
+ADVICE_PROMPT_TOKENS = int(os.getenv("ADVICE_PROMPT_TOKENS", "1500"))
+ADVICE_SESSION_TURNS = int(os.getenv("ADVICE_SESSION_TURNS", "4"))
+ADVICE_SUMMARY_TOKENS = int(os.getenv("ADVICE_SUMMARY_TOKENS", "250"))
+ADVICE_SESSION_IDLE_HOURS = float(os.getenv("ADVICE_SESSION_IDLE_HOURS", "24"))
+
+# LLM rate limits (see utils/rate_limit.py); requests beyond the burst are queued up to LLM_MAX_QUEUE_SECONDS
+LLM_USER_RATE_PER_MINUTE = float(os.getenv("LLM_USER_RATE_PER_MINUTE", "6"))
+LLM_USER_BURST = float(os.getenv("LLM_USER_BURST", "3"))
+LLM_GLOBAL_RATE_PER_MINUTE = float(os.getenv("LLM_GLOBAL_RATE_PER_MINUTE", "300"))
+LLM_GLOBAL_BURST = float(os.getenv("LLM_GLOBAL_BURST", "20"))
+LLM_MAX_QUEUE_SECONDS = float(os.getenv("LLM_MAX_QUEUE_SECONDS", "15"))
+
+# Pre-generated LLM content (see batch_jobs.py)
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+CONTENT_CACHE_PATH = os.getenv("CONTENT_CACHE_PATH", os.path.join(DATA_DIR, "content_cache.json"))
+
+# Persistent runtime state (see utils/state_store.py): "sqlite" (default), "firestore" or "memory"
+STATE_STORE_BACKEND = os.getenv("STATE_STORE_BACKEND", "sqlite").lower()
+STATE_STORE_PATH = os.getenv("STATE_STORE_PATH", os.path.join(DATA_DIR, "state.db"))
+
+# Local journal of user document writes, replayed to Firestore after failures (see utils/write_journal.py)
+WRITE_JOURNAL_PATH = os.getenv("WRITE_JOURNAL_PATH", os.path.join(DATA_DIR, "write_journal.db"))
+WRITE_JOURNAL_REPLAY_SECONDS = float(os.getenv("WRITE_JOURNAL_REPLAY_SECONDS", "5"))
+
+# Worker processes for the sharded supervisor mode (main.py --workers); 1 runs a single process
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# Updates processed at once per process; each user's updates still run one at a time, in order
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+
+# Eviction of idle users' context.user_data (see utils/memory_manager.py); MEMORY_LIMIT_MB=0 disables the RSS cap
+USER_DATA_TTL_SECONDS = int(os.getenv("USER_DATA_TTL_SECONDS", str(6 * 3600)))
+USER_DATA_MAX_USERS = int(os.getenv("USER_DATA_MAX_USERS", "50000"))
+MEMORY_LIMIT_MB = float(os.getenv("MEMORY_LIMIT_MB", "0"))
+USER_DATA_SWEEP_SECONDS = int(os.getenv("USER_DATA_SWEEP_SECONDS", "300"))
+USER_DATA_OFFLOAD_DAYS = int(os.getenv("USER_DATA_OFFLOAD_DAYS", "30"))
+
+# Processes rendering chart images (see utils/charts.py)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+
+# Receipt photos (see handlers/receipts.py): OCR processes, Tesseract languages (e.g. "eng+ben+tam"),
+# largest accepted photo and photos a user may have waiting at once
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "1"))
+OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "eng")
+RECEIPT_MAX_MB = float(os.getenv("RECEIPT_MAX_MB", "5"))
+RECEIPT_QUEUE_PER_USER = int(os.getenv("RECEIPT_QUEUE_PER_USER", "3"))
+
+# Local expense categorizer (see utils/category_model.py): the LLM is skipped when the model is at least
+# this confident; retrained by a background job every CATEGORY_MODEL_RETRAIN_HOURS (0 disables)
+CATEGORY_MODEL_PATH = os.getenv("CATEGORY_MODEL_PATH", os.path.join(DATA_DIR, "category_model.npz"))
+CATEGORY_MODEL_THRESHOLD = float(os.getenv("CATEGORY_MODEL_THRESHOLD", "0.9"))
+CATEGORY_MODEL_RETRAIN_HOURS = float(os.getenv("CATEGORY_MODEL_RETRAIN_HOURS", "24"))
+
+# Diagnostics (see utils/profiling.py); SLOW_UPDATE_SECONDS=0 disables the slow-update tracer
+SLOW_UPDATE_SECONDS = float(os.getenv("SLOW_UPDATE_SECONDS", "2"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+PROFILE_SIGNAL_SECONDS = int(os.getenv("PROFILE_SIGNAL_SECONDS", "30"))
+
+# Broadcast campaigns (see utils/campaigns.py); Telegram allows about 30 bulk messages per second
+CAMPAIGN_RATE_PER_SECOND = float(os.getenv("CAMPAIGN_RATE_PER_SECOND", "25"))
+# Campaign messages in flight at once per runner, so send latency does not cap the rate
+CAMPAIGN_CONCURRENCY = int(os.getenv("CAMPAIGN_CONCURRENCY", "10"))
+
+# Expense totals are kept in HOME_CURRENCY, converted with the rate table at FX_RATES_PATH (see utils/fx.py)
+HOME_CURRENCY = os.getenv("HOME_CURRENCY", "USD").strip().upper()
+FX_RATES_PATH = os.getenv("FX_RATES_PATH", os.path.join(DATA_DIR, "fx_rates.json"))
+
+# Telegram user ids allowed to use admin commands such as /metrics and /campaigns
+ADMIN_USER_IDS = {int(uid) for uid in os.getenv("ADMIN_USER_IDS", "").split(',') if uid.strip()}
 
 # Language settings
 DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "en")
 SUPPORTED_LANGUAGES = [lang.strip() for lang in os.getenv("SUPPORTED_LANGUAGES", "en,bn,ta").split(',')]
+# Seconds between checks of locales/*.json for edits (see utils/localization.py); 0 disables the watcher
+LOCALE_RELOAD_SECONDS = float(os.getenv("LOCALE_RELOAD_SECONDS", "5"))
 
 # Validation
 if not TELEGRAM_BOT_TOKEN:
     raise ValueError("Missing TELEGRAM_BOT_TOKEN environment variable")
 if not OPENAI_API_KEY:
     raise ValueError("Missing OPENAI_API_KEY environment variable")
-if not FIREBASE_SERVICE_ACCOUNT_KEY_PATH:
+if FIRESTORE_BACKEND not in ("firestore", "emulator", "memory"):
+    raise ValueError(f"Unknown FIRESTORE_BACKEND '{FIRESTORE_BACKEND}'")
+if FIRESTORE_BACKEND == "firestore" and not FIREBASE_SERVICE_ACCOUNT_KEY_PATH:
     raise ValueError("Missing FIREBASE_SERVICE_ACCOUNT_KEY_PATH environment variable")
+if FIRESTORE_BACKEND == "emulator" and not os.getenv("FIRESTORE_EMULATOR_HOST"):
+    raise ValueError("FIRESTORE_BACKEND=emulator requires FIRESTORE_EMULATOR_HOST")
+for _task, _providers in LLM_ROUTES.items():
+    if _task not in ("parse", "suggest", "advise"):
+        raise ValueError(f"Unknown task '{_task}' in LLM_ROUTES")
+    if not _providers or set(_providers) - {"openai", "local"}:
+        raise ValueError(f"LLM_ROUTES for '{_task}' must list providers from: openai, local")
+if ADVICE_SESSION_TURNS < 1 or ADVICE_SUMMARY_TOKENS < 1 or ADVICE_PROMPT_TOKENS <= ADVICE_SUMMARY_TOKENS:
+    raise ValueError("ADVICE_SESSION_TURNS and ADVICE_SUMMARY_TOKENS must be positive, ADVICE_SUMMARY_TOKENS below ADVICE_PROMPT_TOKENS")
+if LLM_USER_RATE_PER_MINUTE <= 0 or LLM_GLOBAL_RATE_PER_MINUTE <= 0:
+    raise ValueError("LLM rate limits must be positive")
+if CAMPAIGN_RATE_PER_SECOND <= 0:
+    raise ValueError("CAMPAIGN_RATE_PER_SECOND must be positive")
+if CAMPAIGN_CONCURRENCY < 1:
+    raise ValueError("CAMPAIGN_CONCURRENCY must be at least 1")
+if CONCURRENT_UPDATES < 1:
+    raise ValueError("CONCURRENT_UPDATES must be at least 1")
+if OCR_WORKERS < 1 or RECEIPT_QUEUE_PER_USER < 1:
+    raise ValueError("OCR_WORKERS and RECEIPT_QUEUE_PER_USER must be at least 1")
+if not 0 < CATEGORY_MODEL_THRESHOLD <= 1:
+    raise ValueError("CATEGORY_MODEL_THRESHOLD must be in (0, 1]")
+if WRITE_JOURNAL_REPLAY_SECONDS <= 0:
+    raise ValueError("WRITE_JOURNAL_REPLAY_SECONDS must be positive")
+if STATE_STORE_BACKEND not in ("sqlite", "firestore", "memory"):
+    raise ValueError(f"Unknown STATE_STORE_BACKEND '{STATE_STORE_BACKEND}'")
+if len(HOME_CURRENCY) != 3 or not HOME_CURRENCY.isalpha():
+    raise ValueError(f"HOME_CURRENCY must be a three-letter currency code, got '{HOME_CURRENCY}'")
 if DEFAULT_LANGUAGE not in SUPPORTED_LANGUAGES:
     raise ValueError(f"Default language '{DEFAULT_LANGUAGE}' not in SUPPORTED_LANGUAGES")
 
-logging.info(f"Supported languages: {SUPPORTED_LANGUAGES}")
-logging.info(f"Default language: {DEFAULT_LANGUAGE}")
\ No newline at end of file
+logger.debug("Supported languages: %s; default: %s", SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE)
\ No newline at end of file
@@ -0,0 +1,2 @@
+# devtools/__init__.py
+# Local stand-ins and helpers for offline development and testing
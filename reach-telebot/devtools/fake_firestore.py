@@ -0,0 +1,144 @@
+# devtools/fake_firestore.py
+"""
+An in-memory stand-in for the subset of the Firestore client the bot uses.
+
+Selected with FIRESTORE_BACKEND=memory. Data lives only as long as the
+process, which is what offline performance runs want.
+"""
+import copy
+import functools
+import threading
+
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id: str, data: dict):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self) -> dict:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+class FakeDocumentReference:
+    def __init__(self, collection, doc_id: str):
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self, transaction=None) -> FakeDocumentSnapshot:
+        if transaction is not None:
+            transaction._hold(self._collection)
+        with self._collection._lock:
+            return FakeDocumentSnapshot(self.id, copy.deepcopy(self._collection._docs.get(self.id)))
+
+    def set(self, data: dict, merge: bool = False):
+        with self._collection._lock:
+            if merge and self.id in self._collection._docs:
+                _deep_merge(self._collection._docs[self.id], copy.deepcopy(data))
+            else:
+                self._collection._docs[self.id] = _deep_merge({}, copy.deepcopy(data))
+
+    def delete(self):
+        with self._collection._lock:
+            self._collection._docs.pop(self.id, None)
+
+class FakeTransaction:
+    """Holds the lock of every collection it reads until the transactional function returns."""
+
+    def __init__(self):
+        self._held = []
+
+    def _hold(self, collection):
+        if collection._lock not in self._held:
+            collection._lock.acquire()
+            self._held.append(collection._lock)
+
+    def set(self, ref, data: dict, merge: bool = False):
+        self._hold(ref._collection)
+        ref.set(data, merge=merge)
+
+    def update(self, ref, data: dict):
+        self._hold(ref._collection)
+        if not ref.get().exists:
+            raise KeyError(f"No document to update: {ref.id}")
+        ref.set(data, merge=True)
+
+    def _release(self):
+        for lock in reversed(self._held):
+            lock.release()
+        self._held = []
+
+def transactional(fn):
+    """Stand-in for firestore.transactional; the held locks make the function atomic, so there are no retries."""
+    @functools.wraps(fn)
+    def wrapper(transaction, *args, **kwargs):
+        try:
+            return fn(transaction, *args, **kwargs)
+        finally:
+            transaction._release()
+    return wrapper
+
+class FakeQuery:
+    """Ordered-by-document-id query supporting limit and start_after pagination."""
+
+    def __init__(self, collection, limit: int = None, start_after: str = None):
+        self._collection = collection
+        self._limit = limit
+        self._start_after = start_after
+
+    def order_by(self, field_path: str, direction=None):
+        return self
+
+    def limit(self, count: int):
+        return FakeQuery(self._collection, count, self._start_after)
+
+    def start_after(self, cursor):
+        if isinstance(cursor, dict):
+            # Field-value cursor; only document id ordering is supported
+            cursor = cursor["__name__"]
+        doc_id = cursor.id if hasattr(cursor, "id") else cursor
+        return FakeQuery(self._collection, self._limit, doc_id)
+
+    def stream(self):
+        with self._collection._lock:
+            doc_ids = sorted(self._collection._docs)
+            if self._start_after is not None:
+                doc_ids = [d for d in doc_ids if d > self._start_after]
+            if self._limit is not None:
+                doc_ids = doc_ids[:self._limit]
+            snapshots = [FakeDocumentSnapshot(d, copy.deepcopy(self._collection._docs[d])) for d in doc_ids]
+        return iter(snapshots)
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, name: str):
+        self.name = name
+        self._docs = {}
+        self._lock = threading.RLock()
+        super().__init__(self)
+
+    def document(self, doc_id: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, doc_id)
+
+class FakeFirestoreClient:
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def transaction(self) -> FakeTransaction:
+        return FakeTransaction()
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollectionReference(name)
+            return self._collections[name]
+
+def _deep_merge(target: dict, updates: dict) -> dict:
+    """Merges nested dicts the way Firestore's set(merge=True) does, applying ArrayUnion transforms."""
+    for key, value in updates.items():
+        if type(value).__name__ == "ArrayUnion":  # firestore.ArrayUnion; matched by name to avoid the import
+            current = target.get(key) if isinstance(target.get(key), list) else []
+            target[key] = current + [item for item in value.values if item not in current]
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_merge(target[key], value)
+        else:
+            target[key] = value
+    return target
@@ -0,0 +1,153 @@
+# devtools/fake_openai.py
+"""
+A minimal stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions with deterministic canned content shaped
+like the bot's real requests (goal suggestions, expense extraction, advice),
+so the bot and batch_jobs.py can run without network access:
+
+    python -m devtools.fake_openai --port 8089 --latency-ms 800 --jitter-ms 400 --failure-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python batch_jobs.py run ...
+
+Latency is drawn from a log-normal distribution around --latency-ms so the
+tail looks like a real API; --failure-rate answers with --failure-status and
+--hang-rate stalls requests for --hang-seconds to exercise client timeouts.
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+@dataclass
+class FaultSettings:
+    """Latency and failure injection for the fake server."""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    failure_rate: float = 0.0
+    failure_status: int = 500
+    hang_rate: float = 0.0
+    hang_seconds: float = 60.0
+
+    def delay_seconds(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.jitter_ms <= 0:
+            return self.latency_ms / 1000
+        # Log-normal with the requested median and a spread derived from the jitter
+        sigma = math.log1p(self.jitter_ms / self.latency_ms)
+        return random.lognormvariate(math.log(self.latency_ms), sigma) / 1000
+
+def fake_completion_content(body: dict) -> str:
+    """Returns canned content matching the kind of request in a chat completion body."""
+    messages = body.get("messages", [])
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    user = " ".join(m.get("content", "") for m in messages if m.get("role") == "user")
+
+    if "financial goal advisor" in system:
+        return json.dumps({"goals": [
+            {"goal": "Emergency Savings Jar", "description": "Put aside a small fixed amount every payday", "rationale": "Small regular wins build a saving habit"},
+            {"goal": "Monthly Family Remittance", "description": "Send a planned amount home on the same day each month", "rationale": "A fixed routine reduces decision effort"},
+            {"goal": "Children's School Fund", "description": "Save towards next year's school fees and books", "rationale": "Linking money to family values boosts motivation"}
+        ]})
+    if "Extract expense information" in system:
+        match = re.search(r"\d+(?:[.,]\d+)?", user)
+        amount = float(match.group(0).replace(",", ".")) if match else 0.0
+        return json.dumps({"amount": amount, "currency": "SGD", "category": "Food", "description": user[:60]})
+    return "Save a small fixed amount every payday before spending, and keep it in a separate account."
+
+def completion_response(body: dict, content: str) -> dict:
+    """Wraps content in an OpenAI chat.completion response object."""
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-3.5-turbo"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, faults: FaultSettings = None):
+        super().__init__(address, FakeOpenAIHandler)
+        self.faults = faults or FaultSettings()
+        self.request_count = 0
+        self.failure_count = 0
+        self._lock = threading.Lock()
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Serves chat completions with canned content."""
+
+    def do_POST(self):
+        faults = self.server.faults
+        with self.server._lock:
+            self.server.request_count += 1
+        if faults.hang_rate and random.random() < faults.hang_rate:
+            time.sleep(faults.hang_seconds)
+        delay = faults.delay_seconds()
+        if delay:
+            time.sleep(delay)
+        if faults.failure_rate and random.random() < faults.failure_rate:
+            with self.server._lock:
+                self.server.failure_count += 1
+            return self._send(faults.failure_status, {"error": {"message": "Injected failure", "type": "server_error"}})
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return self._send(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+        self._send(200, completion_response(body, fake_completion_content(body)))
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug("fake_openai: " + format % args)
+
+def make_server(host: str = "127.0.0.1", port: int = 8089, faults: FaultSettings = None) -> FakeOpenAIServer:
+    """Creates (but does not start) a fake OpenAI server."""
+    return FakeOpenAIServer((host, port), faults)
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Median response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Latency spread (log-normal)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--failure-status", type=int, default=500, help="HTTP status for injected failures")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that stall")
+    parser.add_argument("--hang-seconds", type=float, default=60.0)
+
+def faults_from_args(args) -> FaultSettings:
+    return FaultSettings(args.latency_ms, args.jitter_ms, args.failure_rate,
+                         args.failure_status, args.hang_rate, args.hang_seconds)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = make_server(args.host, args.port, faults_from_args(args))
+    logging.info(f"Fake OpenAI server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
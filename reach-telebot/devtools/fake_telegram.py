@@ -0,0 +1,278 @@
+# devtools/fake_telegram.py
+"""
+A local stand-in for the Telegram Bot API.
+
+The bot talks to it when TELEGRAM_API_BASE_URL points here, e.g.
+
+    python -m devtools.fake_telegram --port 8081
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot python main.py
+
+Updates are injected either in-process (inject_message / inject_callback,
+used by devtools/perf_run.py) or over HTTP:
+
+    POST /_control/message   {"user_id": 1, "text": "/start"}
+    POST /_control/callback  {"user_id": 1, "data": "set_lang_en"}
+    GET  /_control/sent?since=0
+
+Every Bot API call the bot makes is recorded with a timestamp so callers can
+measure response latency per chat.
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BOT_USER = {"id": 1000000001, "is_bot": True, "first_name": "REACH", "username": "reach_fake_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False}
+
+# Bot API methods that put something visible in a chat
+VISIBLE_METHODS = {"sendMessage", "editMessageText", "sendPhoto", "editMessageReplyMarkup", "sendDocument"}
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}", "language_code": "en"}
+
+def _chat(user_id: int) -> dict:
+    return {"id": user_id, "type": "private", "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+class SentCall:
+    """One Bot API call made by the bot."""
+    __slots__ = ("seq", "timestamp", "method", "chat_id", "params")
+
+    def __init__(self, seq: int, method: str, chat_id, params: dict):
+        self.seq = seq
+        self.timestamp = time.monotonic()
+        self.method = method
+        self.chat_id = chat_id
+        self.params = params
+
+    def to_dict(self) -> dict:
+        return {"seq": self.seq, "timestamp": self.timestamp, "method": self.method,
+                "chat_id": self.chat_id, "params": self.params}
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, FakeTelegramHandler)
+        self._cond = threading.Condition()
+        self._updates = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._last_message_id = {}
+        self.sent = []
+
+    # Update injection
+
+    def _push_update(self, update: dict) -> int:
+        with self._cond:
+            update["update_id"] = self._next_update_id
+            self._next_update_id += 1
+            self._updates.append(update)
+            self._cond.notify_all()
+            return update["update_id"]
+
+    def _new_message_id(self) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    def inject_message(self, user_id: int, text: str) -> int:
+        """Queues a private text message from a user; returns the update_id."""
+        with self._cond:
+            message_id = self._new_message_id()
+        message = {"message_id": message_id, "date": int(time.time()), "chat": _chat(user_id),
+                   "from": _user(user_id), "text": text}
+        if text.startswith("/"):
+            command_length = len(text.split()[0])
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": command_length}]
+        return self._push_update({"message": message})
+
+    def inject_callback(self, user_id: int, data: str, message_id: int = None) -> int:
+        """Queues a button press on the latest (or given) bot message; returns the update_id."""
+        with self._cond:
+            message_id = message_id or self._last_message_id.get(user_id) or self._new_message_id()
+        message = {"message_id": message_id, "date": int(time.time()), "chat": _chat(user_id),
+                   "from": BOT_USER, "text": "..."}
+        callback_query = {"id": uuid.uuid4().hex, "from": _user(user_id), "chat_instance": str(user_id),
+                          "data": data, "message": message}
+        return self._push_update({"callback_query": callback_query})
+
+    def next_updates(self, offset: int = 0, limit: int = 100, timeout: float = 0) -> list:
+        """Returns pending updates with update_id >= offset, long-polling up to timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # Confirming an offset drops everything before it, as the real API does
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._updates[:limit]
+
+    # Recorded bot calls
+
+    def record(self, method: str, params: dict) -> SentCall:
+        chat_id = params.get("chat_id")
+        try:
+            chat_id = int(chat_id) if chat_id is not None else None
+        except (TypeError, ValueError):
+            pass
+        with self._cond:
+            call = SentCall(len(self.sent), method, chat_id, params)
+            self.sent.append(call)
+            self._cond.notify_all()
+            return call
+
+    def wait_for_calls(self, chat_id: int, after_seq: int, count: int = 1, timeout: float = 30.0) -> list:
+        """Waits until `count` visible calls to a chat happened after `after_seq`."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                calls = [c for c in self.sent[after_seq:] if c.chat_id == chat_id and c.method in VISIBLE_METHODS]
+                if len(calls) >= count:
+                    return calls[:count]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return calls
+                self._cond.wait(remaining)
+
+    def sent_count(self) -> int:
+        with self._cond:
+            return len(self.sent)
+
+    def answer(self, method: str, params: dict):
+        """Builds the Bot API result for a method call."""
+        if method == "getMe":
+            return BOT_USER
+        if method == "getUpdates":
+            return self.next_updates(int(params.get("offset") or 0), int(params.get("limit") or 100),
+                                     float(params.get("timeout") or 0))
+        call = self.record(method, params)
+        if method in ("sendMessage", "sendPhoto", "sendDocument"):
+            with self._cond:
+                message_id = self._new_message_id()
+                if call.chat_id is not None:
+                    self._last_message_id[call.chat_id] = message_id
+            message = {"message_id": message_id, "date": int(time.time()), "chat": _chat(call.chat_id or 0),
+                       "from": BOT_USER}
+            if method == "sendPhoto":
+                file_id = f"fake-photo-{uuid.uuid4().hex[:16]}"
+                message["photo"] = [{"file_id": file_id, "file_unique_id": file_id[-12:], "width": 800, "height": 600}]
+            else:
+                message["text"] = str(params.get("text", ""))
+            if "reply_markup" in params:
+                message["reply_markup"] = params["reply_markup"]
+            return message
+        if method == "editMessageText" and params.get("chat_id") is not None:
+            message = {"message_id": int(params.get("message_id") or 0), "date": int(time.time()),
+                       "chat": _chat(call.chat_id), "from": BOT_USER, "text": str(params.get("text", ""))}
+            if "reply_markup" in params:
+                message["reply_markup"] = params["reply_markup"]
+            return message
+        if method == "getFile":
+            return {"file_id": params.get("file_id"), "file_unique_id": "fake", "file_path": f"files/{params.get('file_id')}"}
+        # deleteWebhook, answerCallbackQuery, setMyCommands, close, ...
+        return True
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        params.update(self._read_body())
+
+        if url.path.startswith("/_control/"):
+            return self._control(url.path[len("/_control/"):], params)
+
+        # /bot<token>/<method>
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            return self._send(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+        try:
+            result = self.server.answer(parts[1], params)
+        except Exception as e:
+            logging.exception("fake_telegram: error answering %s", parts[1])
+            return self._send(400, {"ok": False, "error_code": 400, "description": str(e)})
+        self._send(200, {"ok": True, "result": result})
+
+    def _control(self, action: str, params: dict):
+        if action == "message":
+            update_id = self.server.inject_message(int(params["user_id"]), str(params["text"]))
+        elif action == "callback":
+            update_id = self.server.inject_callback(int(params["user_id"]), str(params["data"]),
+                                                    params.get("message_id"))
+        elif action == "sent":
+            since = int(params.get("since", 0))
+            return self._send(200, [c.to_dict() for c in self.server.sent[since:]])
+        else:
+            return self._send(404, {"error": f"Unknown control action {action}"})
+        self._send(200, {"update_id": update_id})
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        raw = self.rfile.read(length)
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            return json.loads(raw or b"{}")
+        if content_type.startswith("multipart/form-data"):
+            message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + raw
+            )
+            fields = {}
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename():
+                    fields[name] = f"<file {part.get_filename()}>"
+                else:
+                    fields[name] = _decode_value(part.get_content())
+            return fields
+        return {k: _decode_value(v[0]) for k, v in parse_qs(raw.decode("utf-8")).items()}
+
+    def _send(self, status: int, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug("fake_telegram: " + format % args)
+
+def _decode_value(value: str):
+    """python-telegram-bot JSON-encodes non-string parameters; decode those back."""
+    if value[:1] in ("{", "["):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            pass
+    return value
+
+def make_server(host: str = "127.0.0.1", port: int = 8081) -> FakeTelegramServer:
+    """Creates (but does not start) a fake Bot API server."""
+    return FakeTelegramServer((host, port))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Telegram Bot API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = make_server(args.host, args.port)
+    logging.info(f"Fake Bot API listening on http://{args.host}:{args.port}/bot<token>/")
+    server.serve_forever()
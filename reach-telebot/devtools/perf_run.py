@@ -0,0 +1,140 @@
+# devtools/perf_run.py
+"""
+End-to-end performance run against local stand-ins; needs no credentials or network.
+
+Starts the fake Bot API and fake OpenAI servers in-process, launches main.py
+as a subprocess pointed at them (with the in-memory Firestore fake), then
+drives many simulated users through realistic flows and reports latency per
+step, measured from update injection to the bot's visible replies:
+
+    python -m devtools.perf_run --users 50 --concurrency 20 --openai-latency-ms 800
+    python -m devtools.perf_run --users 200 --concurrency 50 --bot-workers 4
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from devtools import fake_openai, fake_telegram
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (step name, kind, payload, visible replies expected)
+SCENARIO = [
+    ("start", "message", "/start", 1),
+    ("set_language", "callback", "set_lang_en", 2),
+    ("log_expense", "message", "/log lunch 12.50 at hawker centre", 1),
+    ("view_expenses", "message", "/view_expenses", 1),
+    ("ask_advice", "message", "/ask how can I save for my daughter's school fees", 2),
+    ("goal_start", "message", "/goal", 1),
+    ("goal_income", "callback", "income_2", 1),
+    ("goal_family", "callback", "family_needs_3", 1),
+    ("goal_spending", "callback", "spending_2", 2),
+]
+
+def run_user(server, user_id: int, timeout: float, results: dict, lock: threading.Lock):
+    """Drives one simulated user through the scenario, recording step latencies."""
+    for name, kind, payload, expected in SCENARIO:
+        after_seq = server.sent_count()
+        started = time.monotonic()
+        if kind == "message":
+            server.inject_message(user_id, payload)
+        else:
+            server.inject_callback(user_id, payload)
+        calls = server.wait_for_calls(user_id, after_seq, expected, timeout)
+        with lock:
+            entry = results.setdefault(name, {"first": [], "last": [], "timeouts": 0})
+            if calls:
+                entry["first"].append(calls[0].timestamp - started)
+            if len(calls) >= expected:
+                entry["last"].append(calls[-1].timestamp - started)
+            else:
+                entry["timeouts"] += 1
+                return  # The rest of this user's flow depends on the missing reply
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def print_report(results: dict, elapsed: float, users: int, openai_server):
+    print(f"\n{users} users in {elapsed:.1f}s, OpenAI requests: {openai_server.request_count} "
+          f"(injected failures: {openai_server.failure_count})")
+    print(f"{'step':<16}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'mean ms':>10}{'timeouts':>10}")
+    for name, *_ in SCENARIO:
+        entry = results.get(name)
+        if not entry:
+            continue
+        values = entry["last"]
+        row = [_percentile(values, p) * 1000 for p in (50, 95, 99)]
+        maximum = max(values) * 1000 if values else float("nan")
+        mean = statistics.mean(values) * 1000 if values else float("nan")
+        print(f"{name:<16}{len(values):>6}{row[0]:>10.1f}{row[1]:>10.1f}{row[2]:>10.1f}{maximum:>10.1f}{mean:>10.1f}{entry['timeouts']:>10}")
+
+def start_bot(telegram_port: int, openai_port: int, extra_env: dict = None) -> subprocess.Popen:
+    """Launches main.py against the local stand-ins."""
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_BOT_TOKEN": "123456:fake-token",
+        "TELEGRAM_API_BASE_URL": f"http://127.0.0.1:{telegram_port}/bot",
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "FIRESTORE_BACKEND": "memory",
+        "STATE_STORE_BACKEND": "memory",
+    })
+    env.update(extra_env or {})
+    return subprocess.Popen([sys.executable, "main.py"], cwd=BOT_DIR, env=env)
+
+def wait_until_polling(server, timeout: float = 30.0) -> bool:
+    """Waits for the bot to make its first Bot API calls."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if any(c.method == "deleteWebhook" for c in server.sent):
+            return True
+        time.sleep(0.1)
+    return False
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run an offline end-to-end performance test.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for each step's replies")
+    parser.add_argument("--telegram-port", type=int, default=8081)
+    parser.add_argument("--openai-port", type=int, default=8089)
+    parser.add_argument("--bot-workers", type=int, default=1, help="Run the bot in sharded mode with N workers")
+    fake_openai.add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    telegram_server = fake_telegram.make_server(port=args.telegram_port)
+    openai_server = fake_openai.make_server(port=args.openai_port, faults=fake_openai.faults_from_args(args))
+    for server in (telegram_server, openai_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    bot = start_bot(args.telegram_port, args.openai_port, {"BOT_WORKERS": str(args.bot_workers)})
+    try:
+        if not wait_until_polling(telegram_server):
+            print("Bot did not start polling", file=sys.stderr)
+            return 1
+        results, lock = {}, threading.Lock()
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for user_id in range(1, args.users + 1):
+                pool.submit(run_user, telegram_server, 100000 + user_id, args.timeout, results, lock)
+        print_report(results, time.monotonic() - started, args.users, openai_server)
+        return 0
+    finally:
+        bot.terminate()
+        try:
+            bot.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        telegram_server.shutdown()
+        openai_server.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(main())
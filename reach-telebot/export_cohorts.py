@@ -0,0 +1,269 @@
+# export_cohorts.py
+"""
+Offline export of cohort-level metrics for the program team.
+
+Streams the Firestore `users` collection page by page (never the whole
+collection in memory) and aggregates incrementally:
+
+  - goal completion rates by goal type
+  - spend by canonical category and by language (per currency, plus the total in
+    HOME_CURRENCY; expenses without an FX rate add nothing to it)
+  - onboarding profile distributions (and users per language)
+
+Pages are fetched by a background reader while the previous page is being
+aggregated; at most --prefetch pages are held in memory at once. Progress
+(last document id plus the running aggregates) is checkpointed to a JSON file
+so an interrupted export resumes where it stopped. A finished export marks its
+checkpoint complete, and running it again into the same --out is refused
+unless --restart is given, which starts over from the first user:
+
+    python export_cohorts.py --out exports/2026-w42 --since 2026-10-12
+    FIRESTORE_BACKEND=emulator FIRESTORE_EMULATOR_HOST=localhost:8080 python export_cohorts.py --out /tmp/cohorts
+
+Output is one table per metric, as Parquet when pyarrow is installed and CSV otherwise.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from utils import categories, firebase_client, fx
+from utils.models import UserProfile, Goal, Expense, from_minor
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ("income", "goal", "debt", "family")
+_END = object()
+
+def _pad(totals: dict) -> dict:
+    """Checkpoints written before home amounts were tracked hold [expenses, amount_minor]."""
+    return {key: entry + [0] * (3 - len(entry)) for key, entry in totals.items()}
+
+class CohortAggregates:
+    """Running totals that can be saved to and restored from a checkpoint."""
+
+    def __init__(self, state: dict = None):
+        state = state or {}
+        self.users = state.get("users", 0)
+        self.onboarded = state.get("onboarded", 0)
+        # goal type -> [goals, completed]
+        self.goals = defaultdict(lambda: [0, 0], state.get("goals", {}))
+        # "category key|currency" or "language|currency" -> [expenses, amount_minor, home_amount_minor]
+        self.spend_by_category = defaultdict(lambda: [0, 0, 0], _pad(state.get("spend_by_category", {})))
+        self.spend_by_language = defaultdict(lambda: [0, 0, 0], _pad(state.get("spend_by_language", {})))
+        # "field|option" -> users
+        self.profiles = defaultdict(int, state.get("profiles", {}))
+
+    def add_user(self, data: dict, since: datetime = None):
+        self.users += 1
+        language = data.get("language") or "unknown"
+        self.profiles[f"language|{language}"] += 1
+
+        profile = UserProfile.from_firestore(data.get("profile") or {})
+        if profile:
+            self.onboarded += 1
+            for field in PROFILE_FIELDS:
+                self.profiles[f"{field}|{getattr(profile, field) or 'unanswered'}"] += 1
+
+        for raw in data.get("goals") or []:
+            goal = Goal.from_firestore(raw)
+            entry = self.goals[goal.type or "unknown"]
+            entry[0] += 1
+            if goal.amount_minor > 0 and goal.progress_minor >= goal.amount_minor:
+                entry[1] += 1
+
+        for raw in data.get("expenses") or []:
+            expense = Expense.from_firestore(raw)
+            if since is not None and (expense.timestamp is None or expense.timestamp < since):
+                continue
+            home_amount_minor = fx.home_amount_minor(expense) or 0
+            category = categories.key_for(categories.category_id(expense))
+            for totals, group in ((self.spend_by_category, category), (self.spend_by_language, language)):
+                entry = totals[f"{group}|{expense.currency}"]
+                entry[0] += 1
+                entry[1] += expense.amount_minor
+                entry[2] += home_amount_minor
+
+    def to_state(self) -> dict:
+        return {
+            "users": self.users,
+            "onboarded": self.onboarded,
+            "goals": dict(self.goals),
+            "spend_by_category": dict(self.spend_by_category),
+            "spend_by_language": dict(self.spend_by_language),
+            "profiles": dict(self.profiles)
+        }
+
+    def tables(self) -> dict:
+        """Returns {table name: (columns, rows)}."""
+        goal_rows = [
+            (goal_type, goals, completed, round(completed / goals, 4) if goals else 0.0)
+            for goal_type, (goals, completed) in sorted(self.goals.items())
+        ]
+
+        def spend_rows(totals: dict) -> list:
+            rows = []
+            for key, (count, amount_minor, home_amount_minor) in sorted(totals.items()):
+                group, currency = key.rsplit("|", 1)
+                rows.append((group, currency, count, amount_minor, from_minor(amount_minor, currency),
+                             fx.HOME_CURRENCY, from_minor(home_amount_minor, fx.HOME_CURRENCY)))
+            return rows
+
+        profile_rows = []
+        for key, count in sorted(self.profiles.items()):
+            field, option = key.split("|", 1)
+            base = self.users if field == "language" else self.onboarded
+            profile_rows.append((field, option, count, round(count / base, 4) if base else 0.0))
+
+        return {
+            "goal_completion": (("goal_type", "goals", "completed", "completion_rate"), goal_rows),
+            "spend_by_category": (("category", "currency", "expenses", "amount_minor", "amount",
+                                   "home_currency", "home_amount"),
+                                  spend_rows(self.spend_by_category)),
+            "spend_by_language": (("language", "currency", "expenses", "amount_minor", "amount",
+                                   "home_currency", "home_amount"),
+                                  spend_rows(self.spend_by_language)),
+            "profile_distribution": (("field", "option", "users", "share"), profile_rows),
+        }
+
+def load_checkpoint(path: str) -> dict:
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # Write then rename so a crash mid-write never leaves a truncated checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def _read_pages(pages, out: queue.Queue, stop: threading.Event):
+    """Reader thread: moves pages from the Firestore iterator into a bounded queue."""
+    try:
+        for page in pages:
+            while not stop.is_set():
+                try:
+                    out.put(page, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+        out.put(_END)
+    except Exception as e:
+        out.put(e)
+
+def aggregate(page_size: int, prefetch: int, checkpoint_path: str, checkpoint_every: int,
+              since: datetime = None, restart: bool = False) -> CohortAggregates:
+    """Scans all users, resuming from the checkpoint unless restart is set."""
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    since_text = since.isoformat() if since else None
+    if checkpoint and checkpoint.get("since") != since_text:
+        raise ValueError(f"Checkpoint {checkpoint_path} was written for --since {checkpoint.get('since')}; "
+                         f"use --restart to discard it")
+    # Resuming past the end would count only users whose ids sort after the last one, not new or changed users
+    if checkpoint and checkpoint.get("complete"):
+        raise ValueError(f"Checkpoint {checkpoint_path} is from a finished export; use --restart to export again")
+    aggregates = CohortAggregates(checkpoint["aggregates"] if checkpoint else None)
+    last_id = checkpoint["last_id"] if checkpoint else None
+    if checkpoint:
+        logger.info("Resuming after user %s (%s users already aggregated)", last_id, aggregates.users)
+
+    pages = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=_read_pages, args=(firebase_client.iter_user_documents(page_size, last_id), pages, stop),
+        name="cohort-reader", daemon=True
+    )
+    reader.start()
+
+    started = time.monotonic()
+    page_count = 0
+    try:
+        while True:
+            page = pages.get()
+            if page is _END:
+                break
+            if isinstance(page, Exception):
+                raise page
+            for _, data in page:
+                aggregates.add_user(data, since)
+            last_id = page[-1][0]
+            page_count += 1
+            if checkpoint_path and page_count % checkpoint_every == 0:
+                save_checkpoint(checkpoint_path, {"last_id": last_id, "since": since_text,
+                                                  "aggregates": aggregates.to_state()})
+                rate = aggregates.users / max(time.monotonic() - started, 1e-6)
+                logger.info("Checkpoint at user %s: %s users, %.0f users/s", last_id, aggregates.users, rate)
+    finally:
+        stop.set()
+
+    if checkpoint_path:
+        save_checkpoint(checkpoint_path, {"last_id": last_id, "since": since_text, "complete": True,
+                                          "aggregates": aggregates.to_state()})
+    return aggregates
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def write_tables(aggregates: CohortAggregates, out_dir: str, fmt: str) -> list:
+    """Writes one file per table; returns the paths written."""
+    if fmt == "auto":
+        fmt = "parquet" if _parquet_available() else "csv"
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, (columns, rows) in aggregates.tables().items():
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        if fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pydict({column: [row[i] for row in rows] for i, column in enumerate(columns)})
+            pq.write_table(table, path)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(rows)
+        paths.append(path)
+    return paths
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export aggregated cohort metrics from the users collection.")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--format", choices=("auto", "parquet", "csv"), default="auto",
+                        help="auto writes Parquet when pyarrow is installed, else CSV")
+    parser.add_argument("--since", help="Only count expenses on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--prefetch", type=int, default=2, help="Pages fetched ahead of aggregation")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <out>/checkpoint.json)")
+    parser.add_argument("--checkpoint-every", type=int, default=10, help="Pages between checkpoints")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore an existing checkpoint, e.g. to re-run a finished export")
+    args = parser.parse_args(argv)
+
+    if args.page_size < 1 or args.prefetch < 1 or args.checkpoint_every < 1:
+        parser.error("--page-size, --prefetch and --checkpoint-every must be positive")
+    since = datetime.strptime(args.since, "%Y-%m-%d").astimezone() if args.since else None
+    checkpoint_path = args.checkpoint or os.path.join(args.out, "checkpoint.json")
+    os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+
+    aggregates = aggregate(args.page_size, args.prefetch, checkpoint_path, args.checkpoint_every,
+                           since, args.restart)
+    paths = write_tables(aggregates, args.out, args.format)
+    logger.info("Exported %s users (%s onboarded) to %s", aggregates.users, aggregates.onboarded, ', '.join(paths))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
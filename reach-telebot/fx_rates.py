@@ -0,0 +1,54 @@
+# fx_rates.py
+"""
+Maintain the FX rate table used to total expenses in HOME_CURRENCY (see utils/fx.py).
+
+    python fx_rates.py import rates.json          # validate and install a new table
+    python fx_rates.py show                       # version, base and dates of the installed table
+    python fx_rates.py convert 12.50 INR [--date 2026-10-01]
+
+Running bots pick up an imported table within a minute. Expenses already
+saved keep the home amount they were saved with.
+"""
+import argparse
+import sys
+from datetime import date
+from utils import fx
+from utils.models import format_amount, to_minor
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain the FX rate table.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Validate and install a rate file")
+    import_parser.add_argument("path")
+
+    subparsers.add_parser("show", help="Describe the installed rate table")
+
+    convert_parser = subparsers.add_parser("convert", help=f"Convert an amount to {fx.HOME_CURRENCY}")
+    convert_parser.add_argument("amount", type=float)
+    convert_parser.add_argument("currency")
+    convert_parser.add_argument("--date", type=date.fromisoformat, default=date.today())
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "import":
+            rates = fx.import_rates(args.path)
+            print(f"Installed FX rates version {rates.version} ({len(rates.dates)} dates) at {fx.FX_RATES_PATH}")
+        elif args.command == "show":
+            rates = fx.table()
+            span = f"{rates.dates[0]} to {rates.dates[-1]}" if rates.dates else "no dates"
+            print(f"Version {rates.version}, base {rates.base}, {span}; home currency {fx.HOME_CURRENCY}")
+        elif args.command == "convert":
+            currency = args.currency.upper()
+            converted = fx.convert_minor(to_minor(args.amount, currency), currency, args.date)
+            if converted is None:
+                print(f"No rate for {currency} on {args.date}", file=sys.stderr)
+                return 1
+            print(f"{format_amount(converted, fx.HOME_CURRENCY)} {fx.HOME_CURRENCY}")
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# handlers/admin.py
+import asyncio
+import logging
+import os
+from telegram import Update
+from telegram.ext import ContextTypes
+from config import ADMIN_USER_IDS
+from utils import campaigns, localization, metrics, profiling
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+CAMPAIGNS_LISTED = 10
+
+def is_admin(user_id: int) -> bool:
+    return user_id in ADMIN_USER_IDS
+
+async def metrics_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/metrics [prefix]: shows flow funnels and current metrics to admins."""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        logger.warning("Non-admin user %s tried /metrics", user_id)
+        return
+
+    from handlers.flows import engine
+    prefix = context.args[0] if context.args else ""
+    text = "Flow funnels\n" + engine.format_funnels() + "\n\nMetrics\n" + (metrics.format_snapshot(prefix=prefix) or "(none)")
+    await update.message.reply_text(text[:MAX_MESSAGE_LENGTH])
+
+async def profiler_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/profiler [seconds]: samples the bot for a while and sends admins a collapsed-stack file for flame graphs."""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        logger.warning("Non-admin user %s tried /profiler", user_id)
+        return
+
+    try:
+        seconds = float(context.args[0]) if context.args else 30.0
+    except ValueError:
+        await update.message.reply_text("Usage: /profiler [seconds]")
+        return
+    if not 0 < seconds <= profiling.MAX_PROFILE_SECONDS:
+        await update.message.reply_text(f"Seconds must be between 0 and {profiling.MAX_PROFILE_SECONDS}")
+        return
+
+    await update.message.reply_text(f"Profiling for {seconds:g}s...")
+    # In the background, so this handler returns and the profile samples the bot serving updates
+    context.application.create_task(_send_profile(update, seconds), update=update)
+
+async def _send_profile(update: Update, seconds: float) -> None:
+    """Samples in a worker thread (sampling blocks) and sends the collapsed-stack file when done."""
+    path, samples = await asyncio.to_thread(profiling.profile, seconds)
+    if path is None:
+        await update.message.reply_text("A profile is already running")
+        return
+    with open(path, 'rb') as f:
+        await update.message.reply_document(
+            document=f, filename=os.path.basename(path),
+            caption=f"{samples} samples; render with flamegraph.pl or speedscope"
+        )
+
+async def campaigns_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/campaigns [start|pause|cancel ID]: lists broadcast campaigns or controls one (create them with campaign.py)."""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        logger.warning("Non-admin user %s tried /campaigns", user_id)
+        return
+
+    if not context.args:
+        listed = campaigns.list_campaigns()[:CAMPAIGNS_LISTED]
+        text = "\n".join(campaigns.format_campaign(c) for c in listed) or "No campaigns"
+        await update.message.reply_text(text[:MAX_MESSAGE_LENGTH])
+        return
+
+    if len(context.args) != 2 or context.args[0] not in ("start", "pause", "cancel"):
+        await update.message.reply_text("Usage: /campaigns [start|pause|cancel ID]")
+        return
+
+    action, campaign_id = context.args
+    try:
+        if action == "start":
+            campaign = campaigns.get(campaign_id)
+            if campaign is None or campaign["status"] not in ("ready", "paused"):
+                raise campaigns.CampaignError(f"Campaign {campaign_id} is {campaign['status'] if campaign else 'unknown'}")
+            # Sends in the background; run() claims the campaign atomically before the first message
+            context.application.create_task(campaigns.run(context.bot, campaign_id), update=update)
+        elif action == "pause":
+            campaign = campaigns.pause(campaign_id)
+        else:
+            campaign = campaigns.cancel(campaign_id)
+    except campaigns.CampaignError as e:
+        await update.message.reply_text(str(e))
+        return
+    logger.info("Admin %s: %s campaign %s", user_id, action, campaign_id)
+    prefix = "Starting " if action == "start" else ""
+    await update.message.reply_text(prefix + campaigns.format_campaign(campaign))
+
+async def reload_locales_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/reload_locales: recompiles locales/*.json and reports placeholder problems to admins."""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        logger.warning("Non-admin user %s tried /reload_locales", user_id)
+        return
+
+    # Reading and compiling the files happens off the event loop
+    applied, findings = await asyncio.to_thread(localization.reload)
+    logger.info("Admin %s reloaded locales (applied=%s, %s findings)", user_id, applied, len(findings))
+    header = "Locales reloaded" if applied else "Reload rejected; the previous catalog is still in use"
+    text = header + ("\n\n" + "\n".join(findings) if findings else "")
+    await update.message.reply_text(text[:MAX_MESSAGE_LENGTH])
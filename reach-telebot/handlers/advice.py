@@ -1,10 +1,17 @@
 # handlers/advice.py
+import asyncio
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 from utils.localization import get_text
 from utils.firebase_client import get_user_language, get_profile, get_goals, get_expenses
-from utils.openai_client import get_ai_advice
+from utils import advice_sessions, content_cache
+from utils.callback_data import encode_callback, decode_callback
+from utils.models import UserProfile, format_amount
+from handlers.common import wait_for_llm_slot
+
+# Preset advice categories offered as buttons (canned answers are pre-generated by batch_jobs.py)
+PRESET_CATEGORIES = ["savings", "debt", "remittance", "budget"]
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -29,11 +36,11 @@ async def show_advice_categories(update: Update, context: ContextTypes.DEFAULT_T
     lang_code = get_user_language(user_id)
     
     keyboard = [
-        [InlineKeyboardButton(get_text("advice_category_savings", lang_code), callback_data="advice_savings")],
-        [InlineKeyboardButton(get_text("advice_category_debt", lang_code), callback_data="advice_debt")],
-        [InlineKeyboardButton(get_text("advice_category_remittance", lang_code), callback_data="advice_remittance")],
-        [InlineKeyboardButton(get_text("advice_category_budget", lang_code), callback_data="advice_budget")],
-        [InlineKeyboardButton(get_text("advice_category_custom", lang_code), callback_data="advice_custom")]
+        [InlineKeyboardButton(get_text("advice_category_savings", lang_code), callback_data=encode_callback("advice", "savings"))],
+        [InlineKeyboardButton(get_text("advice_category_debt", lang_code), callback_data=encode_callback("advice", "debt"))],
+        [InlineKeyboardButton(get_text("advice_category_remittance", lang_code), callback_data=encode_callback("advice", "remittance"))],
+        [InlineKeyboardButton(get_text("advice_category_budget", lang_code), callback_data=encode_callback("advice", "budget"))],
+        [InlineKeyboardButton(get_text("advice_category_custom", lang_code), callback_data=encode_callback("advice", "custom"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -52,7 +59,8 @@ async def advice_category_callback(update: Update, context: ContextTypes.DEFAULT
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    category = query.data.split('_')[1]
+    _, args = decode_callback(query.data)
+    category = args[0] if args else "general"
     
     if category == "custom":
         # Ask for custom question
@@ -72,6 +80,18 @@ async def advice_category_callback(update: Update, context: ContextTypes.DEFAULT
         else:
             question = get_text("advice_question_general", lang_code)
         
+        # Serve the canned answer when the batch job has produced one; it still becomes part of the session
+        canned_advice = content_cache.get_advice(category, lang_code)
+        if canned_advice:
+            if await asyncio.to_thread(advice_sessions.record, user_id, question, canned_advice):
+                context.application.create_task(advice_sessions.compact_in_background(user_id, lang_code), update=update)
+            await query.edit_message_text(text=canned_advice, reply_markup=_advice_keyboard(lang_code))
+            return
+        
+        # Apply the per-user and global LLM limits
+        if not await wait_for_llm_slot(update, lang_code):
+            return
+        
         # Show thinking message
         thinking_text = get_text("ai_thinking", lang_code)
         await query.edit_message_text(text=thinking_text)
@@ -93,6 +113,10 @@ async def generate_advice(update: Update, context: ContextTypes.DEFAULT_TYPE, qu
     user_id = update.effective_user.id
     lang_code = get_user_language(user_id)
     
+    # Apply the per-user and global LLM limits
+    if not await wait_for_llm_slot(update, lang_code):
+        return
+    
     # Show thinking message
     thinking_text = get_text("ai_thinking", lang_code)
     thinking_message = await update.message.reply_text(text=thinking_text)
@@ -100,20 +124,16 @@ async def generate_advice(update: Update, context: ContextTypes.DEFAULT_TYPE, qu
     # Get user profile data
     profile = get_profile(user_id)
     goals = get_goals(user_id)
-    expenses = get_expenses(user_id)[:10]  # Get only the 10 most recent expenses
+    expenses = get_expenses(user_id)[-10:]  # Get only the 10 most recent expenses
     
     # Build context for AI
     ai_context = _build_ai_context(profile, goals, expenses, question, lang_code)
     
-    # Get advice from OpenAI
-    advice = get_ai_advice(ai_context, lang_code)
+    # Get advice in the context of the user's session, in a worker thread so other updates keep flowing
+    advice = await _session_advice(update, context, user_id, ai_context, question, lang_code)
     
     # Add buttons for follow-up actions
-    keyboard = [
-        [InlineKeyboardButton(get_text("ask_another", lang_code), callback_data="advice_another")],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _advice_keyboard(lang_code)
     
     # Edit the thinking message with the advice
     await thinking_message.edit_text(text=advice, reply_markup=reply_markup)
@@ -126,39 +146,53 @@ async def generate_advice_from_callback(update: Update, context: ContextTypes.DE
     # Get user profile data
     profile = get_profile(user_id)
     goals = get_goals(user_id)
-    expenses = get_expenses(user_id)[:10]  # Get only the 10 most recent expenses
+    expenses = get_expenses(user_id)[-10:]  # Get only the 10 most recent expenses
     
     # Build context for AI
     ai_context = _build_ai_context(profile, goals, expenses, question, lang_code)
     
-    # Get advice from OpenAI
-    advice = get_ai_advice(ai_context, lang_code)
+    # Get advice in the context of the user's session, in a worker thread so other updates keep flowing
+    advice = await _session_advice(update, context, user_id, ai_context, question, lang_code)
     
     # Add buttons for follow-up actions
-    keyboard = [
-        [InlineKeyboardButton(get_text("ask_another", lang_code), callback_data="advice_another")],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _advice_keyboard(lang_code)
     
     # Edit the thinking message with the advice
     await update.callback_query.edit_message_text(text=advice, reply_markup=reply_markup)
 
-def _build_ai_context(profile: dict, goals: list, expenses: list, question: str, lang_code: str) -> str:
+async def _session_advice(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, ai_context: str,
+                          question: str, lang_code: str) -> str:
+    """Answers within the user's advice session, compacting older turns in the background when due."""
+    advice, compact = await asyncio.to_thread(advice_sessions.ask, user_id, ai_context, question, lang_code)
+    if compact:
+        context.application.create_task(advice_sessions.compact_in_background(user_id, lang_code), update=update)
+    return advice
+
+def _advice_keyboard(lang_code: str) -> InlineKeyboardMarkup:
+    """Builds the follow-up buttons shown under a piece of advice."""
+    keyboard = [
+        [InlineKeyboardButton(get_text("advice_followup", lang_code), callback_data=encode_callback("advice_followup"))],
+        [InlineKeyboardButton(get_text("ask_another", lang_code), callback_data=encode_callback("advice_another"))],
+        [InlineKeyboardButton(get_text("advice_new_topic", lang_code), callback_data=encode_callback("advice_new_topic"))],
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def _build_ai_context(profile: UserProfile, goals: list, expenses: list, question: str, lang_code: str) -> str:
     """Builds a context string for the AI based on user data."""
     context = f"Question: {question}\n\n"
     
     # Add profile information if available
     if profile:
         context += "User Profile:\n"
-        if 'income' in profile:
-            context += f"- Income Level: {profile['income']}\n"
-        if 'goal' in profile:
-            context += f"- Financial Goal: {profile['goal']}\n"
-        if 'debt' in profile:
-            context += f"- Debt Level: {profile['debt']}\n"
-        if 'family' in profile:
-            context += f"- Family Responsibilities: {profile['family']}\n"
+        if profile.income:
+            context += f"- Income Level: {profile.income}\n"
+        if profile.goal:
+            context += f"- Financial Goal: {profile.goal}\n"
+        if profile.debt:
+            context += f"- Debt Level: {profile.debt}\n"
+        if profile.family:
+            context += f"- Family Responsibilities: {profile.family}\n"
         context += "\n"
     
     # Add active goals if available
@@ -166,25 +200,22 @@ def _build_ai_context(profile: dict, goals: list, expenses: list, question: str,
         context += "Financial Goals:\n"
         for i, goal in enumerate(goals):
             context += f"Goal {i+1}:\n"
-            if 'type' in goal:
-                context += f"- Type: {goal['type']}\n"
-            if 'amount' in goal:
-                context += f"- Target Amount: {goal['amount']}\n"
-            if 'deadline' in goal:
-                context += f"- Deadline: {goal['deadline']}\n"
-            if 'progress' in goal:
-                context += f"- Current Progress: {goal['progress']}\n"
+            if goal.type:
+                context += f"- Type: {goal.type}\n"
+            context += f"- Target Amount: {format_amount(goal.amount_minor)}\n"
+            if goal.deadline:
+                context += f"- Deadline: {goal.deadline.strftime('%Y-%m-%d')}\n"
+            context += f"- Current Progress: {format_amount(goal.progress_minor)}\n"
             context += "\n"
     
     # Add recent expenses if available
     if expenses:
         context += "Recent Expenses:\n"
         for expense in expenses:
-            if 'amount' in expense and 'category' in expense:
-                context += f"- {expense.get('amount', 0)} {expense.get('currency', '')} for {expense.get('category', 'Other')}"
-                if 'description' in expense:
-                    context += f" ({expense['description']})"
-                context += "\n"
+            context += f"- {expense.display_amount} {expense.currency} for {expense.category}"
+            if expense.description:
+                context += f" ({expense.description})"
+            context += "\n"
         context += "\n"
     
     # Add language information
@@ -200,15 +231,24 @@ async def advice_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    if query.data == "advice_another":
+    action, _ = decode_callback(query.data)
+    
+    if action == "advice_followup":
+        # The next message is answered in the same session
+        await query.edit_message_reply_markup(reply_markup=None)
+        await query.message.reply_text(text=get_text("enter_followup_question", lang_code))
+        context.user_data["expecting_advice_question"] = True
+    
+    elif action == "advice_another":
         # Show advice categories again
         await show_advice_categories(update, context)
     
-    elif query.data == "back_to_menu":
+    elif action == "advice_new_topic":
+        # Forget the conversation so far and start over
+        await asyncio.to_thread(advice_sessions.reset, user_id)
+        await show_advice_categories(update, context)
+    
+    elif action == "back_to_menu":
         # Show main menu
         from handlers.common import show_main_menu
-        await show_main_menu(update, context, lang_code)
-
-# Register handlers
-advice_category_handler = CallbackQueryHandler(advice_category_callback, pattern='^advice_')
-advice_callback_handler = CallbackQueryHandler(advice_callback, pattern='^(advice_another|back_to_menu)$')
\ No newline at end of file
+        await show_main_menu(update, context, lang_code)
\ No newline at end of file
@@ -1,23 +1,23 @@
 # handlers/common.py
+import asyncio
 import logging
+import math
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
-from utils.localization import get_text, get_language_name
+from telegram.ext import ContextTypes, CommandHandler
+from utils.localization import get_text, render_text, get_language_name
 from utils.firebase_client import set_user_language, get_user_language
+from utils.callback_data import encode_callback, decode_callback
+from utils.rate_limit import reserve_llm_call, RateLimited
 from config import SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE
 
 # Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Sends a welcome message and language selection prompt when /start is issued."""
     user = update.effective_user
     user_id = user.id
-    logger.info(f"User {user_id} ({user.username}) started the bot.")
+    logger.info("User %s (%s) started the bot.", user_id, user.username)
 
     # Get user's stored language, default if not set
     lang_code = get_user_language(user_id)
@@ -27,7 +27,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     row = []
     for code in SUPPORTED_LANGUAGES:
         lang_name = get_language_name(code)
-        row.append(InlineKeyboardButton(lang_name, callback_data=f"set_lang_{code}"))
+        row.append(InlineKeyboardButton(lang_name, callback_data=encode_callback("set_lang", code)))
         if len(row) == 2:  # Two buttons per row
             keyboard.append(row)
             row = []
@@ -46,18 +46,19 @@ async def language_select_callback(update: Update, context: ContextTypes.DEFAULT
     await query.answer()  # Answer callback query
 
     user_id = query.from_user.id
-    lang_code = query.data.split('_')[-1]  # Extract lang code from 'set_lang_xx'
+    _, args = decode_callback(query.data)
+    lang_code = args[0] if args else None  # Extract lang code from the set_lang button
 
     if lang_code in SUPPORTED_LANGUAGES:
         set_user_language(user_id, lang_code)
-        logger.info(f"User {user_id} selected language: {lang_code}")
+        logger.info("User %s selected language: %s", user_id, lang_code)
         selected_text = get_text("language_selected", lang_code)
         await query.edit_message_text(text=selected_text)
 
         # Show main menu after language selection
         await show_main_menu(update, context, lang_code)
     else:
-        logger.warning(f"User {user_id} selected invalid language code: {lang_code}")
+        logger.warning("User %s selected invalid language code: %s", user_id, lang_code)
         error_text = get_text("error_generic", DEFAULT_LANGUAGE)
         await query.edit_message_text(text=error_text)
 
@@ -71,16 +72,16 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, lan
     # Create menu buttons
     keyboard = [
         [
-            InlineKeyboardButton(get_text("menu_set_goal", lang_code), callback_data="menu_set_goal"),
-            InlineKeyboardButton(get_text("menu_log_expense", lang_code), callback_data="menu_log_expense")
+            InlineKeyboardButton(get_text("menu_set_goal", lang_code), callback_data=encode_callback("menu", "set_goal")),
+            InlineKeyboardButton(get_text("menu_log_expense", lang_code), callback_data=encode_callback("menu", "log_expense"))
         ],
         [
-            InlineKeyboardButton(get_text("menu_ask_advice", lang_code), callback_data="menu_ask_advice"),
-            InlineKeyboardButton(get_text("menu_view_expenses", lang_code), callback_data="menu_view_expenses")
+            InlineKeyboardButton(get_text("menu_ask_advice", lang_code), callback_data=encode_callback("menu", "ask_advice")),
+            InlineKeyboardButton(get_text("menu_view_expenses", lang_code), callback_data=encode_callback("menu", "view_expenses"))
         ],
         [
-            InlineKeyboardButton(get_text("menu_profile", lang_code), callback_data="menu_profile"),
-            InlineKeyboardButton(get_text("menu_change_language", lang_code), callback_data="menu_change_language")
+            InlineKeyboardButton(get_text("menu_profile", lang_code), callback_data=encode_callback("menu", "profile")),
+            InlineKeyboardButton(get_text("menu_change_language", lang_code), callback_data=encode_callback("menu", "change_language"))
         ]
     ]
     
@@ -100,46 +101,50 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     await query.answer()
     
     user_id = query.from_user.id
-    callback_data = query.data
+    _, args = decode_callback(query.data)
+    option = args[0] if args else None
     lang_code = get_user_language(user_id)
     
+    # Leaving through the menu ends any half-finished flow or pending prompt, so typed text is not taken as its input
+    from handlers.flows import engine, GOAL_SETTING
+    engine.abandon(update, context)
+    clear_pending_prompts(context)
+    
     # Process different menu options
-    if callback_data == "menu_set_goal":
-        # Redirect to goals module
-        logger.info(f"🎯 User {user_id} selected SET GOAL MENU OPTION")
-        logger.info(f"👉 Now redirecting to the goal setting flow which should start with income assessment")
-        from handlers import goals
-        await goals.start_goal_setting(update, context)
+    if option == "set_goal":
+        # Start the goal setting flow
+        logger.debug("User %s selected set_goal from the menu", user_id)
+        await engine.start(GOAL_SETTING, update, context)
         
-    elif callback_data == "menu_log_expense":
+    elif option == "log_expense":
         # Ask user to enter expense
         prompt_text = get_text("enter_expense", lang_code)
         await query.edit_message_text(text=prompt_text)
         context.user_data["expecting_expense"] = True
         
-    elif callback_data == "menu_ask_advice":
+    elif option == "ask_advice":
         # Ask user what they need advice on
-        logger.info(f"User {user_id} selected menu_ask_advice")
+        logger.debug("User %s selected menu_ask_advice", user_id)
         from handlers import advice
         await advice.show_advice_categories(update, context)
         
-    elif callback_data == "menu_view_expenses":
+    elif option == "view_expenses":
         # Redirect to expenses module
         from handlers import expenses
         await expenses.show_expenses(update, context)
         
-    elif callback_data == "menu_profile":
+    elif option == "profile":
         # Redirect to onboarding/profile module
         from handlers import onboarding
         await onboarding.show_profile(update, context)
         
-    elif callback_data == "menu_change_language":
+    elif option == "change_language":
         # Show language selection again
         keyboard = []
         row = []
         for code in SUPPORTED_LANGUAGES:
             lang_name = get_language_name(code)
-            row.append(InlineKeyboardButton(lang_name, callback_data=f"set_lang_{code}"))
+            row.append(InlineKeyboardButton(lang_name, callback_data=encode_callback("set_lang", code)))
             if len(row) == 2:
                 keyboard.append(row)
                 row = []
@@ -150,9 +155,48 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         prompt_text = get_text("select_language_prompt", lang_code)
         await query.edit_message_text(text=prompt_text, reply_markup=reply_markup)
 
+def clear_pending_prompts(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drops 'expecting_*' flags left by prompts the user walked away from."""
+    for key in [k for k in context.user_data if k.startswith("expecting_")]:
+        del context.user_data[key]
+
+async def back_to_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles the 'back to menu' button shown under most flows."""
+    query = update.callback_query
+    await query.answer()
+    from handlers.flows import engine
+    engine.abandon(update, context)
+    clear_pending_prompts(context)
+    await show_main_menu(update, context)
+
+async def wait_for_llm_slot(update: Update, lang_code: str) -> bool:
+    """
+    Applies the LLM rate limits before an OpenAI-backed request.
+
+    Waits (after telling the user) when the request is queued; returns False,
+    after telling the user to try again later, when it is rejected. Only this
+    user's later updates wait behind it (see utils/update_processor.py).
+    """
+    user_id = update.effective_user.id
+    try:
+        wait = reserve_llm_call(user_id)
+    except RateLimited as e:
+        logger.warning("Rejected LLM request from user %s: %s", user_id, e)
+        await update.effective_message.reply_text(get_text("rate_limit_exceeded", lang_code))
+        return False
+    if wait > 0:
+        logger.info("Queueing LLM request from user %s for %.1fs", user_id, wait)
+        await update.effective_message.reply_text(
+            render_text("rate_limit_queued", lang_code, seconds=math.ceil(wait))
+        )
+        await asyncio.sleep(wait)
+    return True
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles errors in the telegram-python-bot library."""
-    logger.error(f"Update {update} caused error {context.error}")
+    # Log the update id rather than the whole Update: its repr is large and carries message contents
+    update_id = update.update_id if isinstance(update, Update) else None
+    logger.error("Update %s caused error %s", update_id, context.error, exc_info=context.error)
     
     # If we can identify the user, send them an error message
     if update and update.effective_user:
@@ -167,12 +211,8 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             elif update.effective_message:
                 await update.effective_message.reply_text(error_text)
         except Exception as e:
-            logger.error(f"Failed to send error message: {e}")
+            logger.error("Failed to send error message: %s", e)
 
 # Command handlers
 start_handler = CommandHandler('start', start)
-menu_handler = CommandHandler('menu', show_main_menu)
-
-# Callback handlers
-language_callback_handler = CallbackQueryHandler(language_select_callback, pattern='^set_lang_')
-menu_callback_handler = CallbackQueryHandler(menu_callback, pattern='^menu_')
\ No newline at end of file
+menu_handler = CommandHandler('menu', show_main_menu)
\ No newline at end of file
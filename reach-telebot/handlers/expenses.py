@@ -1,11 +1,15 @@
 # handlers/expenses.py
+import asyncio
 import logging
-from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters, CallbackQueryHandler
-from utils.localization import get_text
+from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
+from utils.localization import get_text, render_text
 from utils.firebase_client import get_user_language, save_expense, get_expenses
 from utils.openai_client import parse_expense
+from utils.models import Expense, format_amount
+from utils import categories, category_model, fx
+from utils.callback_data import encode_callback, decode_callback
+from handlers.common import wait_for_llm_slot
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -40,8 +44,15 @@ async def process_expense_text(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = update.effective_user.id
     lang_code = get_user_language(user_id)
     
-    # Use OpenAI to parse the expense
-    expense_data = parse_expense(expense_text, lang_code)
+    # One amount plus a category the local model is sure of needs no LLM call
+    expense_data = category_model.quick_parse(expense_text, lang_code)
+    if expense_data is None:
+        # Apply the per-user and global LLM limits
+        if not await wait_for_llm_slot(update, lang_code):
+            return
+
+        # Use OpenAI to parse the expense, in a worker thread so other updates keep flowing
+        expense_data = await asyncio.to_thread(parse_expense, expense_text, lang_code)
     
     if "error" in expense_data:
         # Failed to parse expense
@@ -49,30 +60,24 @@ async def process_expense_text(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text(text=error_message)
         return
     
-    # Add timestamp and user ID
-    expense_data["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Save the expense
-    save_expense(user_id, expense_data)
+    # Convert to an Expense (minor units, current timestamp) with its canonical category and
+    # home-currency amount, and save it
+    expense = fx.normalize(categories.normalize(Expense.from_parsed(expense_data)))
+    save_expense(user_id, expense)
     
     # Confirm to the user
-    amount = expense_data.get("amount", 0)
-    currency = expense_data.get("currency", "")
-    category = expense_data.get("category", "")
-    description = expense_data.get("description", "")
-    
-    confirmation = get_text("expense_saved", lang_code).format(
-        amount=amount,
-        currency=currency,
-        category=category,
-        description=description
+    confirmation = render_text("expense_saved", lang_code,
+        amount=expense.display_amount,
+        currency=expense.currency,
+        category=categories.display_name(expense.category_id, lang_code),
+        description=expense.description
     )
     
     # Add buttons to add another expense or view all expenses
     keyboard = [
-        [InlineKeyboardButton(get_text("log_another_expense", lang_code), callback_data="log_another_expense")],
-        [InlineKeyboardButton(get_text("view_expenses", lang_code), callback_data="menu_view_expenses")],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+        [InlineKeyboardButton(get_text("log_another_expense", lang_code), callback_data=encode_callback("log_expense"))],
+        [InlineKeyboardButton(get_text("view_expenses", lang_code), callback_data=encode_callback("menu", "view_expenses"))],
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -99,51 +104,50 @@ async def show_expenses(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             await update.message.reply_text(text=no_expenses_text)
         return
     
-    # Calculate total and organize by category
+    # Calculate total and organize by category (in home-currency minor units)
     total = 0
-    categories = {}
+    by_category = {}  # category ID -> amount
+    unconverted = 0
     
     for expense in expenses:
-        amount = expense.get("amount", 0)
-        currency = expense.get("currency", "")
-        category = expense.get("category", "Other")
-        
-        total += amount
-        
-        if category not in categories:
-            categories[category] = 0
-        categories[category] += amount
+        amount_minor = fx.home_amount_minor(expense)
+        if amount_minor is None:
+            # No rate for its currency; listed below but left out of the totals
+            unconverted += 1
+            continue
+        total += amount_minor
+        category_id = categories.category_id(expense)
+        by_category[category_id] = by_category.get(category_id, 0) + amount_minor
+    
+    currency = fx.HOME_CURRENCY
     
     # Format expenses summary
-    expenses_text = get_text("expenses_summary", lang_code).format(
+    expenses_text = render_text("expenses_summary", lang_code,
         count=len(expenses),
-        total=total,
-        currency=expenses[0].get("currency", "") if expenses else ""
+        total=format_amount(total, currency),
+        currency=currency
     )
     
     # Add category breakdown
     expenses_text += "\n\n" + get_text("expenses_by_category", lang_code) + "\n"
     
-    for category, amount in categories.items():
-        expenses_text += f"{category}: {amount}\n"
+    for category_id, amount_minor in sorted(by_category.items(), key=lambda item: -item[1]):
+        expenses_text += f"{categories.display_name(category_id, lang_code)}: {format_amount(amount_minor, currency)}\n"
+    if unconverted:
+        expenses_text += render_text("expenses_unconverted", lang_code, count=unconverted) + "\n"
     
     # Add recent expenses (last 5)
-    if len(expenses) > 0:
-        expenses_text += "\n" + get_text("recent_expenses", lang_code) + "\n"
-        
-        for expense in reversed(expenses[-5:]): # Show last 5 expenses in reverse order (newest first)
-            date = expense.get("timestamp", "").split(" ")[0] if "timestamp" in expense else ""
-            amount = expense.get("amount", 0)
-            currency = expense.get("currency", "")
-            category = expense.get("category", "")
-            description = expense.get("description", "")
-            
-            expenses_text += f"{date}: {amount} {currency} - {category} ({description})\n"
+    expenses_text += "\n" + get_text("recent_expenses", lang_code) + "\n"
+    
+    for expense in reversed(expenses[-5:]): # Show last 5 expenses in reverse order (newest first)
+        date = expense.timestamp.astimezone().strftime("%Y-%m-%d") if expense.timestamp else ""
+        expenses_text += f"{date}: {expense.display_amount} {expense.currency} - {categories.display_name(categories.category_id(expense), lang_code)} ({expense.description})\n"
     
     # Add action buttons
     keyboard = [
-        [InlineKeyboardButton(get_text("log_expense", lang_code), callback_data="log_another_expense")],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+        [InlineKeyboardButton(get_text("log_expense", lang_code), callback_data=encode_callback("log_expense"))],
+        [InlineKeyboardButton(get_text("view_charts", lang_code), callback_data=encode_callback("chart", "expenses"))],
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -160,20 +164,19 @@ async def expense_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    if query.data == "log_another_expense":
+    action, args = decode_callback(query.data)
+    
+    if action == "log_expense":
         # Ask user to enter expense details
         prompt = get_text("enter_expense", lang_code)
         await query.edit_message_text(text=prompt)
         context.user_data["expecting_expense"] = True
     
-    elif query.data == "menu_view_expenses":
+    elif action == "menu" and args == ["view_expenses"]:
         # Show expenses
         await show_expenses(update, context)
     
-    elif query.data == "back_to_menu":
+    elif action == "back_to_menu":
         # Show main menu
         from handlers.common import show_main_menu
-        await show_main_menu(update, context, lang_code)
-
-# Register handlers
-expense_callback_handler = CallbackQueryHandler(expense_callback, pattern='^(log_another_expense|menu_view_expenses|back_to_menu)$')
\ No newline at end of file
+        await show_main_menu(update, context, lang_code)
\ No newline at end of file
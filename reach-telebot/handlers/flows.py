@@ -0,0 +1,54 @@
+# handlers/flows.py
+"""
+Transition tables for the onboarding and goal-setting conversations.
+
+Each state maps the events it accepts (callback actions, or TEXT for typed
+input) to the handler that runs; the handler returns the next state. Both
+flows are run by the single engine below, which main.py wires to commands,
+the callback router and the text handler.
+"""
+from handlers import goals, onboarding
+from utils.flow_engine import Flow, FlowEngine, TEXT
+
+ONBOARDING = "onboarding"
+GOAL_SETTING = "goal_setting"
+
+onboarding_flow = Flow(
+    name=ONBOARDING,
+    entry=onboarding.start_onboarding,
+    cancel=onboarding.cancel,
+    data_prefixes=("profile_",),
+    states={
+        onboarding.INCOME: ("income", {"income": onboarding.income_callback}),
+        onboarding.GOAL: ("goal", {"goal": onboarding.goal_callback}),
+        onboarding.DEBT: ("debt", {"debt": onboarding.debt_callback}),
+        onboarding.FAMILY: ("family", {"family": onboarding.family_callback}),
+        onboarding.CONFIRMATION: ("confirmation", {"confirm": onboarding.confirmation_callback}),
+    }
+)
+
+goal_flow = Flow(
+    name=GOAL_SETTING,
+    entry=goals.start_goal_setting,
+    cancel=goals.cancel,
+    data_prefixes=("goal_", "income_", "family_", "spending_", "micro_goals"),
+    states={
+        goals.INCOME_ASSESSMENT: ("income", {"income": goals.income_assessment_callback}),
+        goals.FAMILY_ASSESSMENT: ("family_needs", {"family_needs": goals.family_assessment_callback}),
+        goals.SPENDING_ASSESSMENT: ("spending", {"spending": goals.spending_assessment_callback}),
+        goals.GOAL_TYPE: ("goal_type", {
+            "goal_sugg": goals.goal_suggestion_callback,
+            "goal_type": goals.goal_type_callback,
+            "goal_custom": goals.goal_type_callback,
+        }),
+        goals.GOAL_AMOUNT: ("amount", {TEXT: goals.goal_amount_handler}),
+        goals.GOAL_DEADLINE: ("deadline", {"deadline": goals.goal_deadline_callback}),
+        goals.GOAL_STEPS: ("steps", {
+            "steps": goals.goal_steps_callback,
+            TEXT: goals.goal_custom_steps_handler,
+        }),
+        goals.GOAL_CONFIRMATION: ("confirmation", {"goal_confirm": goals.goal_confirmation_callback}),
+    }
+)
+
+engine = FlowEngine([onboarding_flow, goal_flow])
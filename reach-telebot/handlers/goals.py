@@ -1,18 +1,44 @@
 # handlers/goals.py
+import asyncio
 import logging
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import (
-    ContextTypes, ConversationHandler, CommandHandler,
-    CallbackQueryHandler, MessageHandler, filters
-)
-from utils.localization import get_text
+from telegram.ext import ContextTypes, ConversationHandler
+from utils.localization import get_text, render_text, has_text
 from utils.firebase_client import get_user_language, save_goal, get_goals
 from utils.openai_client import get_behavioral_goal_suggestions
+from utils import content_cache
+from utils.models import Goal, format_amount, to_minor, utc_now
+from utils.callback_data import encode_callback, decode_callback
+from utils.rate_limit import reserve_llm_call, RateLimited
 
 # Define conversation states
 INCOME_ASSESSMENT, FAMILY_ASSESSMENT, SPENDING_ASSESSMENT, GOAL_TYPE, GOAL_AMOUNT, GOAL_DEADLINE, GOAL_STEPS, GOAL_CONFIRMATION, MICRO_GOALS = range(9)
 
+# Assessment option descriptions used as OpenAI context
+INCOME_OPTIONS = {
+    1: "Less than $500 per month",
+    2: "$500-1000 per month", 
+    3: "$1000-1500 per month",
+    4: "$1500-2000 per month",
+    5: "More than $2000 per month"
+}
+FAMILY_OPTIONS = {
+    1: "Single, no dependents",
+    2: "Supporting family in Singapore", 
+    3: "Sending money to family in home country",
+    4: "Supporting children's education"
+}
+SPENDING_OPTIONS = {
+    1: "Saves regularly with discipline",
+    2: "Sends most income to family", 
+    3: "Spends as needed, some impulse purchases",
+    4: "Struggles to make income last until next payday"
+}
+
+# Additional migrant worker context
+CURRENT_SITUATION = "Migrant worker in Singapore. Likely uses cash for most transactions. May send money home through remittance services. Possibly has limited financial literacy and banking access."
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -20,14 +46,8 @@ async def start_goal_setting(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Starts the enhanced goal setting process with multiple assessments for context."""
     user_id = update.effective_user.id
     lang_code = get_user_language(user_id)
-    logger.info(f"====== STARTING GOAL SETTING FLOW for user {user_id} ======")
-    logger.info(f"🔍 This should lead through: income → family → spending → personalized goals")
-    
-    # Check if the function was called directly or via a callback
-    if update.callback_query:
-        logger.info(f"👉 Called via callback: {update.callback_query.data}")
-    else:
-        logger.info(f"👉 Called directly via command")
+    logger.debug("Starting goal setting for user %s (via %s)", user_id,
+                 "callback" if update.callback_query else "command")
     
     # Clear any previous goal data to start fresh
     for key in list(context.user_data.keys()):
@@ -36,14 +56,13 @@ async def start_goal_setting(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     # Start with income assessment to make goals more contextual
     keyboard = [
-        [InlineKeyboardButton(get_text("income_option_1", lang_code), callback_data="income_1")],
-        [InlineKeyboardButton(get_text("income_option_2", lang_code), callback_data="income_2")],
-        [InlineKeyboardButton(get_text("income_option_3", lang_code), callback_data="income_3")],
-        [InlineKeyboardButton(get_text("income_option_4", lang_code), callback_data="income_4")],
-        [InlineKeyboardButton(get_text("income_option_5", lang_code), callback_data="income_5")],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+        [InlineKeyboardButton(get_text("income_option_1", lang_code), callback_data=encode_callback("income", 1))],
+        [InlineKeyboardButton(get_text("income_option_2", lang_code), callback_data=encode_callback("income", 2))],
+        [InlineKeyboardButton(get_text("income_option_3", lang_code), callback_data=encode_callback("income", 3))],
+        [InlineKeyboardButton(get_text("income_option_4", lang_code), callback_data=encode_callback("income", 4))],
+        [InlineKeyboardButton(get_text("income_option_5", lang_code), callback_data=encode_callback("income", 5))],
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
     ]
-    logger.info(f"Creating income assessment keyboard for goal setting")
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Add an emoji and behavioral science explanation about income context
@@ -64,36 +83,23 @@ async def income_assessment_callback(update: Update, context: ContextTypes.DEFAU
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    logger.info(f"⭐ INCOME ASSESSMENT CALLBACK TRIGGERED: {query.data}")
-    logger.info(f"👉 This should now proceed to family assessment")
-    
-    # Debug the user's current state
-    logger.info(f"Current conversation state: {context.user_data.get('conversation_state')}")
-    logger.info(f"User data keys: {list(context.user_data.keys())}")
+    logger.debug("Income assessment callback: %s (flow %s)", query.data, context.user_data.get('flow'))
     
     # Save income level
-    income_level = int(query.data.split('_')[1])
+    income_level = int(decode_callback(query.data)[1][0])
     context.user_data['income_level'] = income_level
     
     # Store income text description for OpenAI context
-    income_options = {
-        1: "Less than $500 per month",
-        2: "$500-1000 per month", 
-        3: "$1000-1500 per month",
-        4: "$1500-2000 per month",
-        5: "More than $2000 per month"
-    }
-    context.user_data['income_text'] = income_options.get(income_level)
+    context.user_data['income_text'] = INCOME_OPTIONS.get(income_level)
     
     # Create keyboard with family needs assessment options
     keyboard = [
-        [InlineKeyboardButton(get_text("family_option_1", lang_code), callback_data="family_needs_1")],
-        [InlineKeyboardButton(get_text("family_option_2", lang_code), callback_data="family_needs_2")],
-        [InlineKeyboardButton(get_text("family_option_3", lang_code), callback_data="family_needs_3")],
-        [InlineKeyboardButton(get_text("family_option_4", lang_code), callback_data="family_needs_4")],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+        [InlineKeyboardButton(get_text("family_option_1", lang_code), callback_data=encode_callback("family_needs", 1))],
+        [InlineKeyboardButton(get_text("family_option_2", lang_code), callback_data=encode_callback("family_needs", 2))],
+        [InlineKeyboardButton(get_text("family_option_3", lang_code), callback_data=encode_callback("family_needs", 3))],
+        [InlineKeyboardButton(get_text("family_option_4", lang_code), callback_data=encode_callback("family_needs", 4))],
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
     ]
-    logger.info(f"Creating family needs assessment keyboard")
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Show behaviorally-informed prompt based on income level
@@ -115,30 +121,23 @@ async def family_assessment_callback(update: Update, context: ContextTypes.DEFAU
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    logger.info(f"Family needs assessment callback: {query.data}")
+    logger.debug("Family needs assessment callback: %s", query.data)
     
     # Save family needs information
-    family_option = int(query.data.split('_')[-1])
+    family_option = int(decode_callback(query.data)[1][0])
     context.user_data['family_needs'] = family_option
     
     # Store family text description for OpenAI context
-    family_options = {
-        1: "Single, no dependents",
-        2: "Supporting family in Singapore", 
-        3: "Sending money to family in home country",
-        4: "Supporting children's education"
-    }
-    context.user_data['family_text'] = family_options.get(family_option)
+    context.user_data['family_text'] = FAMILY_OPTIONS.get(family_option)
     
     # Create keyboard with spending patterns assessment
     keyboard = [
-        [InlineKeyboardButton(get_text("spending_option_1", lang_code), callback_data="spending_1")],
-        [InlineKeyboardButton(get_text("spending_option_2", lang_code), callback_data="spending_2")],
-        [InlineKeyboardButton(get_text("spending_option_3", lang_code), callback_data="spending_3")],
-        [InlineKeyboardButton(get_text("spending_option_4", lang_code), callback_data="spending_4")],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+        [InlineKeyboardButton(get_text("spending_option_1", lang_code), callback_data=encode_callback("spending", 1))],
+        [InlineKeyboardButton(get_text("spending_option_2", lang_code), callback_data=encode_callback("spending", 2))],
+        [InlineKeyboardButton(get_text("spending_option_3", lang_code), callback_data=encode_callback("spending", 3))],
+        [InlineKeyboardButton(get_text("spending_option_4", lang_code), callback_data=encode_callback("spending", 4))],
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
     ]
-    logger.info(f"Creating spending assessment keyboard")
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Show behaviorally-informed prompt based on family needs
@@ -162,20 +161,14 @@ async def spending_assessment_callback(update: Update, context: ContextTypes.DEF
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    logger.info(f"Spending assessment callback: {query.data}")
+    logger.debug("Spending assessment callback: %s", query.data)
     
     # Save spending pattern information
-    spending_option = int(query.data.split('_')[-1])
+    spending_option = int(decode_callback(query.data)[1][0])
     context.user_data['spending_pattern'] = spending_option
     
     # Store spending text description for OpenAI context
-    spending_options = {
-        1: "Saves regularly with discipline",
-        2: "Sends most income to family", 
-        3: "Spends as needed, some impulse purchases",
-        4: "Struggles to make income last until next payday"
-    }
-    context.user_data['spending_text'] = spending_options.get(spending_option)
+    context.user_data['spending_text'] = SPENDING_OPTIONS.get(spending_option)
     
     # Notify user we're generating personalized goals
     processing_text = get_text("generating_personalized_goals", lang_code)
@@ -186,25 +179,37 @@ async def spending_assessment_callback(update: Update, context: ContextTypes.DEF
     family_text = context.user_data.get('family_text', "Family information not provided")
     spending_text = context.user_data.get('spending_text', "Spending information not provided")
     
-    # Additional migrant worker context
-    current_situation = "Migrant worker in Singapore. Likely uses cash for most transactions. May send money home through remittance services. Possibly has limited financial literacy and banking access."
-    
-    logger.info(f"Getting behavioral goal suggestions for user {user_id}")
-    logger.info(f"Context - Income: {income_text}, Family: {family_text}, Spending: {spending_text}")
+    logger.debug("Goal suggestion context for user %s - Income: %s, Family: %s, Spending: %s",
+                 user_id, income_text, family_text, spending_text)
     
     # Get personalized goal suggestions from OpenAI as originally intended
     try:
-        logger.info("⭐⭐⭐ ATTEMPTING TO GET PERSONALIZED GOAL SUGGESTIONS FROM OPENAI ⭐⭐⭐")
-        # Call OpenAI for personalized suggestions using the behavioral science context
-        goal_suggestions = get_behavioral_goal_suggestions(
-            income=income_text,
-            family_needs=family_text,
-            current_situation=f"{spending_text}. {current_situation}",
-            lang_code=lang_code
+        # Use suggestions pre-generated by the batch job when this combination has them
+        goal_suggestions = content_cache.get_suggestions(
+            context.user_data.get('income_level'),
+            context.user_data.get('family_needs'),
+            spending_option,
+            lang_code
         )
-        logger.info(f"Received {len(goal_suggestions)} goal suggestions from OpenAI")
-        # Log the actual suggestions for debugging
-        logger.info(f"Suggestion details: {goal_suggestions}")
+        if goal_suggestions:
+            logger.debug("Using pre-generated goal suggestions")
+        else:
+            # Queue behind the per-user and global LLM limits; the caller already sees the progress message
+            wait = reserve_llm_call(user_id)
+            if wait > 0:
+                logger.info("Queueing goal suggestions for user %s for %.1fs", user_id, wait)
+                await asyncio.sleep(wait)
+            # Call OpenAI for personalized suggestions using the behavioral science context.
+            # Run it in a worker thread so other users' updates keep flowing and identical
+            # concurrent requests can be coalesced into a single upstream call.
+            goal_suggestions = await asyncio.to_thread(
+                get_behavioral_goal_suggestions,
+                income=income_text,
+                family_needs=family_text,
+                current_situation=f"{spending_text}. {CURRENT_SITUATION}",
+                lang_code=lang_code
+            )
+        logger.debug("Goal suggestions for user %s: %s", user_id, goal_suggestions)
         
         # If OpenAI fails to provide suggestions, log error and raise exception
         if not goal_suggestions:
@@ -213,14 +218,13 @@ async def spending_assessment_callback(update: Update, context: ContextTypes.DEF
         
         # Store suggestions for later use
         context.user_data['goal_suggestions'] = goal_suggestions
-        logger.info(f"Created {len(goal_suggestions)} contextual goal suggestions")
         
         # Create keyboard with suggested goals
         keyboard = []
         for i, suggestion in enumerate(goal_suggestions):
             goal_name = suggestion.get('goal')
             # Generate a more distinctive callback pattern
-            goal_id = f"goal_sugg_{i}"
+            goal_id = encode_callback("goal_sugg", i)
             
             # Format button text with emoji prefix based on goal type
             if "Emergency" in goal_name or "Sav" in goal_name:
@@ -241,12 +245,10 @@ async def spending_assessment_callback(update: Update, context: ContextTypes.DEF
             # Create button with emoji and goal name
             button_text = f"{emoji} {goal_name}"
             keyboard.append([InlineKeyboardButton(button_text, callback_data=goal_id)])
-            logger.info(f"Added suggestion button with callback: {goal_id}")
         
         # Add custom goal option at the bottom
-        keyboard.append([InlineKeyboardButton(get_text("custom_goal_option", lang_code), callback_data="goal_custom")])
-        logger.info("Added custom goal option with callback: goal_custom")
-        keyboard.append([InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")])
+        keyboard.append([InlineKeyboardButton(get_text("custom_goal_option", lang_code), callback_data=encode_callback("goal_custom"))])
+        keyboard.append([InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -256,27 +258,33 @@ async def spending_assessment_callback(update: Update, context: ContextTypes.DEF
         # Add behavioral science explanation about why these goals are suggested
         behavioral_context = get_text("goal_behavioral_context", lang_code)
         
-        logger.info(f"Showing goal suggestions with callbacks: {[btn[0].callback_data for btn in keyboard if len(btn) > 0]}")
         await query.edit_message_text(text=f"{goal_prompt}\n\n{behavioral_context}", reply_markup=reply_markup)
         
+    except RateLimited as e:
+        # Throttled: offer the standard goal types, which need no OpenAI call
+        logger.warning("Goal suggestions for user %s throttled: %s", user_id, e)
+        await _show_default_goal_types(query, lang_code)
     except Exception as e:
-        logger.error(f"❌❌❌ ERROR GETTING PERSONALIZED GOALS: {type(e).__name__}: {e}", exc_info=True)
-        logger.error(f"User context data: {context.user_data}")
+        logger.error("Error getting personalized goals for user %s: %s: %s", user_id, type(e).__name__, e, exc_info=True)
         # Fallback to default goal types if OpenAI integration fails
-        keyboard = [
-            [InlineKeyboardButton(get_text("family_goal_savings", lang_code), callback_data="goal_type_savings")],
-            [InlineKeyboardButton(get_text("family_goal_remittance", lang_code), callback_data="goal_type_remittance")],
-            [InlineKeyboardButton(get_text("family_goal_education", lang_code), callback_data="goal_type_education")],
-            [InlineKeyboardButton(get_text("family_goal_health", lang_code), callback_data="goal_type_health")],
-            [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        prompt = get_text("family_goal_question", lang_code)
-        await query.edit_message_text(text=prompt, reply_markup=reply_markup)
+        await _show_default_goal_types(query, lang_code)
     
     return GOAL_TYPE
 
+async def _show_default_goal_types(query, lang_code: str) -> None:
+    """Shows the standard goal types when personalized suggestions are unavailable."""
+    keyboard = [
+        [InlineKeyboardButton(get_text("family_goal_savings", lang_code), callback_data=encode_callback("goal_type", "savings"))],
+        [InlineKeyboardButton(get_text("family_goal_remittance", lang_code), callback_data=encode_callback("goal_type", "remittance"))],
+        [InlineKeyboardButton(get_text("family_goal_education", lang_code), callback_data=encode_callback("goal_type", "education"))],
+        [InlineKeyboardButton(get_text("family_goal_health", lang_code), callback_data=encode_callback("goal_type", "health"))],
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    prompt = get_text("family_goal_question", lang_code)
+    await query.edit_message_text(text=prompt, reply_markup=reply_markup)
+
 async def goal_suggestion_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles selection of a suggested goal from OpenAI."""
     query = update.callback_query
@@ -285,24 +293,20 @@ async def goal_suggestion_callback(update: Update, context: ContextTypes.DEFAULT
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    logger.info(f"Goal suggestion callback: {query.data}")
+    logger.debug("Goal suggestion callback: %s", query.data)
     
     # Get the selected suggestion index from callback data like 'goal_sugg_0'
     try:
         # Extract the number at the end (the suggestion index)
-        suggestion_index = int(query.data.split('_')[-1])
-        logger.info(f"Selected suggestion index: {suggestion_index}")
+        suggestion_index = int(decode_callback(query.data)[1][0])
         goal_suggestions = context.user_data.get('goal_suggestions', [])
-        logger.info(f"Available goal suggestions: {len(goal_suggestions)}")
         
         # Check if we have this suggestion in our context data
         if not goal_suggestions:
-            logger.warning(f"No goal suggestions found in context for callback: {query.data}")
-            # Debugging: print all user context data
-            logger.info(f"User context keys: {list(context.user_data.keys())}")
+            logger.warning("No goal suggestions found in context for callback: %s", query.data)
             return await goal_type_callback(update, context)
     except (ValueError, IndexError) as e:
-        logger.error(f"Error parsing suggestion index from {query.data}: {e}")
+        logger.error("Error parsing suggestion index from %s: %s", query.data, e)
         return await goal_type_callback(update, context)
     
     if suggestion_index < len(goal_suggestions):
@@ -352,17 +356,19 @@ async def goal_type_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    logger.info(f"Goal type callback: {query.data}")
+    logger.debug("Goal type callback: %s", query.data)
+    
+    action, args = decode_callback(query.data)
     
     # Check if this is a custom goal selection
-    if query.data == "goal_custom":
+    if action == "goal_custom":
         # Show standard goal type options
         keyboard = [
-            [InlineKeyboardButton(get_text("family_goal_savings", lang_code), callback_data="goal_type_savings")],
-            [InlineKeyboardButton(get_text("family_goal_remittance", lang_code), callback_data="goal_type_remittance")],
-            [InlineKeyboardButton(get_text("family_goal_education", lang_code), callback_data="goal_type_education")],
-            [InlineKeyboardButton(get_text("family_goal_health", lang_code), callback_data="goal_type_health")],
-            [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+            [InlineKeyboardButton(get_text("family_goal_savings", lang_code), callback_data=encode_callback("goal_type", "savings"))],
+            [InlineKeyboardButton(get_text("family_goal_remittance", lang_code), callback_data=encode_callback("goal_type", "remittance"))],
+            [InlineKeyboardButton(get_text("family_goal_education", lang_code), callback_data=encode_callback("goal_type", "education"))],
+            [InlineKeyboardButton(get_text("family_goal_health", lang_code), callback_data=encode_callback("goal_type", "health"))],
+            [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -371,9 +377,9 @@ async def goal_type_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return GOAL_TYPE
     
     # Handle standard goal type selection
-    if query.data.startswith("goal_type_"):
+    if action == "goal_type":
         # Save goal type
-        goal_type = query.data.split('_')[-1]
+        goal_type = args[0]
         context.user_data['goal_type'] = goal_type
         
         # Provide more context based on goal type and income
@@ -404,12 +410,12 @@ async def goal_type_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return GOAL_AMOUNT
     else:
         # Handle goal suggestion selection (callback pattern starts with 'goal_sugg_')
-        if query.data.startswith('goal_sugg_'):
-            logger.info(f"Redirecting to goal_suggestion_callback for {query.data}")
+        if action == "goal_sugg":
+            logger.debug("Redirecting to goal_suggestion_callback for %s", query.data)
             return await goal_suggestion_callback(update, context)
         
         # If we get here, it's an unhandled callback
-        logger.warning(f"Unhandled goal type callback: {query.data}")
+        logger.warning("Unhandled goal type callback: %s", query.data)
         return GOAL_TYPE
 
 async def goal_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -417,7 +423,7 @@ async def goal_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id = update.effective_user.id
     lang_code = get_user_language(user_id)
     
-    logger.info(f"Handling goal amount for user {user_id}")
+    logger.debug("Handling goal amount for user %s", user_id)
     
     # Try to parse the amount
     try:
@@ -430,7 +436,7 @@ async def goal_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # Save goal amount
         context.user_data['goal_amount'] = amount
-        logger.info(f"Parsed amount: {amount}")
+        logger.debug("Parsed amount: %s", amount)
         
         # Calculate monthly amount needed based on goal type
         goal_type = context.user_data.get('goal_type', 'savings')
@@ -441,22 +447,22 @@ async def goal_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # For smaller goals or lower income, offer shorter timeframes
         if amount < 500 or income_level <= 2:
-            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_next_payday", lang_code), callback_data="deadline_0.5")])
-            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_1month", lang_code), callback_data="deadline_1")])
-            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_3months", lang_code), callback_data="deadline_3")])
+            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_next_payday", lang_code), callback_data=encode_callback("deadline", "0.5"))])
+            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_1month", lang_code), callback_data=encode_callback("deadline", 1))])
+            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_3months", lang_code), callback_data=encode_callback("deadline", 3))])
         else:
-            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_1month", lang_code), callback_data="deadline_1")])
-            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_3months", lang_code), callback_data="deadline_3")])
-            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_6months", lang_code), callback_data="deadline_6")])
-            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_1year", lang_code), callback_data="deadline_12")])
+            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_1month", lang_code), callback_data=encode_callback("deadline", 1))])
+            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_3months", lang_code), callback_data=encode_callback("deadline", 3))])
+            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_6months", lang_code), callback_data=encode_callback("deadline", 6))])
+            keyboard.append([InlineKeyboardButton("🗓️ " + get_text("deadline_1year", lang_code), callback_data=encode_callback("deadline", 12))])
         
-        keyboard.append([InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")])
+        keyboard.append([InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         # Calculate monthly savings needed and provide as context
         monthly_calculation = ""
         if amount > 100:
-            if "deadline_0.5" in str(keyboard):
+            if amount < 500 or income_level <= 2:  # The two-week option is offered
                 monthly_calculation = f"💵 Need to save {amount} in 2 weeks = about {amount/2:.0f} per week"
             else:
                 monthly_calculation = f"💵 Need to save {amount} in 1 month = about {amount/4:.0f} per week"
@@ -464,10 +470,6 @@ async def goal_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         prompt = get_text("goal_deadline_question", lang_code) + "\n\n" + monthly_calculation
         await update.message.reply_text(text=prompt, reply_markup=reply_markup)
         
-        # Update the conversation state for our standalone path
-        context.user_data['conversation_state'] = GOAL_DEADLINE
-        
-        # Still return the state for the ConversationHandler flow
         return GOAL_DEADLINE
     except (ValueError, TypeError):
         error_text = get_text("invalid_amount", lang_code)
@@ -483,7 +485,7 @@ async def goal_deadline_callback(update: Update, context: ContextTypes.DEFAULT_T
     lang_code = get_user_language(user_id)
     
     # Save deadline
-    months_str = query.data.split('_')[1]
+    months_str = decode_callback(query.data)[1][0]
     months = float(months_str)  # Support for half months (2 weeks)
     context.user_data['goal_deadline_months'] = months
     
@@ -562,10 +564,10 @@ async def goal_deadline_callback(update: Update, context: ContextTypes.DEFAULT_T
     # Ask if these steps are good
     keyboard = [
         [
-            InlineKeyboardButton(get_text("confirm_yes", lang_code), callback_data="steps_yes"),
-            InlineKeyboardButton(get_text("confirm_no", lang_code), callback_data="steps_no")
+            InlineKeyboardButton(get_text("confirm_yes", lang_code), callback_data=encode_callback("steps", "yes")),
+            InlineKeyboardButton(get_text("confirm_no", lang_code), callback_data=encode_callback("steps", "no"))
         ],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -580,12 +582,9 @@ async def goal_deadline_callback(update: Update, context: ContextTypes.DEFAULT_T
     elif goal_type == "health":
         motivation_text = "💝 Taking care of health is taking care of your family!"
     
-    prompt = get_text("goal_steps_question", lang_code).format(steps=steps) + "\n\n" + motivation_text
+    prompt = render_text("goal_steps_question", lang_code, steps=steps) + "\n\n" + motivation_text
     await query.edit_message_text(text=prompt, reply_markup=reply_markup)
     
-    # Update the conversation state for our standalone path
-    context.user_data['conversation_state'] = GOAL_STEPS
-    
     return GOAL_STEPS
 
 async def goal_steps_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -596,7 +595,7 @@ async def goal_steps_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    if query.data == "steps_yes":
+    if decode_callback(query.data)[1] == ["yes"]:
         # Steps are good, show goal summary
         return await show_goal_summary(update, context)
     else:
@@ -624,7 +623,7 @@ async def goal_custom_steps_handler(update: Update, context: ContextTypes.DEFAUL
     goal_amount = context.user_data['goal_amount']
     goal_deadline = context.user_data['goal_deadline']
     
-    summary = get_text("goal_summary", lang_code).format(
+    summary = render_text("goal_summary", lang_code,
         type=get_text(f"goal_type_{goal_type}", lang_code),
         amount=goal_amount,
         deadline=goal_deadline,
@@ -633,10 +632,10 @@ async def goal_custom_steps_handler(update: Update, context: ContextTypes.DEFAUL
     
     keyboard = [
         [
-            InlineKeyboardButton(get_text("confirm_yes", lang_code), callback_data="goal_confirm_yes"),
-            InlineKeyboardButton(get_text("confirm_no", lang_code), callback_data="goal_confirm_no")
+            InlineKeyboardButton(get_text("confirm_yes", lang_code), callback_data=encode_callback("goal_confirm", "yes")),
+            InlineKeyboardButton(get_text("confirm_no", lang_code), callback_data=encode_callback("goal_confirm", "no"))
         ],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -654,7 +653,7 @@ async def show_goal_summary(update: Update, context: ContextTypes.DEFAULT_TYPE)
     goal_deadline = context.user_data['goal_deadline']
     goal_steps = context.user_data['goal_steps']
     
-    summary = get_text("goal_summary", lang_code).format(
+    summary = render_text("goal_summary", lang_code,
         type=get_text(f"goal_type_{goal_type}", lang_code),
         amount=goal_amount,
         deadline=goal_deadline,
@@ -663,10 +662,10 @@ async def show_goal_summary(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     keyboard = [
         [
-            InlineKeyboardButton(get_text("confirm_yes", lang_code), callback_data="goal_confirm_yes"),
-            InlineKeyboardButton(get_text("confirm_no", lang_code), callback_data="goal_confirm_no")
+            InlineKeyboardButton(get_text("confirm_yes", lang_code), callback_data=encode_callback("goal_confirm", "yes")),
+            InlineKeyboardButton(get_text("confirm_no", lang_code), callback_data=encode_callback("goal_confirm", "no"))
         ],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -682,18 +681,16 @@ async def goal_confirmation_callback(update: Update, context: ContextTypes.DEFAU
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    if query.data == "goal_confirm_yes":
+    if decode_callback(query.data)[1] == ["yes"]:
         # Save goal to Firebase
-        goal_data = {
-            'type': context.user_data['goal_type'],
-            'amount': context.user_data['goal_amount'],
-            'deadline': context.user_data['goal_deadline'],
-            'steps': context.user_data['goal_steps'],
-            'created_at': datetime.now().strftime("%Y-%m-%d"),
-            'progress': 0,
-            'completed': False
-        }
-        save_goal(user_id, goal_data)
+        goal = Goal(
+            type=context.user_data['goal_type'],
+            amount_minor=to_minor(context.user_data['goal_amount']),
+            deadline=datetime.strptime(context.user_data['goal_deadline'], "%Y-%m-%d").astimezone(),
+            steps=context.user_data['goal_steps'],
+            created_at=utc_now()
+        )
+        save_goal(user_id, goal)
         
         # Thank the user
         thank_text = get_text("goal_saved", lang_code)
@@ -753,13 +750,8 @@ async def view_goal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     latest_goal = goals[-1]
     
     # Format goal progress
-    progress = latest_goal.get('progress', 0)
-    amount = latest_goal.get('amount', 0)
-    progress_percentage = (progress / amount * 100) if amount > 0 else 0
-    
-    goal_type = latest_goal.get('type')
-    deadline = latest_goal.get('deadline')
-    steps = latest_goal.get('steps')
+    progress_percentage = latest_goal.progress_percentage
+    goal_type = latest_goal.type
     
     # Create visual progress bar with emojis
     progress_bar = ""
@@ -789,7 +781,7 @@ async def view_goal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     
     # Try to extract micro-goals from steps
     micro_goals = []
-    for line in steps.split("\n"):
+    for line in latest_goal.steps.split("\n"):
         if line.strip():
             micro_goals.append(line)
     
@@ -799,18 +791,15 @@ async def view_goal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         current_micro_goal = f"🎯 Current focus: {micro_goals[micro_goal_index]}"
     
     # Add days remaining calculation
-    from datetime import datetime
-    now = datetime.now()
-    deadline_date = datetime.strptime(deadline, "%Y-%m-%d")
-    days_remaining = (deadline_date - now).days
+    days_remaining = (latest_goal.deadline - utc_now()).days if latest_goal.deadline else 0
     days_text = f"📅 {days_remaining} days left to reach your goal" if days_remaining > 0 else "⏰ Deadline reached!"
     
     # Format goal display with more visual elements
-    goal_text = get_text("goal_display_visual", lang_code).format(
-        type=get_text(f"goal_type_{goal_type}", lang_code) if f"goal_type_{goal_type}" in get_text("", lang_code, return_keys=True) else goal_type,
-        amount=amount,
-        deadline=deadline,
-        progress=progress,
+    goal_text = render_text("goal_display_visual", lang_code,
+        type=get_text(f"goal_type_{goal_type}", lang_code) if has_text(f"goal_type_{goal_type}", lang_code) else goal_type,
+        amount=format_amount(latest_goal.amount_minor),
+        deadline=latest_goal.deadline.astimezone().strftime("%Y-%m-%d") if latest_goal.deadline else "",
+        progress=format_amount(latest_goal.progress_minor),
         percentage=progress_percentage,
         progress_bar=progress_bar,
         days_remaining=days_text,
@@ -845,43 +834,15 @@ async def view_goal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     
     # Add action buttons
     keyboard = [
-        [InlineKeyboardButton(get_text("update_progress", lang_code), callback_data="update_goal_progress")],
-        [InlineKeyboardButton(get_text("share_with_family", lang_code), callback_data="share_goal_with_family")],
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+        [InlineKeyboardButton(get_text("update_progress", lang_code), callback_data=encode_callback("update_goal_progress"))],
+        [InlineKeyboardButton(get_text("share_with_family", lang_code), callback_data=encode_callback("share_goal"))],
+        [InlineKeyboardButton(get_text("view_charts", lang_code), callback_data=encode_callback("chart", "goal"))],
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await update.message.reply_text(text=goal_text + "\n\n" + motivation + micro_goals_display, reply_markup=reply_markup)
 
-# Create a standalone handler for goal types
-async def goal_type_standalone_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Standalone handler for goal type selection."""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    lang_code = get_user_language(user_id)
-    
-    logger.info(f"Standalone goal type callback: {query.data}")
-    
-    # Save goal type
-    goal_type = query.data.split('_')[-1]
-    context.user_data['goal_type'] = goal_type
-    
-    # Let the user know we're ready for their input
-    prompt = get_text(f"goal_amount_question_{goal_type}", lang_code)
-    
-    # Add cancel option
-    keyboard = [
-        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(text=prompt + "\n\n" + "Type your amount directly in the chat.", reply_markup=reply_markup)
-    
-    # Now we need to manually advance the conversation
-    context.user_data['conversation_state'] = GOAL_AMOUNT
-
 # Add a handler for sharing goal progress with family
 async def share_goal_with_family(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Creates a shareable message for family about goal progress."""
@@ -898,10 +859,10 @@ async def share_goal_with_family(update: Update, context: ContextTypes.DEFAULT_T
     
     # Get latest goal
     latest_goal = goals[-1]
-    goal_type = latest_goal.get('type')
-    amount = latest_goal.get('amount', 0)
-    progress = latest_goal.get('progress', 0)
-    progress_percentage = (progress / amount * 100) if amount > 0 else 0
+    goal_type = latest_goal.type
+    amount = format_amount(latest_goal.amount_minor)
+    progress = format_amount(latest_goal.progress_minor)
+    progress_percentage = latest_goal.progress_percentage
     
     # Create a simple shareable message
     if goal_type == "remittance":
@@ -919,40 +880,3 @@ async def share_goal_with_family(update: Update, context: ContextTypes.DEFAULT_T
         share_message + "\n\n" +
         get_text("share_message_instructions", lang_code)
     )
-
-# Define a handler class for callbacks with additional logging
-class LoggingCallbackHandler(CallbackQueryHandler):
-    async def handle_update(self, update, dispatcher, check_result, context):
-        if update.callback_query:
-            logger.debug(f"Handling callback: {update.callback_query.data}")
-        return await super().handle_update(update, dispatcher, check_result, context)
-
-# Create the goal setting conversation handler with more verbose debugging
-goal_handler = ConversationHandler(
-    entry_points=[
-        CommandHandler('goal', start_goal_setting),
-        CallbackQueryHandler(start_goal_setting, pattern='^menu_set_goals')
-    ],
-    states={
-        INCOME_ASSESSMENT: [LoggingCallbackHandler(income_assessment_callback, pattern='^income_[1-5]$')],
-        FAMILY_ASSESSMENT: [LoggingCallbackHandler(family_assessment_callback, pattern='^family_needs_')],
-        SPENDING_ASSESSMENT: [LoggingCallbackHandler(spending_assessment_callback, pattern='^spending_')],
-        GOAL_TYPE: [
-            # Add suggestion handlers first (more specific)
-            LoggingCallbackHandler(goal_suggestion_callback, pattern='^goal_sugg_'),
-            LoggingCallbackHandler(goal_type_callback, pattern='^goal_type_'),
-            LoggingCallbackHandler(goal_type_callback, pattern='^goal_custom$')
-        ],
-        GOAL_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, goal_amount_handler)],
-        GOAL_DEADLINE: [LoggingCallbackHandler(goal_deadline_callback, pattern='^deadline_')],
-        GOAL_STEPS: [
-            LoggingCallbackHandler(goal_steps_callback, pattern='^steps_'),
-            MessageHandler(filters.TEXT & ~filters.COMMAND, goal_custom_steps_handler)
-        ],
-        GOAL_CONFIRMATION: [LoggingCallbackHandler(goal_confirmation_callback, pattern='^goal_confirm_')],
-        MICRO_GOALS: [
-            LoggingCallbackHandler(goal_confirmation_callback, pattern='^micro_goal_confirm_')
-        ]
-    },
-    fallbacks=[CommandHandler('cancel', cancel)]
-)
\ No newline at end of file
@@ -1,12 +1,11 @@
 # handlers/onboarding.py
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import (
-    ContextTypes, ConversationHandler, CommandHandler,
-    CallbackQueryHandler, MessageHandler, filters
-)
-from utils.localization import get_text
+from telegram.ext import ContextTypes, ConversationHandler
+from utils.localization import get_text, render_text
 from utils.firebase_client import get_user_language, get_profile, save_profile
+from utils.models import UserProfile
+from utils.callback_data import encode_callback, decode_callback
 
 # Define conversation states
 INCOME, GOAL, DEBT, FAMILY, CONFIRMATION = range(5)
@@ -26,11 +25,11 @@ async def start_onboarding(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 async def ask_income(update: Update, context: ContextTypes.DEFAULT_TYPE, lang_code: str) -> None:
     """Asks for the user's income range."""
     keyboard = [
-        [InlineKeyboardButton(get_text("income_option_1", lang_code), callback_data="income_1")],
-        [InlineKeyboardButton(get_text("income_option_2", lang_code), callback_data="income_2")],
-        [InlineKeyboardButton(get_text("income_option_3", lang_code), callback_data="income_3")],
-        [InlineKeyboardButton(get_text("income_option_4", lang_code), callback_data="income_4")],
-        [InlineKeyboardButton(get_text("income_option_5", lang_code), callback_data="income_5")]
+        [InlineKeyboardButton(get_text("income_option_1", lang_code), callback_data=encode_callback("income", 1))],
+        [InlineKeyboardButton(get_text("income_option_2", lang_code), callback_data=encode_callback("income", 2))],
+        [InlineKeyboardButton(get_text("income_option_3", lang_code), callback_data=encode_callback("income", 3))],
+        [InlineKeyboardButton(get_text("income_option_4", lang_code), callback_data=encode_callback("income", 4))],
+        [InlineKeyboardButton(get_text("income_option_5", lang_code), callback_data=encode_callback("income", 5))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -50,15 +49,15 @@ async def income_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     lang_code = get_user_language(user_id)
     
     # Save income selection
-    income_level = query.data.split('_')[1]
+    income_level = decode_callback(query.data)[1][0]
     context.user_data['profile_income'] = income_level
     
     # Now ask about financial goals
     keyboard = [
-        [InlineKeyboardButton(get_text("goal_option_1", lang_code), callback_data="goal_1")],
-        [InlineKeyboardButton(get_text("goal_option_2", lang_code), callback_data="goal_2")],
-        [InlineKeyboardButton(get_text("goal_option_3", lang_code), callback_data="goal_3")],
-        [InlineKeyboardButton(get_text("goal_option_4", lang_code), callback_data="goal_4")]
+        [InlineKeyboardButton(get_text("goal_option_1", lang_code), callback_data=encode_callback("goal", 1))],
+        [InlineKeyboardButton(get_text("goal_option_2", lang_code), callback_data=encode_callback("goal", 2))],
+        [InlineKeyboardButton(get_text("goal_option_3", lang_code), callback_data=encode_callback("goal", 3))],
+        [InlineKeyboardButton(get_text("goal_option_4", lang_code), callback_data=encode_callback("goal", 4))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -76,14 +75,14 @@ async def goal_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     lang_code = get_user_language(user_id)
     
     # Save goal selection
-    goal_type = query.data.split('_')[1]
+    goal_type = decode_callback(query.data)[1][0]
     context.user_data['profile_goal'] = goal_type
     
     # Now ask about debt
     keyboard = [
-        [InlineKeyboardButton(get_text("debt_option_1", lang_code), callback_data="debt_1")],
-        [InlineKeyboardButton(get_text("debt_option_2", lang_code), callback_data="debt_2")],
-        [InlineKeyboardButton(get_text("debt_option_3", lang_code), callback_data="debt_3")]
+        [InlineKeyboardButton(get_text("debt_option_1", lang_code), callback_data=encode_callback("debt", 1))],
+        [InlineKeyboardButton(get_text("debt_option_2", lang_code), callback_data=encode_callback("debt", 2))],
+        [InlineKeyboardButton(get_text("debt_option_3", lang_code), callback_data=encode_callback("debt", 3))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -101,14 +100,14 @@ async def debt_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     lang_code = get_user_language(user_id)
     
     # Save debt selection
-    debt_level = query.data.split('_')[1]
+    debt_level = decode_callback(query.data)[1][0]
     context.user_data['profile_debt'] = debt_level
     
     # Now ask about family responsibilities
     keyboard = [
-        [InlineKeyboardButton(get_text("family_option_1", lang_code), callback_data="family_1")],
-        [InlineKeyboardButton(get_text("family_option_2", lang_code), callback_data="family_2")],
-        [InlineKeyboardButton(get_text("family_option_3", lang_code), callback_data="family_3")]
+        [InlineKeyboardButton(get_text("family_option_1", lang_code), callback_data=encode_callback("family", 1))],
+        [InlineKeyboardButton(get_text("family_option_2", lang_code), callback_data=encode_callback("family", 2))],
+        [InlineKeyboardButton(get_text("family_option_3", lang_code), callback_data=encode_callback("family", 3))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -126,11 +125,11 @@ async def family_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     lang_code = get_user_language(user_id)
     
     # Save family selection
-    family_support = query.data.split('_')[1]
+    family_support = decode_callback(query.data)[1][0]
     context.user_data['profile_family'] = family_support
     
     # Show summary and ask for confirmation
-    profile_summary = get_text("profile_summary", lang_code).format(
+    profile_summary = render_text("profile_summary", lang_code,
         income=get_text(f"income_option_{context.user_data['profile_income']}", lang_code),
         goal=get_text(f"goal_option_{context.user_data['profile_goal']}", lang_code),
         debt=get_text(f"debt_option_{context.user_data['profile_debt']}", lang_code),
@@ -139,8 +138,8 @@ async def family_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     keyboard = [
         [
-            InlineKeyboardButton(get_text("confirm_yes", lang_code), callback_data="confirm_yes"),
-            InlineKeyboardButton(get_text("confirm_no", lang_code), callback_data="confirm_no")
+            InlineKeyboardButton(get_text("confirm_yes", lang_code), callback_data=encode_callback("confirm", "yes")),
+            InlineKeyboardButton(get_text("confirm_no", lang_code), callback_data=encode_callback("confirm", "no"))
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -157,15 +156,15 @@ async def confirmation_callback(update: Update, context: ContextTypes.DEFAULT_TY
     user_id = query.from_user.id
     lang_code = get_user_language(user_id)
     
-    if query.data == "confirm_yes":
+    if decode_callback(query.data)[1] == ["yes"]:
         # Save the profile to Firebase
-        profile_data = {
-            'income': context.user_data['profile_income'],
-            'goal': context.user_data['profile_goal'],
-            'debt': context.user_data['profile_debt'],
-            'family': context.user_data['profile_family']
-        }
-        save_profile(user_id, profile_data)
+        profile = UserProfile(
+            income=context.user_data['profile_income'],
+            goal=context.user_data['profile_goal'],
+            debt=context.user_data['profile_debt'],
+            family=context.user_data['profile_family']
+        )
+        save_profile(user_id, profile)
         
         # Thank the user and show the main menu
         thank_text = get_text("profile_saved", lang_code)
@@ -222,22 +221,23 @@ async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         
         if update.callback_query:
             await update.callback_query.edit_message_text(text=start_text)
-            await ask_income(update, context, lang_code)
         else:
             await update.message.reply_text(text=start_text)
-            await ask_income(update, context, lang_code)
+        
+        from handlers.flows import engine, ONBOARDING
+        await engine.start(ONBOARDING, update, context)
     else:
         # Show existing profile
-        profile_text = get_text("profile_summary", lang_code).format(
-            income=get_text(f"income_option_{profile.get('income', '1')}", lang_code),
-            goal=get_text(f"goal_option_{profile.get('goal', '1')}", lang_code),
-            debt=get_text(f"debt_option_{profile.get('debt', '1')}", lang_code),
-            family=get_text(f"family_option_{profile.get('family', '1')}", lang_code)
+        profile_text = render_text("profile_summary", lang_code,
+            income=get_text(f"income_option_{profile.income or '1'}", lang_code),
+            goal=get_text(f"goal_option_{profile.goal or '1'}", lang_code),
+            debt=get_text(f"debt_option_{profile.debt or '1'}", lang_code),
+            family=get_text(f"family_option_{profile.family or '1'}", lang_code)
         )
         
         keyboard = [
-            [InlineKeyboardButton(get_text("update_profile", lang_code), callback_data="start_onboarding")],
-            [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data="back_to_menu")]
+            [InlineKeyboardButton(get_text("update_profile", lang_code), callback_data=encode_callback("start_onboarding"))],
+            [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -245,19 +245,3 @@ async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             await update.callback_query.edit_message_text(text=profile_text, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text=profile_text, reply_markup=reply_markup)
-
-# Create the onboarding conversation handler
-onboarding_handler = ConversationHandler(
-    entry_points=[
-        CommandHandler('profile', start_onboarding),
-        CallbackQueryHandler(start_onboarding, pattern='^start_onboarding$')
-    ],
-    states={
-        INCOME: [CallbackQueryHandler(income_callback, pattern='^income_')],
-        GOAL: [CallbackQueryHandler(goal_callback, pattern='^goal_')],
-        DEBT: [CallbackQueryHandler(debt_callback, pattern='^debt_')],
-        FAMILY: [CallbackQueryHandler(family_callback, pattern='^family_')],
-        CONFIRMATION: [CallbackQueryHandler(confirmation_callback, pattern='^confirm_')]
-    },
-    fallbacks=[CommandHandler('cancel', cancel)]
-)
\ No newline at end of file
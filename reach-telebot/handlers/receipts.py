@@ -0,0 +1,70 @@
+# handlers/receipts.py
+"""
+Expense capture from receipt photos.
+
+The largest size of the photo is downloaded (up to RECEIPT_MAX_MB), OCR'd in
+the utils/ocr.py process pool and turned into an expense line such as
+"19.62 SGD at NTUC FairPrice", which goes through the same parse and save
+path as a typed expense. Each user's photos are processed one at a time, and
+at most RECEIPT_QUEUE_PER_USER may be waiting; more are turned away.
+"""
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes
+from config import RECEIPT_MAX_MB, RECEIPT_QUEUE_PER_USER
+from utils import metrics, ocr
+from utils.localization import get_text, render_text
+from utils.firebase_client import get_user_language
+from handlers.expenses import process_expense_text
+
+logger = logging.getLogger(__name__)
+
+_user_locks = {}  # user_id -> asyncio.Lock serializing that user's receipts
+_user_waiting = {}  # user_id -> receipts queued or in progress
+
+async def receipt_photo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Reads a receipt photo and logs it as an expense."""
+    user_id = update.effective_user.id
+    lang_code = get_user_language(user_id)
+
+    if not ocr.available():
+        await update.message.reply_text(get_text("receipt_unavailable", lang_code))
+        return
+
+    # Telegram lists the sizes of a photo smallest first
+    photo = update.message.photo[-1]
+    if photo.file_size and photo.file_size > RECEIPT_MAX_MB * 1024 * 1024:
+        metrics.increment("receipts.too_large")
+        await update.message.reply_text(render_text("receipt_too_large", lang_code, max_mb=f"{RECEIPT_MAX_MB:g}"))
+        return
+
+    if _user_waiting.get(user_id, 0) >= RECEIPT_QUEUE_PER_USER:
+        metrics.increment("receipts.rejected_busy")
+        await update.message.reply_text(get_text("receipt_busy", lang_code))
+        return
+
+    _user_waiting[user_id] = _user_waiting.get(user_id, 0) + 1
+    lock = _user_locks.setdefault(user_id, asyncio.Lock())
+    try:
+        await update.message.reply_text(get_text("receipt_processing", lang_code))
+        async with lock:
+            telegram_file = await photo.get_file()
+            image = bytes(await telegram_file.download_as_bytearray())
+            try:
+                receipt = await ocr.read_receipt(image)
+            except Exception as e:
+                # Undecodable images, a missing tesseract binary, a crashed pool process...
+                logger.warning("Receipt OCR failed for user %s: %s", user_id, e)
+                receipt = ocr.Receipt()
+            if receipt.total is None:
+                metrics.increment("receipts.unreadable")
+                await update.message.reply_text(get_text("receipt_unreadable", lang_code))
+                return
+            metrics.increment("receipts.read")
+            await process_expense_text(update, context, receipt.as_expense_text())
+    finally:
+        _user_waiting[user_id] -= 1
+        if not _user_waiting[user_id]:
+            del _user_waiting[user_id]
+            _user_locks.pop(user_id, None)
@@ -0,0 +1,126 @@
+# handlers/reports.py
+import asyncio
+import logging
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from utils.localization import get_text, render_text
+from utils.firebase_client import get_user_language, get_goals
+from utils.models import format_amount, from_minor, utc_now
+from utils.callback_data import encode_callback, decode_callback
+from utils import analytics, categories, charts
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Width of the text bars in the trend section
+BAR_WIDTH = 10
+
+def format_report(report: analytics.MonthlyReport, lang_code: str) -> str:
+    """Formats a monthly report as message text."""
+    currency = report.currency
+    text = render_text("report_title", lang_code, month=report.month) + "\n\n"
+    text += render_text("report_total", lang_code,
+        total=format_amount(report.total_minor, currency), currency=currency, count=report.count
+    ) + "\n"
+    if report.change is None:
+        text += render_text("report_no_previous", lang_code, previous_month=report.previous_month) + "\n"
+    else:
+        text += render_text("report_change", lang_code,
+            previous_month=report.previous_month, change=f"{report.change:+.0%}"
+        ) + "\n"
+
+    # Category shares
+    text += "\n" + get_text("report_categories", lang_code) + "\n"
+    for category_id, amount_minor, share in report.category_shares:
+        text += f"{categories.display_name(category_id, lang_code)}: {format_amount(amount_minor, currency)} ({share:.0%})\n"
+
+    # Monthly trend as text bars scaled to the largest month
+    text += "\n" + get_text("report_trend", lang_code) + "\n"
+    peak = max((total for _, total in report.trend), default=0)
+    for label, total in report.trend:
+        filled = round(total / peak * BAR_WIDTH) if peak else 0
+        text += f"{label} {'▇' * filled}{'░' * (BAR_WIDTH - filled)} {format_amount(total, currency)}\n"
+
+    # Days with unusually high spending
+    if report.anomalous_days:
+        text += "\n" + get_text("report_anomalies", lang_code) + "\n"
+        for day, total in report.anomalous_days:
+            text += f"{day}: {format_amount(total, currency)}\n"
+
+    return text
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/report [YYYY-MM]: shows the monthly spending report."""
+    user_id = update.effective_user.id
+    lang_code = get_user_language(user_id)
+
+    month = None
+    if context.args:
+        try:
+            month = analytics.parse_month(context.args[0])
+        except ValueError:
+            await update.message.reply_text(get_text("report_invalid_month", lang_code))
+            return
+
+    # NumPy work runs off the event loop
+    report = await asyncio.to_thread(analytics.monthly_report, user_id, month)
+
+    if report.count == 0:
+        await update.message.reply_text(render_text("report_no_expenses", lang_code, month=report.month))
+        return
+
+    keyboard = [
+        [InlineKeyboardButton(get_text("view_expenses", lang_code), callback_data=encode_callback("menu", "view_expenses"))],
+        [InlineKeyboardButton(get_text("back_to_menu", lang_code), callback_data=encode_callback("back_to_menu"))]
+    ]
+    await update.message.reply_text(text=format_report(report, lang_code), reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def chart_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Sends PNG charts for the 'Charts' buttons under the expense and goal views."""
+    query = update.callback_query
+    await query.answer()
+
+    user_id = query.from_user.id
+    chat_id = update.effective_chat.id
+    lang_code = get_user_language(user_id)
+    _, args = decode_callback(query.data)
+    subject = args[0] if args else "expenses"
+
+    if subject == "goal":
+        goals = get_goals(user_id)
+        if not goals or not goals[-1].deadline:
+            await context.bot.send_message(chat_id=chat_id, text=get_text("no_goals", lang_code))
+            return
+        goal = goals[-1]
+        today = utc_now().astimezone().date()
+        payload = {
+            "title": goal.type.capitalize() if goal.type else "Goal",
+            "amount": from_minor(goal.amount_minor),
+            "remaining": from_minor(max(0, goal.amount_minor - goal.progress_minor)),
+            "start": (goal.created_at.astimezone().date() if goal.created_at else today).isoformat(),
+            "deadline": goal.deadline.astimezone().date().isoformat(),
+            "today": today.isoformat()
+        }
+        await charts.send_chart(context.bot, chat_id, "goal_burndown", payload, get_text("chart_goal_caption", lang_code))
+        return
+
+    report = await asyncio.to_thread(analytics.monthly_report, user_id, None)
+    currency = report.currency
+    if report.count:
+        # The chart shows numbered keys; the caption names them, since the renderer has no Bengali or Tamil font
+        payload = {
+            "title": report.month,
+            "currency": currency,
+            "shares": [[str(key), from_minor(amount, currency)]
+                       for key, (_, amount, _) in enumerate(report.category_shares, 1)]
+        }
+        caption = render_text("chart_categories_caption", lang_code, month=report.month)
+        for key, (category_id, amount, share) in enumerate(report.category_shares, 1):
+            caption += f"\n{key}. {categories.display_name(category_id, lang_code)}: {format_amount(amount, currency)} ({share:.0%})"
+        await charts.send_chart(context.bot, chat_id, "category_pie", payload, caption)
+    payload = {
+        "title": "",
+        "currency": currency,
+        "months": [[label, from_minor(total, currency)] for label, total in report.trend]
+    }
+    await charts.send_chart(context.bot, chat_id, "monthly_bars", payload, get_text("chart_monthly_caption", lang_code))
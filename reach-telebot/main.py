@@ -1,116 +1,166 @@
 # main.py
+import argparse
 import logging
 from telegram import Update
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 import config
-from handlers import common, onboarding, goals, expenses, advice
+from handlers import common, goals, expenses, advice, admin, reports, receipts
+from handlers.flows import engine, ONBOARDING, GOAL_SETTING
+from utils import category_model, firebase_client, localization, write_journal
+from utils.callback_router import CallbackRouter
+from utils.memory_manager import UserDataManager
+from utils.profiling import TracingApplication, TracingRequest, instrument_handlers, install_signal_handler
+from utils.update_processor import PerUserUpdateProcessor
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Logging is configured by config (see utils/logging_setup.py)
 logger = logging.getLogger(__name__)
 
-def main() -> None:
-    """Start the bot."""
-    logger.info("Starting REACH-telebot...")
-
-    # Initialize services
-    try:
-        from utils.firebase_client import initialize_firebase
-        from utils.openai_client import initialize_openai
-        initialize_firebase()
-        initialize_openai()
-    except Exception as e:
-        logger.critical(f"Failed to initialize critical services: {e}", exc_info=True)
-        return
+def build_callback_router() -> CallbackRouter:
+    """Maps every callback action to exactly one handler."""
+    router = CallbackRouter()
+    
+    # Common
+    router.route("set_lang", common.language_select_callback)
+    router.route("menu", common.menu_callback)
+    router.route("back_to_menu", common.back_to_menu_callback)
+    
+    # Expenses and advice
+    router.route("log_expense", expenses.expense_callback)
+    router.route("advice", advice.advice_category_callback)
+    router.route("advice_another", advice.advice_callback)
+    router.route("advice_followup", advice.advice_callback)
+    router.route("advice_new_topic", advice.advice_callback)
+    
+    # Goals outside the flow
+    router.route("share_goal", goals.share_goal_with_family)
+    
+    # Charts under the expense and goal views
+    router.route("chart", reports.chart_callback)
+    
+    # Onboarding and goal setting steps go to the flow engine, which picks the
+    # handler from the user's active flow and state (e.g. "income" in either flow)
+    router.route("start_onboarding", engine.entry(ONBOARDING))
+    for action in sorted(engine.callback_actions()):
+        router.route(action, engine.handle_callback)
+    return router
 
+def build_application(with_updater: bool = True) -> Application:
+    """Builds the Application with all handlers registered."""
     # Create the Application and pass it your bot's token
-    application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+    # Updates run inside a trace and Bot API calls are recorded as spans (see utils/profiling.py)
+    builder = (
+        Application.builder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .application_class(TracingApplication)
+        .request(TracingRequest(connection_pool_size=256))
+        # Users' updates run concurrently, each user's in order, so one slow or rate-limited
+        # request does not hold up everyone else (see utils/update_processor.py)
+        .concurrent_updates(PerUserUpdateProcessor(config.CONCURRENT_UPDATES))
+    )
+    if config.TELEGRAM_API_BASE_URL:
+        # Point the bot at a local Bot API stand-in (see devtools/fake_telegram.py)
+        builder = builder.base_url(config.TELEGRAM_API_BASE_URL)
+    if not with_updater:
+        # Sharded workers receive their updates from the supervisor (see utils/supervisor.py)
+        builder = builder.updater(None)
+    application = builder.build()
+
+    # Track activity and evict idle users' user_data to the state store
+    UserDataManager(application).register()
 
     # Register common handlers
     application.add_handler(common.start_handler)
     application.add_handler(common.menu_handler)
-    application.add_handler(common.language_callback_handler)
-    application.add_handler(common.menu_callback_handler)
     
-    # Register conversation handlers
-    # Goals handler should go first to make sure it catches all income assessment callbacks
-    application.add_handler(goals.goal_handler)
-    application.add_handler(onboarding.onboarding_handler)
+    # Flow entry points
+    application.add_handler(CommandHandler('goal', engine.entry(GOAL_SETTING)))
+    application.add_handler(CommandHandler('profile', engine.entry(ONBOARDING)))
+    application.add_handler(CommandHandler('cancel', engine.cancel))
     
     # Register command handlers
     application.add_handler(CommandHandler('log', expenses.log_expense_command))
     application.add_handler(CommandHandler('view_expenses', expenses.view_expenses))
     application.add_handler(CommandHandler('ask', advice.ask_advice_command))
     application.add_handler(CommandHandler('view_goal', goals.view_goal))
+    application.add_handler(CommandHandler('report', reports.report_command))
+    application.add_handler(CommandHandler('metrics', admin.metrics_command))
+    application.add_handler(CommandHandler('profiler', admin.profiler_command))
+    application.add_handler(CommandHandler('campaigns', admin.campaigns_command))
+    application.add_handler(CommandHandler('reload_locales', admin.reload_locales_command))
     
-    # Register callback handlers
-    application.add_handler(expenses.expense_callback_handler)
-    application.add_handler(advice.advice_category_handler)
-    application.add_handler(advice.advice_callback_handler)
+    # All remaining callbacks go through one router keyed on the callback action
+    router = build_callback_router()
+    for finding in router.check():
+        logger.warning("Callback routing: %s", finding)
+    application.add_handler(router.handler())
     
-    # Add standalone handlers for goal flow
-    application.add_handler(CallbackQueryHandler(goals.goal_type_standalone_callback, pattern='^goal_type_'))
-    application.add_handler(CallbackQueryHandler(goals.goal_deadline_callback, pattern='^deadline_'))
-    application.add_handler(CallbackQueryHandler(goals.goal_steps_callback, pattern='^steps_'))
-    application.add_handler(CallbackQueryHandler(goals.goal_confirmation_callback, pattern='^goal_confirm_'))
-    application.add_handler(CallbackQueryHandler(goals.goal_suggestion_callback, pattern='^goal_sugg_'))
-    application.add_handler(CallbackQueryHandler(goals.share_goal_with_family, pattern='^share_goal_with_family'))
-    
-    # Add standalone handlers for onboarding flow and new goal assessment flow
-    # Note: Income callback is used in both onboarding and goal setting flow
-    # The income callback for goal flow has a specific handler in the ConversationHandler
-    application.add_handler(CallbackQueryHandler(onboarding.income_callback, pattern='^income_[1-5]$'))
-    application.add_handler(CallbackQueryHandler(goals.family_assessment_callback, pattern='^family_needs_'))
-    application.add_handler(CallbackQueryHandler(goals.spending_assessment_callback, pattern='^spending_'))
-    application.add_handler(CallbackQueryHandler(onboarding.goal_callback, pattern='^goal_[1-4]$'))
-    application.add_handler(CallbackQueryHandler(onboarding.debt_callback, pattern='^debt_'))
-    application.add_handler(CallbackQueryHandler(onboarding.family_callback, pattern='^family_'))
-    application.add_handler(CallbackQueryHandler(onboarding.confirmation_callback, pattern='^confirm_'))
-    
-    # Handler for unhandled callbacks
-    async def unhandled_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        query = update.callback_query
-        await query.answer()
-        logger.warning(f"Unhandled callback pattern: {query.data}")
-        
-    application.add_handler(CallbackQueryHandler(unhandled_callback))
-    
-    # Custom message handler for goal amount
-    async def custom_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handles text messages for both goal amount and regular messages."""
-        conversation_state = context.user_data.get('conversation_state')
-        logger.info(f"Current conversation state: {conversation_state}")
-        
-        if conversation_state == goals.GOAL_AMOUNT:
-            logger.info("Detected goal amount message")
-            await goals.goal_amount_handler(update, context)
-        elif conversation_state == goals.GOAL_STEPS:
-            logger.info("Detected goal steps message")
-            await goals.goal_custom_steps_handler(update, context)
-        elif conversation_state == goals.MICRO_GOALS:
-            logger.info("Detected micro goal message")
-            # This is for handling any specific micro-goal inputs if needed later
-            await handle_text_message(update, context)
-        else:
-            await handle_text_message(update, context)
-            
     # Register message handlers
     application.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND & 
         filters.ChatType.PRIVATE, 
         custom_text_handler
     ))
+    # Receipt photos; OCR takes seconds, so these run concurrently with other updates
+    application.add_handler(MessageHandler(
+        filters.PHOTO & filters.ChatType.PRIVATE,
+        receipts.receipt_photo_handler,
+        block=False
+    ))
     
     # Error handler
     application.add_error_handler(common.error_handler)
 
+    # Pick up edits to locales/*.json without a restart
+    localization.watch(application)
+
+    # Drain writes journaled while Firestore was unavailable
+    write_journal.schedule(application, firebase_client.apply_journal_entries)
+
+    # Keep the local expense categorizer trained on the latest LLM labels
+    category_model.schedule_retraining(application)
+
+    # Handler spans for the slow-update tracer, and SIGUSR1 starts the sampling profiler
+    instrument_handlers(application)
+    install_signal_handler()
+    return application
+
+def main(argv=None) -> None:
+    """Start the bot."""
+    parser = argparse.ArgumentParser(description="Run REACH-telebot.")
+    parser.add_argument("--workers", type=int, default=config.BOT_WORKERS,
+                        help="Worker processes; more than 1 runs the sharded supervisor mode")
+    args = parser.parse_args(argv)
+
+    logger.info("Starting REACH-telebot...")
+
+    # Initialize services
+    try:
+        from utils.firebase_client import initialize_firebase
+        from utils.openai_client import initialize_openai
+        initialize_firebase()
+        initialize_openai()
+    except Exception as e:
+        logger.critical("Failed to initialize critical services: %s", e, exc_info=True)
+        return
+
+    if args.workers > 1:
+        # One polling supervisor routes updates to worker processes by user id
+        from utils.supervisor import Supervisor
+        Supervisor(args.workers, build_application, config.TELEGRAM_BOT_TOKEN, config.TELEGRAM_API_BASE_URL).run()
+        return
+
+    application = build_application()
+
     # Start the Bot
     logger.info("Bot is running...")
     application.run_polling()
 
+# Text goes to the active flow step if it takes text, otherwise to the regular handlers
+async def custom_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles text messages for both flow input and regular messages."""
+    if not await engine.handle_text(update, context):
+        await handle_text_message(update, context)
+
 async def handle_text_message(update, context):
     """Route text messages to the appropriate handler based on context."""
     # Check for expense logging
@@ -0,0 +1,17 @@
+# tests/conftest.py
+"""Points config at in-memory backends and throwaway files before any bot module is imported."""
+import os
+import sys
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="reach-telebot-tests-")
+os.environ.update({
+    "TELEGRAM_BOT_TOKEN": "test-token",
+    "OPENAI_API_KEY": "test-key",
+    "FIRESTORE_BACKEND": "memory",
+    "STATE_STORE_BACKEND": "memory",
+    "LOG_FORMAT": "text",
+    "DATA_DIR": _tmp,
+    "WRITE_JOURNAL_PATH": os.path.join(_tmp, "write_journal.db"),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+# tests/test_advice_sessions.py
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+
+from utils import advice_sessions
+from config import ADVICE_SESSION_TURNS
+
+USER_ID = 42
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    advice_sessions.reset(USER_ID)
+    yield
+    advice_sessions.reset(USER_ID)
+
+def _fill(count: int, prefix: str = "q"):
+    for i in range(count):
+        advice_sessions.record(USER_ID, f"{prefix}{i}", f"a{i}")
+
+def test_compact_folds_older_turns(monkeypatch):
+    _fill(ADVICE_SESSION_TURNS + 2)
+    monkeypatch.setattr(advice_sessions, "complete_advice", lambda messages: "summary")
+    assert advice_sessions.compact(USER_ID, "en")
+    session = advice_sessions.load(USER_ID)
+    assert session["summary"] == "summary"
+    assert [turn["question"] for turn in session["turns"]] == [f"q{i}" for i in range(2, ADVICE_SESSION_TURNS + 2)]
+
+def test_compact_skips_a_session_replaced_meanwhile(monkeypatch):
+    _fill(ADVICE_SESSION_TURNS + 2)
+
+    def summarize_while_user_starts_over(messages):
+        # The user picks "new topic" and asks again; the new session reuses turn ids from 0
+        advice_sessions.reset(USER_ID)
+        _fill(3, prefix="new")
+        return "summary of the old topic"
+
+    monkeypatch.setattr(advice_sessions, "complete_advice", summarize_while_user_starts_over)
+    assert not advice_sessions.compact(USER_ID, "en")
+    session = advice_sessions.load(USER_ID)
+    assert session["summary"] == ""
+    assert [turn["question"] for turn in session["turns"]] == ["new0", "new1", "new2"]
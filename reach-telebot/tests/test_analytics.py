@@ -0,0 +1,53 @@
+# tests/test_analytics.py
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+from utils import analytics, firebase_client, fx
+
+USER_ID = 7
+
+class FakeTable:
+    def __init__(self, version: str):
+        self.version = version
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Counts expense reads; the test may set reads.during to run something in the middle of one."""
+    class Reads:
+        count = 0
+        during = None
+
+    def get_expenses(user_id):
+        Reads.count += 1
+        if Reads.during:
+            during, Reads.during = Reads.during, None
+            during()
+        return []
+
+    table = FakeTable("v1")
+    monkeypatch.setattr(firebase_client, "get_expenses", get_expenses)
+    monkeypatch.setattr(fx, "table", lambda: table)
+    Reads.table = table
+    analytics.invalidate(USER_ID)
+    return Reads
+
+def test_report_is_cached(reads):
+    analytics.monthly_report(USER_ID, 100)
+    analytics.monthly_report(USER_ID, 100)
+    analytics.monthly_report(USER_ID, 101)
+    assert reads.count == 1
+
+def test_frame_read_across_a_write_is_not_cached(reads):
+    # The user saves an expense after get_expenses read the old list
+    reads.during = lambda: analytics.invalidate(USER_ID)
+    analytics.monthly_report(USER_ID, 100)
+    analytics.monthly_report(USER_ID, 100)
+    assert reads.count == 2
+
+def test_new_fx_table_drops_cached_reports(reads):
+    analytics.monthly_report(USER_ID, 100)
+    reads.table.version = "v2"
+    analytics.monthly_report(USER_ID, 100)
+    assert reads.count == 2
@@ -0,0 +1,65 @@
+# tests/test_callback_data.py
+import pytest
+
+from utils.callback_data import (
+    LEGACY_EXACT, LEGACY_PREFIXES, callback_pattern, decode_callback, encode_callback, shadowed_legacy_prefixes
+)
+
+@pytest.mark.parametrize("action, args", [
+    ("back_to_menu", ()),
+    ("income", (3,)),
+    ("goal_confirm", ("savings", 500, "2026-12-31")),
+    ("advice", ("custom",)),
+])
+def test_round_trip(action, args):
+    assert decode_callback(encode_callback(action, *args)) == (action, [str(a) for a in args])
+
+def test_encode_rejects_data_over_telegram_limit():
+    with pytest.raises(ValueError):
+        encode_callback("goal_confirm", "x" * 64)
+
+@pytest.mark.parametrize("data, expected", [
+    ("income_3", ("income", ["3"])),
+    # Longest match: never family or goal for these
+    ("family_needs_2", ("family_needs", ["2"])),
+    ("family_1", ("family", ["1"])),
+    ("micro_goal_confirm_0", ("micro_goal_confirm", ["0"])),
+    ("goal_confirm_1", ("goal_confirm", ["1"])),
+    ("goal_type_savings", ("goal_type", ["savings"])),
+    ("goal_7", ("goal", ["7"])),
+    ("set_lang_bn", ("set_lang", ["bn"])),
+    # Exact legacy strings win over the prefixes they start with
+    ("goal_custom", ("goal_custom", [])),
+    ("advice_another", ("advice_another", [])),
+    ("log_another_expense", ("log_expense", [])),
+    # A prefix with nothing after it still resolves, without args
+    ("menu_", ("menu", [])),
+])
+def test_legacy_decode(data, expected):
+    assert decode_callback(data) == expected
+
+@pytest.mark.parametrize("data", ["", None, "unknown", "fam", "2|income|3"])
+def test_unknown_data_decodes_to_nothing(data):
+    assert decode_callback(data) == (None, [])
+
+def test_every_legacy_string_decodes_to_its_action():
+    for key, action in LEGACY_EXACT.items():
+        assert decode_callback(key) == (action, [])
+    for prefix, action in LEGACY_PREFIXES.items():
+        assert decode_callback(prefix + "x") == (action, ["x"])
+
+def test_callback_pattern_matches_new_and_legacy_data():
+    matches = callback_pattern("family_needs")
+    assert matches(encode_callback("family_needs", 2))
+    assert matches("family_needs_2")
+    assert not matches("family_2")
+    assert not matches(None)
+
+    matches_savings = callback_pattern("goal_type", "savings")
+    assert matches_savings(encode_callback("goal_type", "savings"))
+    assert not matches_savings(encode_callback("goal_type", "debt"))
+
+def test_shadowed_prefixes_are_reported():
+    shadowed = shadowed_legacy_prefixes()
+    assert ("family_", "family_needs_") in shadowed
+    assert ("goal_", "goal_custom") in shadowed
@@ -0,0 +1,66 @@
+# tests/test_callback_router.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("telegram")
+
+from utils.callback_data import encode_callback
+from utils.callback_router import CallbackRouter
+
+class FakeQuery:
+    def __init__(self, data: str):
+        self.data = data
+        self.answered = False
+
+    async def answer(self):
+        self.answered = True
+
+def _dispatch(router: CallbackRouter, data: str) -> FakeQuery:
+    query = FakeQuery(data)
+    asyncio.run(router.dispatch(SimpleNamespace(callback_query=query), None))
+    return query
+
+@pytest.fixture
+def router():
+    calls = []
+    router = CallbackRouter()
+
+    async def family_callback(update, context):
+        calls.append("family")
+
+    async def family_needs_callback(update, context):
+        calls.append("family_needs")
+
+    router.route("family", family_callback)
+    router.route("family_needs", family_needs_callback)
+    router.calls = calls
+    return router
+
+def test_dispatches_new_and_legacy_data_to_the_same_callback(router):
+    _dispatch(router, encode_callback("family_needs", 2))
+    _dispatch(router, "family_needs_2")
+    _dispatch(router, "family_1")
+    assert router.calls == ["family_needs", "family_needs", "family"]
+
+def test_resolve_returns_args(router):
+    action, args, callback = router.resolve("family_needs_2")
+    assert (action, args) == ("family_needs", ["2"])
+    assert callback.__name__ == "family_needs_callback"
+
+def test_unrouted_data_is_answered_and_dropped(router):
+    query = _dispatch(router, "no_such_button")
+    assert query.answered
+    assert router.calls == []
+
+def test_routing_an_action_twice_is_rejected(router):
+    async def other(update, context):
+        pass
+
+    with pytest.raises(ValueError, match="Ambiguous route for 'family'"):
+        router.route("family", other)
+
+def test_check_reports_unrouted_legacy_actions(router):
+    findings = router.check()
+    assert "Action 'income' has no standalone route" in findings
+    assert "Action 'family' has no standalone route" not in findings
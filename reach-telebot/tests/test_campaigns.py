@@ -0,0 +1,68 @@
+# tests/test_campaigns.py
+import asyncio
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("dotenv")
+
+from telegram.error import Forbidden
+from utils import campaigns, segments
+
+class FakeBot:
+    """Records sends; a send to a user in `hang` never returns, one to `blocked` is refused."""
+
+    def __init__(self, hang=(), blocked=()):
+        self.hang = set(hang)
+        self.blocked = set(blocked)
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_message(self, chat_id, text):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if chat_id in self.hang:
+                await asyncio.Event().wait()
+            await asyncio.sleep(0.001)
+            if chat_id in self.blocked:
+                raise Forbidden("blocked")
+            self.sent.append(chat_id)
+        finally:
+            self.in_flight -= 1
+
+@pytest.fixture
+def campaign(monkeypatch):
+    recipients = list(range(1, 61))
+    monkeypatch.setattr(segments, "resolve", lambda segment: recipients)
+    monkeypatch.setattr(segments, "user_terms", lambda user_id: {})
+    monkeypatch.setattr(campaigns._bucket, "reserve", lambda key, max_wait: 0)
+    monkeypatch.setattr(campaigns, "CAMPAIGN_CONCURRENCY", 5)
+    return campaigns.create("all", {"en": "hello"})
+
+def test_sends_concurrently_to_every_recipient(campaign):
+    bot = FakeBot(blocked={7})
+    result = asyncio.run(campaigns.run(bot, campaign["id"]))
+    assert sorted(bot.sent) == [user_id for user_id in range(1, 61) if user_id != 7]
+    assert 1 < bot.max_in_flight <= 5
+    assert result["status"] == "done"
+    assert result["cursor"] == 60
+    assert result["stats"] == {"sent": 59, "blocked": 1, "failed": 0}
+
+def test_cancel_checkpoints_lowest_unfinished_recipient(campaign):
+    # Recipient 33 (index 32) never answers, while later ones in its batch do
+    bot = FakeBot(hang={33})
+
+    async def run_then_cancel():
+        task = asyncio.create_task(campaigns.run(bot, campaign["id"]))
+        while len(bot.sent) < 49:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run_then_cancel())
+    stored = campaigns.get(campaign["id"])
+    assert stored["status"] == "paused"
+    assert stored["cursor"] == 32
+    assert stored["stats"]["sent"] == 32
@@ -0,0 +1,35 @@
+# tests/test_category_model.py
+import pytest
+
+pytest.importorskip("dotenv")
+
+from utils.category_model import extract_amount
+
+@pytest.mark.parametrize("text, amount, currency", [
+    ("lunch 12.50", 12.5, ""),
+    ("Rs.200 groceries", 200.0, "INR"),
+    ("paid 1,200 rent", 1200.0, ""),
+    ("MRT top up 20 sgd", 20.0, "SGD"),
+    ("দুপুরের খাবার 6", 6.0, ""),
+    ("5 mangoes", 5.0, ""),
+])
+def test_plain_amounts(text, amount, currency):
+    assert extract_amount(text)[:2] == (amount, currency)
+
+@pytest.mark.parametrize("text", [
+    "spent 5k on rent",
+    "rent 5 K",
+    "sent 2 lakh home",
+    "phone 1.5m",
+    "বাড়িতে 2 লাখ পাঠালাম",
+    "வீட்டுக்கு 3 ஆயிரம்",
+    "bus 2.50 x2",
+    "2 x coffee 3",
+    "3x coffee 1.80",
+    "kopi 1.20 × 3",
+    "bus fare 2 twice",
+    "lunch 5 and dinner 8",
+    "no amount here",
+])
+def test_scaled_amounts_and_quantities_are_left_to_the_llm(text):
+    assert extract_amount(text) is None
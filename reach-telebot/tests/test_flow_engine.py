@@ -0,0 +1,171 @@
+# tests/test_flow_engine.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("dotenv")
+
+from utils import state_store
+from utils.callback_data import encode_callback
+from utils.flow_engine import END, FLOW_KEY, STORE_NAMESPACE, TEXT, Flow, FlowEngine
+
+USER_ID = 501
+
+class FakeQuery:
+    def __init__(self, data: str):
+        self.data = data
+        self.from_user = SimpleNamespace(id=USER_ID)
+        self.answers = []
+
+    async def answer(self, text: str = None):
+        self.answers.append(text)
+
+def callback_update(action: str, *args):
+    query = FakeQuery(encode_callback(action, *args))
+    return SimpleNamespace(effective_user=SimpleNamespace(id=USER_ID), callback_query=query, message=None)
+
+def text_update(text: str):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=USER_ID), callback_query=None,
+                           message=SimpleNamespace(text=text))
+
+def new_context():
+    return SimpleNamespace(user_data={})
+
+ASK_INCOME, ASK_AMOUNT = range(2)
+
+async def entry(update, context):
+    return ASK_INCOME
+
+async def pick_income(update, context):
+    context.user_data["budget_income"] = update.callback_query.data
+    return ASK_AMOUNT
+
+async def type_amount(update, context):
+    if not update.message.text.isdigit():
+        return None  # Stay on this step
+    context.user_data["budget_amount"] = int(update.message.text)
+    return END
+
+BUDGET = Flow(
+    name="budget",
+    entry=entry,
+    states={
+        ASK_INCOME: ("income", {"income": pick_income}),
+        ASK_AMOUNT: ("amount", {TEXT: type_amount}),
+    },
+    data_prefixes=("budget_",),
+)
+
+@pytest.fixture
+def engine():
+    state_store.delete(STORE_NAMESPACE, str(USER_ID))
+    yield FlowEngine([BUDGET])
+    state_store.delete(STORE_NAMESPACE, str(USER_ID))
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_flow_runs_to_completion_and_clears_its_data(engine):
+    context = new_context()
+    run(engine.start("budget", text_update("/budget"), context))
+    assert context.user_data[FLOW_KEY]["state"] == ASK_INCOME
+
+    run(engine.handle_callback(callback_update("income", 2), context))
+    assert context.user_data[FLOW_KEY]["state"] == ASK_AMOUNT
+    assert state_store.get(STORE_NAMESPACE, str(USER_ID))["flow"]["state"] == ASK_AMOUNT
+
+    assert run(engine.handle_text(text_update("abc"), context))
+    assert context.user_data[FLOW_KEY]["state"] == ASK_AMOUNT
+
+    assert run(engine.handle_text(text_update("300"), context))
+    assert context.user_data[FLOW_KEY] is None
+    assert not any(key.startswith("budget_") for key in context.user_data)
+    assert state_store.get(STORE_NAMESPACE, str(USER_ID)) is None
+
+def test_callback_for_another_step_is_stale(engine):
+    context = new_context()
+    run(engine.start("budget", text_update("/budget"), context))
+    run(engine.handle_callback(callback_update("income", 2), context))
+
+    # The income button pressed again from the earlier message
+    update = callback_update("income", 3)
+    run(engine.handle_callback(update, context))
+    assert update.callback_query.answers and update.callback_query.answers[0]
+    assert context.user_data[FLOW_KEY]["state"] == ASK_AMOUNT
+    assert context.user_data["budget_income"] == encode_callback("income", 2)
+
+def test_callback_without_active_flow_is_stale(engine):
+    update = callback_update("income", 2)
+    context = new_context()
+    run(engine.handle_callback(update, context))
+    assert update.callback_query.answers
+    assert context.user_data[FLOW_KEY] is None
+
+def test_unknown_action_is_stale(engine):
+    context = new_context()
+    run(engine.start("budget", text_update("/budget"), context))
+    update = callback_update("no_such_action")
+    run(engine.handle_callback(update, context))
+    assert update.callback_query.answers
+    assert context.user_data[FLOW_KEY]["state"] == ASK_INCOME
+
+def test_text_is_ignored_by_steps_without_text(engine):
+    context = new_context()
+    assert not run(engine.handle_text(text_update("hello"), context))
+    run(engine.start("budget", text_update("/budget"), context))
+    assert not run(engine.handle_text(text_update("hello"), context))
+
+def test_resumes_from_persisted_state_after_restart(engine):
+    context = new_context()
+    run(engine.start("budget", text_update("/budget"), context))
+    run(engine.handle_callback(callback_update("income", 2), context))
+
+    # A new process: empty user_data, same state store
+    restarted, context = FlowEngine([BUDGET]), new_context()
+    assert run(restarted.handle_text(text_update("450"), context))
+    assert context.user_data[FLOW_KEY] is None
+    assert context.user_data.get("budget_amount") is None
+    assert state_store.get(STORE_NAMESPACE, str(USER_ID)) is None
+
+def test_restored_flow_data_reaches_handlers(engine):
+    context = new_context()
+    run(engine.start("budget", text_update("/budget"), context))
+    run(engine.handle_callback(callback_update("income", 2), context))
+
+    seen = {}
+
+    async def capture(update, context):
+        seen.update(context.user_data)
+        return None
+
+    resumed = Flow(name="budget", entry=entry, states={**BUDGET.states, ASK_AMOUNT: ("amount", {TEXT: capture})},
+                   data_prefixes=("budget_",))
+    restarted, context = FlowEngine([resumed]), new_context()
+    run(restarted.handle_text(text_update("450"), context))
+    assert seen["budget_income"] == encode_callback("income", 2)
+    assert seen[FLOW_KEY]["state"] == ASK_AMOUNT
+
+def test_persisted_flow_that_no_longer_exists_is_ignored(engine):
+    state_store.set(STORE_NAMESPACE, str(USER_ID), {"flow": {"name": "retired", "state": 0, "since": 0}, "data": {}})
+    context = new_context()
+    assert engine.active(text_update("hi"), context) is None
+
+def test_cancel_and_abandon_end_the_flow(engine):
+    cancelled = []
+
+    async def on_cancel(update, context):
+        cancelled.append(True)
+
+    engine = FlowEngine([Flow(name="budget", entry=entry, states=BUDGET.states, cancel=on_cancel,
+                              data_prefixes=("budget_",))])
+    context = new_context()
+    run(engine.start("budget", text_update("/budget"), context))
+    run(engine.cancel(text_update("/cancel"), context))
+    assert cancelled == [True]
+    assert context.user_data[FLOW_KEY] is None
+
+    run(engine.start("budget", text_update("/budget"), context))
+    engine.abandon(text_update("/menu"), context)
+    assert context.user_data[FLOW_KEY] is None
+    assert state_store.get(STORE_NAMESPACE, str(USER_ID)) is None
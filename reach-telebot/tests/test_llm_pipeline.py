@@ -0,0 +1,155 @@
+# tests/test_llm_pipeline.py
+import threading
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("openai")
+
+from openai import BadRequestError, RateLimitError
+from utils import llm_pipeline
+from utils.llm_pipeline import CircuitBreaker, LLMPipeline, LLMUnavailableError
+
+def api_error(cls, status: int, message: str = "error"):
+    return cls(message, response=SimpleNamespace(status_code=status, request=None, headers={}), body=None)
+
+def response(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class FakeClient:
+    """Answers chat.completions.create with `behaviour(model, kwargs)`, recording every call."""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.calls = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **options):
+        return self
+
+    def _create(self, model, messages, **kwargs):
+        with self._lock:
+            self.calls.append((model, messages, kwargs))
+        result = self.behaviour(model, kwargs)
+        if isinstance(result, Exception):
+            raise result
+        return response(result)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_pipeline, "time", fake)
+    return fake
+
+MESSAGES = [{"role": "system", "content": "You help."}, {"role": "user", "content": "Hi"}]
+
+def test_breaker_opens_then_half_opens_after_cooldown(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    # One trial call at a time while half-open
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    # A failed trial re-opens for another cooldown; a successful one closes
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+def test_pipeline_falls_back_and_skips_open_breaker(clock):
+    client = FakeClient(lambda model, kwargs: api_error(RateLimitError, 429) if model == "primary" else "ok")
+    pipeline = LLMPipeline(client, fallback_models=["backup"], breaker_failures=2)
+    assert pipeline.complete("primary", MESSAGES) == "ok"
+    assert pipeline.complete("primary", MESSAGES) == "ok"
+    assert pipeline.breaker("primary").state == CircuitBreaker.OPEN
+
+    client.calls.clear()
+    assert pipeline.complete("primary", MESSAGES) == "ok"
+    assert [model for model, _, _ in client.calls] == ["backup"]
+
+def test_client_errors_do_not_open_the_breaker(clock):
+    client = FakeClient(lambda model, kwargs: api_error(BadRequestError, 400, "context length exceeded"))
+    pipeline = LLMPipeline(client, breaker_failures=2)
+    for _ in range(3):
+        with pytest.raises(LLMUnavailableError):
+            pipeline.complete("primary", MESSAGES)
+    assert pipeline.breaker("primary").state == CircuitBreaker.CLOSED
+    assert len(client.calls) == 3
+
+def test_client_error_on_half_open_trial_allows_another_trial(clock):
+    pipeline = LLMPipeline(FakeClient(lambda model, kwargs: api_error(BadRequestError, 400)), breaker_failures=1)
+    breaker = pipeline.breaker("primary")
+    breaker.record_failure()
+    clock.now += 60
+    with pytest.raises(LLMUnavailableError):
+        pipeline.complete("primary", MESSAGES)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+def test_json_mode_falls_back_to_prompt_instruction_once(clock):
+    def behaviour(model, kwargs):
+        if "response_format" in kwargs:
+            return api_error(BadRequestError, 400, "Invalid parameter: 'response_format' is not supported")
+        return '{"ok": true}'
+
+    client = FakeClient(behaviour)
+    pipeline = LLMPipeline(client)
+    assert pipeline.complete("old-model", MESSAGES, json_mode=True) == '{"ok": true}'
+    assert not pipeline.supports_json_mode("old-model")
+    assert pipeline.breaker("old-model").state == CircuitBreaker.CLOSED
+
+    # Later calls go straight to the prompt-only variant
+    client.calls.clear()
+    pipeline.complete("old-model", MESSAGES, json_mode=True)
+    assert len(client.calls) == 1
+    _, messages, kwargs = client.calls[0]
+    assert "response_format" not in kwargs
+    assert messages[0]["content"].endswith(llm_pipeline.JSON_INSTRUCTION)
+    assert MESSAGES[0]["content"] == "You help."
+
+def test_slow_call_is_hedged():
+    release = threading.Event()
+    first = threading.Event()
+
+    def behaviour(model, kwargs):
+        if not first.is_set():
+            first.set()
+            release.wait(5)
+            return "slow"
+        return "fast"
+
+    pipeline = LLMPipeline(FakeClient(behaviour), hedge_delay=0.05)
+    try:
+        assert pipeline.complete("primary", MESSAGES) == "fast"
+    finally:
+        release.set()
+
+def test_hedge_waits_for_the_other_call_when_one_fails():
+    first = threading.Event()
+
+    def behaviour(model, kwargs):
+        if not first.is_set():
+            first.set()
+            threading.Event().wait(0.2)
+            return "primary"
+        return api_error(RateLimitError, 429)
+
+    pipeline = LLMPipeline(FakeClient(behaviour), hedge_delay=0.05)
+    assert pipeline.complete("primary", MESSAGES) == "primary"
@@ -0,0 +1,40 @@
+# tests/test_memory_manager.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("dotenv")
+
+from utils import memory_manager
+
+class FakeApplication:
+    def __init__(self):
+        self.user_data = {}
+
+    def drop_user_data(self, user_id):
+        self.user_data.pop(user_id, None)
+
+@pytest.mark.parametrize("platform, maxrss", [("darwin", 512 * 1024 * 1024), ("linux", 512 * 1024)])
+def test_peak_rss_units_per_platform(monkeypatch, platform, maxrss):
+    monkeypatch.setattr(memory_manager.sys, "platform", platform)
+    monkeypatch.setattr(memory_manager.resource, "getrusage", lambda who: SimpleNamespace(ru_maxrss=maxrss))
+    assert memory_manager.peak_rss_mb() == 512
+
+def test_rss_is_unknown_without_proc(monkeypatch):
+    def no_proc(*args, **kwargs):
+        raise FileNotFoundError("/proc/self/statm")
+
+    monkeypatch.setattr(memory_manager, "open", no_proc, raising=False)
+    assert memory_manager.rss_mb() is None
+
+@pytest.mark.parametrize("rss, evicted", [(None, 0), (50.0, 0), (500.0, 1)])
+def test_memory_eviction_needs_current_rss(monkeypatch, rss, evicted):
+    monkeypatch.setattr(memory_manager, "MEMORY_LIMIT_MB", 100)
+    monkeypatch.setattr(memory_manager, "rss_mb", lambda: rss)
+    manager = memory_manager.UserDataManager(FakeApplication())
+    for user_id in range(5):
+        manager._last_seen[user_id] = -10_000.0  # Idle long enough for memory eviction, not for the TTL
+    monkeypatch.setattr(memory_manager.time, "monotonic", lambda: 0.0)
+    asyncio.run(manager.sweep())
+    assert len(manager._last_seen) == 5 - evicted
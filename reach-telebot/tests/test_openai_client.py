@@ -0,0 +1,72 @@
+# tests/test_openai_client.py
+import threading
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("openai")
+
+from utils import llm_providers, openai_client
+from utils.llm_pipeline import LLMUnavailableError
+
+CALLERS = 8
+
+class CountingLock:
+    """The in-flight lock, counting callers that have looked up their request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entered = 0
+
+    def __enter__(self):
+        self._lock.acquire()
+        self.entered += 1
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+@pytest.fixture
+def upstream(monkeypatch):
+    lock = CountingLock()
+    monkeypatch.setattr(openai_client, "_inflight_lock", lock)
+    state = {"calls": 0, "result": "shared answer"}
+
+    def complete(task, messages, json_mode=False, model=None, providers=None):
+        state["calls"] += 1
+        # Hold the request open until every caller has found it in flight
+        while lock.entered < CALLERS:
+            threading.Event().wait(0.001)
+        if isinstance(state["result"], Exception):
+            raise state["result"]
+        return state["result"]
+
+    monkeypatch.setattr(llm_providers, "complete", complete)
+    return state
+
+def _call_concurrently() -> list:
+    results = [None] * CALLERS
+    messages = [{"role": "user", "content": "How do I save?"}]
+
+    def call(i):
+        try:
+            results[i] = openai_client._create_completion("advise", "gpt-3.5-turbo", messages)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+def test_identical_concurrent_requests_share_one_call(upstream):
+    assert _call_concurrently() == ["shared answer"] * CALLERS
+    assert upstream["calls"] == 1
+    assert openai_client._inflight == {}
+
+def test_error_reaches_every_waiter(upstream):
+    error = LLMUnavailableError("openai: APITimeoutError")
+    upstream["result"] = error
+    assert _call_concurrently() == [error] * CALLERS
+    assert upstream["calls"] == 1
+    assert openai_client._inflight == {}
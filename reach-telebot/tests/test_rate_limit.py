@@ -0,0 +1,70 @@
+# tests/test_rate_limit.py
+import pytest
+
+pytest.importorskip("dotenv")
+
+from utils import rate_limit, state_store
+from utils.rate_limit import RateLimited, TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", fake)
+    yield fake
+    for key, _ in list(state_store.items(rate_limit.STORE_NAMESPACE)):
+        state_store.delete(rate_limit.STORE_NAMESPACE, key)
+
+def test_burst_then_queue(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=3)
+    assert [bucket.reserve("u", max_wait=10) for _ in range(3)] == [0, 0, 0]
+    # Each request past the burst queues one refill interval behind the previous one
+    assert bucket.reserve("u", max_wait=10) == pytest.approx(1.0)
+    assert bucket.reserve("u", max_wait=10) == pytest.approx(2.0)
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+    bucket.reserve("u", max_wait=0)
+    bucket.reserve("u", max_wait=0)
+    clock.now += 1
+    assert bucket.reserve("u", max_wait=0) == 0
+    clock.now += 3600
+    assert [bucket.reserve("u", max_wait=10) for _ in range(3)] == pytest.approx([0, 0, 1.0])
+
+def test_rejected_past_max_wait_without_reserving(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=1)
+    bucket.reserve("u", max_wait=0)
+    with pytest.raises(RateLimited) as raised:
+        bucket.reserve("u", max_wait=0.5)
+    assert raised.value.wait == pytest.approx(1.0)
+    # The rejected request took no token: the next one still waits one interval, not two
+    assert bucket.reserve("u", max_wait=5) == pytest.approx(1.0)
+
+def test_global_bucket_limits_all_users(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit, "_user_bucket", TokenBucket(rate_per_minute=60, capacity=5))
+    monkeypatch.setattr(rate_limit, "_global_bucket", TokenBucket(rate_per_minute=6, capacity=2))
+    monkeypatch.setattr(rate_limit, "LLM_MAX_QUEUE_SECONDS", 5)
+    assert rate_limit.reserve_llm_call(1) == 0
+    assert rate_limit.reserve_llm_call(2) == 0
+    # The global bucket is empty and refills one token per 10s, beyond the 5s queue
+    with pytest.raises(RateLimited) as raised:
+        rate_limit.reserve_llm_call(3)
+    assert raised.value.scope == rate_limit.GLOBAL_KEY
+    # User 3's token was refunded when the global bucket rejected the request
+    assert state_store.get(rate_limit.STORE_NAMESPACE, "user:3")["tokens"] == 5
+
+def test_user_bucket_is_per_user(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit, "_user_bucket", TokenBucket(rate_per_minute=6, capacity=1))
+    monkeypatch.setattr(rate_limit, "_global_bucket", TokenBucket(rate_per_minute=600, capacity=100))
+    monkeypatch.setattr(rate_limit, "LLM_MAX_QUEUE_SECONDS", 5)
+    assert rate_limit.reserve_llm_call(1) == 0
+    with pytest.raises(RateLimited) as raised:
+        rate_limit.reserve_llm_call(1)
+    assert raised.value.scope == "user:1"
+    assert rate_limit.reserve_llm_call(2) == 0
@@ -0,0 +1,55 @@
+# tests/test_update_processor.py
+import asyncio
+import pytest
+
+pytest.importorskip("telegram")
+
+from utils import update_processor
+from utils.update_processor import PerUserUpdateProcessor
+
+@pytest.fixture(autouse=True)
+def keyed_by_dict(monkeypatch):
+    monkeypatch.setattr(update_processor, "update_key", lambda update: update["user"])
+
+def test_same_user_in_order_other_users_concurrently():
+    events = []
+
+    async def handle(update, delay):
+        events.append(("start", update["user"], update["n"]))
+        await asyncio.sleep(delay)
+        events.append(("end", update["user"], update["n"]))
+
+    async def main():
+        processor = PerUserUpdateProcessor(8)
+        updates = [({"user": 1, "n": 1}, 0.05), ({"user": 1, "n": 2}, 0), ({"user": 2, "n": 3}, 0)]
+        await asyncio.gather(*(processor.process_update(u, handle(u, d)) for u, d in updates))
+        return processor
+
+    processor = asyncio.run(main())
+    # User 2 finished while user 1's slow first update ran; user 1's second update waited for it
+    assert events.index(("end", 2, 3)) < events.index(("end", 1, 1))
+    assert events.index(("end", 1, 1)) < events.index(("start", 1, 2))
+    assert processor._locks == {}
+
+def test_waiting_updates_of_one_user_do_not_take_shared_slots():
+    async def main():
+        processor = PerUserUpdateProcessor(2)
+        release = asyncio.Event()
+        done = []
+
+        async def slow(update):
+            await release.wait()
+            done.append(update["n"])
+
+        async def fast(update):
+            done.append(update["n"])
+
+        flood = [asyncio.create_task(processor.process_update(u, slow(u)))
+                 for u in ({"user": 1, "n": n} for n in range(5))]
+        await asyncio.sleep(0)
+        await asyncio.wait_for(processor.process_update({"user": 2, "n": 99}, fast({"user": 2, "n": 99})), 1)
+        release.set()
+        await asyncio.gather(*flood)
+        return done
+
+    assert asyncio.run(main()) == [99, 0, 1, 2, 3, 4]
@@ -0,0 +1,55 @@
+# tests/test_write_journal.py
+from datetime import datetime
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("firebase_admin")
+pytest.importorskip("telegram")
+
+from utils import firebase_client as fc, write_journal
+from utils.models import Expense
+
+def _expense(description: str) -> Expense:
+    return Expense(amount_minor=500, currency="SGD", category="Food", description=description,
+                   timestamp=datetime(2024, 5, 1, 12, 0))
+
+@pytest.fixture
+def user_ref():
+    user_id = 4242
+    ref = fc.get_db().collection('users').document(str(user_id))
+    ref.set({'language': 'en', 'expenses': [_expense(d).to_firestore() for d in ("a", "b", "c")]})
+    yield user_id, ref
+    ref.delete()
+
+def _fail(*args, **kwargs):
+    raise ConnectionError("Firestore unavailable")
+
+def test_outage_then_replay_keeps_stored_expenses(user_ref, monkeypatch):
+    user_id, ref = user_ref
+    document_type = type(ref)
+    with monkeypatch.context() as m:
+        m.setattr(document_type, "get", _fail)
+        m.setattr(document_type, "set", _fail)
+        assert fc.is_fallback(fc.get_user_data(user_id))
+        fc.save_expense(user_id, _expense("during_outage"))
+        # The user still sees their new expense while it waits in the journal
+        assert [e.description for e in fc.get_expenses(user_id)] == ["during_outage"]
+
+    write_journal.replay(fc.apply_journal_entries)
+
+    stored = [e['description'] for e in ref.get().to_dict()['expenses']]
+    assert stored == ["a", "b", "c", "during_outage"]
+    assert write_journal.get_journal().pending(user_id) == []
+
+def test_fallback_data_is_never_written_back(user_ref, monkeypatch):
+    user_id, ref = user_ref
+    monkeypatch.setattr(type(ref), "get", _fail)
+    data = fc.get_user_data(user_id)
+    with pytest.raises(fc.UserDataUnavailableError):
+        fc.update_user_data(user_id, data)
+
+def test_append_entries_survive_the_journal_encoding():
+    entry = {'expenses': write_journal.ArrayAppend([{'timestamp': datetime(2024, 5, 1), 'description': "x"}])}
+    decoded = write_journal.loads(write_journal.dumps(entry))
+    assert decoded == entry
+    assert write_journal.merge_into({'expenses': [{'description': "y"}]}, decoded)['expenses'][-1]['description'] == "x"
@@ -0,0 +1,94 @@
+# train_category_model.py
+"""
+Train the local expense categorizer (utils/category_model.py).
+
+Streams every user's expenses and uses the (description, category) pairs
+whose category came from the LLM, grouped by the user's language. A stable
+hash of the description holds out --holdout of the pairs for evaluation.
+Each language's accuracy, macro F1 and its coverage and accuracy at
+CATEGORY_MODEL_THRESHOLD are printed. Languages below --min-accuracy are left
+out of the model; nothing is written if no language qualifies.
+
+    python train_category_model.py
+    python train_category_model.py --dry-run --min-examples 10
+"""
+import argparse
+import json
+import logging
+import sys
+import zlib
+from collections import Counter, defaultdict
+from config import CATEGORY_MODEL_PATH, CATEGORY_MODEL_THRESHOLD, DEFAULT_LANGUAGE
+from utils import categories, category_model, firebase_client
+from utils.models import Expense
+
+logger = logging.getLogger(__name__)
+
+def collect(page_size: int) -> dict:
+    """Returns {language: [(description, category key)]} for LLM-categorized expenses."""
+    pairs = defaultdict(list)
+    for page in firebase_client.iter_user_documents(page_size):
+        for _, data in page:
+            language = data.get("language") or DEFAULT_LANGUAGE
+            for raw in data.get("expenses") or []:
+                expense = Expense.from_firestore(raw)
+                category_id = categories.category_id(expense)
+                # Other says nothing about the description, so it is left to the LLM
+                if expense.category_source == "model" or category_id == categories.OTHER \
+                        or not expense.description.strip():
+                    continue
+                pairs[language].append((expense.description, categories.key_for(category_id)))
+    return pairs
+
+def _is_holdout(text: str, holdout: float) -> bool:
+    return zlib.crc32(text.lower().encode("utf-8")) % 1000 < holdout * 1000
+
+def train(pairs: dict, min_examples: int, holdout: float, epochs: int, min_accuracy: float) -> tuple:
+    """Trains one model per language; returns ({language: model}, {language: metrics})."""
+    models, results = {}, {}
+    for language, examples in sorted(pairs.items()):
+        counts = Counter(category for _, category in examples)
+        classes = sorted(category for category, count in counts.items() if count >= min_examples)
+        if len(classes) < 2:
+            results[language] = {"examples": len(examples), "skipped": "fewer than 2 categories with enough examples"}
+            continue
+        usable = [(text, category) for text, category in examples if category in classes]
+        train_set = [pair for pair in usable if not _is_holdout(pair[0], holdout)]
+        test_set = [pair for pair in usable if _is_holdout(pair[0], holdout)]
+        model = category_model.LanguageModel(classes).fit(train_set, epochs=epochs)
+        result = category_model.evaluate(model, test_set, CATEGORY_MODEL_THRESHOLD)
+        result.update(train_examples=len(train_set), classes=len(classes))
+        if test_set and result["accuracy"] < min_accuracy:
+            result["skipped"] = f"accuracy below {min_accuracy}"
+        else:
+            models[language] = model
+        results[language] = result
+    return models, results
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train the local expense categorizer.")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--min-examples", type=int, default=20, help="Examples a category needs to be learned")
+    parser.add_argument("--holdout", type=float, default=0.1, help="Share of examples held out for evaluation")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--min-accuracy", type=float, default=0.8, help="Held-out accuracy a language needs")
+    parser.add_argument("--out", default=CATEGORY_MODEL_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate without writing the model")
+    args = parser.parse_args(argv)
+
+    pairs = collect(args.page_size)
+    logger.info("Collected %s labelled expenses", sum(len(p) for p in pairs.values()))
+    models, results = train(pairs, args.min_examples, args.holdout, args.epochs, args.min_accuracy)
+    for language, result in results.items():
+        print(f"{language}: {json.dumps(result)}")
+
+    if not models:
+        print("No language qualified; the model was not written", file=sys.stderr)
+        return 1
+    if not args.dry_run:
+        category_model.save(models, results, args.out)
+        print(f"Wrote models for {', '.join(sorted(models))} to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
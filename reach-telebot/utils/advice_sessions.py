@@ -0,0 +1,172 @@
+# utils/advice_sessions.py
+"""
+Multi-turn advice sessions.
+
+A user's questions and the answers they got are kept in the state store
+(namespace "advice_sessions"), so follow-up questions are answered in
+context without users pasting their history back in. Each prompt is built to
+stay under ADVICE_PROMPT_TOKENS: the system prompt and the new question with
+the user's profile come first, then the session's rolling summary, then as
+many of the latest turns as still fit, newest first.
+
+Once a session holds more than ADVICE_SESSION_TURNS turns, a background task
+folds the older ones into the summary with one LLM call. If that call fails
+the turns stay and the budget simply leaves the oldest out. A session ends
+after ADVICE_SESSION_IDLE_HOURS without questions, or when the user starts a
+new topic.
+
+Token counts are estimated at four bytes of UTF-8 per token, which is close
+for English and errs on the high side for Bengali and Tamil.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from config import ADVICE_PROMPT_TOKENS, ADVICE_SESSION_TURNS, ADVICE_SUMMARY_TOKENS, ADVICE_SESSION_IDLE_HOURS
+from utils import metrics, state_store
+from utils.llm_pipeline import LLMUnavailableError
+from utils.openai_client import (
+    ADVICE_ERROR_MESSAGE, build_advice_messages, build_summary_messages, complete_advice
+)
+
+logger = logging.getLogger(__name__)
+
+STORE_NAMESPACE = "advice_sessions"
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators per chat message
+
+_compacting = set()  # user_ids with a compaction running in this process
+_compacting_lock = threading.Lock()
+
+def estimate_tokens(text: str) -> int:
+    return len(text.encode("utf-8")) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+def _messages_tokens(messages: list) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+def _truncate(text: str, tokens: int) -> str:
+    """Cuts text to about `tokens` tokens, keeping its end (the most recent part of a summary)."""
+    data = text.encode("utf-8")
+    limit = max(0, (tokens - MESSAGE_OVERHEAD_TOKENS) * 4)
+    if len(data) <= limit:
+        return text
+    return "…" + data[len(data) - limit:].decode("utf-8", "ignore")
+
+def load(user_id: int) -> dict:
+    """
+    The user's current session:
+    {"session_id", "summary", "turns": [{"id", "question", "answer"}], "next_id", "updated_at"}.
+    """
+    session = state_store.get(STORE_NAMESPACE, str(user_id))
+    if not session or time.time() - session["updated_at"] > ADVICE_SESSION_IDLE_HOURS * 3600:
+        return {"session_id": None, "summary": "", "turns": [], "next_id": 0, "updated_at": 0}
+    return session
+
+def reset(user_id: int):
+    state_store.delete(STORE_NAMESPACE, str(user_id))
+
+def build_messages(session: dict, prompt: str, lang_code: str) -> list:
+    """The advice messages for a new prompt, with as much of the session as fits ADVICE_PROMPT_TOKENS."""
+    budget = ADVICE_PROMPT_TOKENS - _messages_tokens(build_advice_messages(prompt, lang_code))
+    summary = ""
+    if session["summary"] and budget > MESSAGE_OVERHEAD_TOKENS * 4:
+        summary = _truncate(session["summary"], min(ADVICE_SUMMARY_TOKENS, budget))
+        budget -= estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS * 4  # Plus the summary's framing
+
+    history = []
+    for turn in reversed(session["turns"]):
+        cost = estimate_tokens(turn["question"]) + estimate_tokens(turn["answer"])
+        if cost > budget:
+            break
+        history[:0] = [{"role": "user", "content": turn["question"]}, {"role": "assistant", "content": turn["answer"]}]
+        budget -= cost
+
+    # The estimates above are per part; make sure the assembled prompt fits too
+    messages = build_advice_messages(prompt, lang_code, summary=summary, history=history)
+    while _messages_tokens(messages) > ADVICE_PROMPT_TOKENS and (history or summary):
+        if history:
+            history = history[2:]
+        else:
+            summary = ""
+        messages = build_advice_messages(prompt, lang_code, summary=summary, history=history)
+    return messages
+
+def record(user_id: int, question: str, answer: str) -> bool:
+    """Adds a turn to the user's session; returns whether older turns are due for compaction."""
+    def apply(state):
+        if not state or time.time() - state["updated_at"] > ADVICE_SESSION_IDLE_HOURS * 3600:
+            state = {"session_id": uuid.uuid4().hex, "summary": "", "turns": [], "next_id": 0}
+        state["turns"].append({"id": state["next_id"], "question": question, "answer": answer})
+        state["next_id"] += 1
+        state["updated_at"] = time.time()
+        return state
+
+    return len(state_store.update(STORE_NAMESPACE, str(user_id), apply)["turns"]) > ADVICE_SESSION_TURNS
+
+def ask(user_id: int, prompt: str, question: str, lang_code: str) -> tuple:
+    """
+    Answers a prompt in the context of the user's session and records the turn.
+
+    prompt is the full request (question plus the user's profile, goals and
+    expenses); only the question itself is kept in the session, since the
+    profile is rebuilt fresh for every prompt.
+
+    Returns:
+        (advice text, whether compact() should run)
+    """
+    messages = build_messages(load(user_id), prompt, lang_code)
+    metrics.increment("advice.requests")
+    metrics.increment("advice.prompt_tokens", _messages_tokens(messages))
+    try:
+        advice = complete_advice(messages)
+    except LLMUnavailableError as e:
+        logger.error("No LLM answered the advice request: %s", e)
+        return ADVICE_ERROR_MESSAGE, False
+    return advice, record(user_id, question, advice)
+
+def compact(user_id: int, lang_code: str) -> bool:
+    """Folds the turns before the latest ADVICE_SESSION_TURNS into the summary; returns whether it did."""
+    with _compacting_lock:
+        if user_id in _compacting:
+            return False
+        _compacting.add(user_id)
+    try:
+        session = load(user_id)
+        older = session["turns"][:-ADVICE_SESSION_TURNS]
+        if not older:
+            return False
+        max_words = ADVICE_SUMMARY_TOKENS * 3 // 4
+        try:
+            with metrics.timer("advice.compaction"):
+                summary = complete_advice(build_summary_messages(session["summary"], older, lang_code, max_words))
+        except LLMUnavailableError as e:
+            logger.warning("Could not compact the advice session of user %s: %s", user_id, e)
+            return False
+
+        folded = {turn["id"] for turn in older}
+        applied = {}
+
+        def apply(state):
+            # Skip if the session ended, was replaced by a new one (turn ids restart at 0), or another
+            # process compacted it meanwhile
+            applied["done"] = (bool(state) and state.get("session_id") == session.get("session_id")
+                               and state["summary"] == session["summary"])
+            if not applied["done"]:
+                return state
+            state["turns"] = [turn for turn in state["turns"] if turn["id"] not in folded]
+            state["summary"] = _truncate(summary.strip(), ADVICE_SUMMARY_TOKENS)
+            return state
+
+        state_store.update(STORE_NAMESPACE, str(user_id), apply)
+        if not applied["done"]:
+            logger.info("Advice session of user %s changed during compaction; summary dropped", user_id)
+            return False
+        metrics.increment("advice.compactions")
+        return True
+    finally:
+        with _compacting_lock:
+            _compacting.discard(user_id)
+
+async def compact_in_background(user_id: int, lang_code: str) -> None:
+    """compact() in a worker thread, for Application.create_task."""
+    await asyncio.to_thread(compact, user_id, lang_code)
@@ -0,0 +1,231 @@
+# utils/analytics.py
+"""
+Vectorized spending analytics behind /report.
+
+A user's expenses are decoded once into columnar NumPy arrays (amounts in
+home-currency minor units, local day numbers, month numbers, category
+IDs). Monthly totals, category shares, daily totals, rolling averages and
+anomalous days are then computed with grouped reductions (bincount) instead of per-expense
+Python loops.
+
+Reports are cached per (user, month) and frames per user. Both are dropped
+when firebase_client writes the user's expenses, and all of them when the
+FX rate table version changes, since amounts are converted with it. Each
+drop bumps a generation counter; a frame or report computed across a drop
+is returned but not cached.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+import numpy as np
+from utils import categories, firebase_client, fx, metrics
+
+TREND_MONTHS = 6
+BASELINE_DAYS = 90
+ROLLING_DAYS = 7
+# Robust z-score above which a day's spending counts as anomalous
+ANOMALY_THRESHOLD = 3.5
+MAX_CACHED_USERS = 5000
+
+def month_number(year: int, month: int) -> int:
+    return year * 12 + (month - 1)
+
+def month_label(number: int) -> str:
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+def parse_month(text: str) -> int:
+    """Parses 'YYYY-MM' into a month number; raises ValueError on bad input."""
+    year, month = text.split("-")
+    year, month = int(year), int(month)
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month: {text}")
+    return month_number(year, month)
+
+def current_month() -> int:
+    today = date.today()
+    return month_number(today.year, today.month)
+
+@dataclass(slots=True)
+class ExpenseFrame:
+    """A user's expenses as parallel arrays, oldest first."""
+    amounts: np.ndarray  # int64 minor units
+    days: np.ndarray  # int64 proleptic ordinal of the local date
+    months: np.ndarray  # int64 month numbers
+    category_ids: np.ndarray  # int64 canonical category IDs (utils/categories.py)
+    currency: str
+
+    @classmethod
+    def from_expenses(cls, expenses: list):
+        # Amounts in the home currency; expenses without a rate for their currency are left out
+        dated = []
+        home_amounts = []
+        for expense in expenses:
+            amount_minor = fx.home_amount_minor(expense) if expense.timestamp is not None else None
+            if amount_minor is not None:
+                dated.append(expense)
+                home_amounts.append(amount_minor)
+        local_dates = [e.timestamp.astimezone().date() for e in dated]
+        return cls(
+            amounts=np.fromiter(home_amounts, dtype=np.int64, count=len(dated)),
+            days=np.fromiter((d.toordinal() for d in local_dates), dtype=np.int64, count=len(dated)),
+            months=np.fromiter((month_number(d.year, d.month) for d in local_dates), dtype=np.int64, count=len(dated)),
+            category_ids=np.fromiter((categories.category_id(e) for e in dated), dtype=np.int64, count=len(dated)),
+            currency=fx.HOME_CURRENCY
+        )
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+@dataclass(slots=True)
+class MonthlyReport:
+    month: str
+    currency: str
+    total_minor: int
+    count: int
+    previous_month: str
+    previous_total_minor: int
+    change: float  # Month-over-month change as a fraction; None without spending last month
+    category_shares: list = field(default_factory=list)  # (category ID, amount_minor, share), largest first
+    trend: list = field(default_factory=list)  # (month label, total_minor), oldest first
+    daily_rolling_minor: list = field(default_factory=list)  # Trailing 7-day average per day of the month
+    anomalous_days: list = field(default_factory=list)  # (YYYY-MM-DD, total_minor)
+
+def _daily_totals(frame: ExpenseFrame, first_day: int, last_day: int) -> np.ndarray:
+    """Total spending per day for [first_day, last_day], including zero days."""
+    mask = (frame.days >= first_day) & (frame.days <= last_day)
+    return np.bincount(frame.days[mask] - first_day, weights=frame.amounts[mask],
+                       minlength=last_day - first_day + 1)
+
+def _anomalies(daily: np.ndarray, month_offset: int) -> np.ndarray:
+    """Indexes (into daily) of days in the report month with unusually high spending."""
+    spent = daily[daily > 0]
+    if len(spent) < 5:
+        return np.array([], dtype=np.int64)
+    median = np.median(spent)
+    mad = np.median(np.abs(spent - median))
+    if mad > 0:
+        scores = 0.6745 * (daily - median) / mad
+    else:
+        std = spent.std()
+        if std == 0:
+            return np.array([], dtype=np.int64)
+        scores = (daily - spent.mean()) / std
+    candidates = np.flatnonzero((scores > ANOMALY_THRESHOLD) & (daily > 0))
+    return candidates[candidates >= month_offset]
+
+def compute_monthly_report(frame: ExpenseFrame, month: int) -> MonthlyReport:
+    """Builds the report for a month number from a frame."""
+    # Grouped monthly totals over the trend window
+    first_trend_month = month - (TREND_MONTHS - 1)
+    in_window = (frame.months >= first_trend_month) & (frame.months <= month)
+    monthly = np.bincount(frame.months[in_window] - first_trend_month, weights=frame.amounts[in_window],
+                          minlength=TREND_MONTHS)
+    total, previous = int(monthly[-1]), int(monthly[-2])
+
+    # Category shares within the month
+    in_month = frame.months == month
+    by_category = np.bincount(frame.category_ids[in_month], weights=frame.amounts[in_month],
+                              minlength=len(categories.TAXONOMY))
+    order = np.argsort(by_category)[::-1]
+    shares = [(int(i), int(by_category[i]), float(by_category[i] / total))
+              for i in order if by_category[i] > 0]
+
+    # Daily totals from the baseline start through the end of the month
+    year, month_index = divmod(month, 12)
+    first_day = date(year, month_index + 1, 1).toordinal()
+    next_year, next_month_index = divmod(month + 1, 12)
+    last_day = date(next_year, next_month_index + 1, 1).toordinal() - 1
+    baseline_start = first_day - BASELINE_DAYS
+    daily = _daily_totals(frame, baseline_start, last_day)
+    month_offset = first_day - baseline_start
+
+    # Trailing rolling mean via a cumulative sum
+    cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+    ends = np.arange(month_offset, len(daily)) + 1
+    rolling = (cumulative[ends] - cumulative[ends - ROLLING_DAYS]) / ROLLING_DAYS
+
+    anomalies = [(date.fromordinal(int(baseline_start + i)).isoformat(), int(daily[i]))
+                 for i in _anomalies(daily, month_offset)]
+
+    return MonthlyReport(
+        month=month_label(month),
+        currency=frame.currency,
+        total_minor=total,
+        count=int(in_month.sum()),
+        previous_month=month_label(month - 1),
+        previous_total_minor=previous,
+        change=(total - previous) / previous if previous else None,
+        category_shares=shares,
+        trend=[(month_label(first_trend_month + i), int(v)) for i, v in enumerate(monthly)],
+        daily_rolling_minor=[int(round(v)) for v in rolling],
+        anomalous_days=anomalies
+    )
+
+_lock = threading.Lock()
+_frames = OrderedDict()  # user_id -> ExpenseFrame, least recently used first
+_reports = {}  # (user_id, month) -> MonthlyReport
+_generation = 0  # Bumped whenever cached entries are dropped
+_fx_version = None  # Rate table version the cached entries were converted with
+
+def _current_generation() -> int:
+    """The cache generation, after dropping everything cached if the FX rate table has changed."""
+    global _generation, _fx_version
+    version = fx.table().version
+    with _lock:
+        if version != _fx_version:
+            _frames.clear()
+            _reports.clear()
+            _fx_version = version
+            _generation += 1
+        return _generation
+
+def _frame_for(user_id: int, generation: int) -> ExpenseFrame:
+    with _lock:
+        frame = _frames.get(user_id)
+        if frame is not None:
+            _frames.move_to_end(user_id)
+            return frame
+    frame = ExpenseFrame.from_expenses(firebase_client.get_expenses(user_id))
+    with _lock:
+        # An expense written (or new FX rates loaded) since generation may be missing from frame
+        if _generation != generation:
+            return frame
+        _frames[user_id] = frame
+        while len(_frames) > MAX_CACHED_USERS:
+            evicted, _ = _frames.popitem(last=False)
+            for key in [k for k in _reports if k[0] == evicted]:
+                del _reports[key]
+    return frame
+
+def monthly_report(user_id: int, month: int = None) -> MonthlyReport:
+    """Returns the (cached) report for a user and month number; defaults to the current month."""
+    month = current_month() if month is None else month
+    generation = _current_generation()
+    with _lock:
+        report = _reports.get((user_id, month))
+    if report is not None:
+        metrics.increment("analytics.cache_hits")
+        return report
+    metrics.increment("analytics.cache_misses")
+    with metrics.timer("analytics.report"):
+        report = compute_monthly_report(_frame_for(user_id, generation), month)
+    with _lock:
+        if _generation == generation and user_id in _frames:
+            _reports[(user_id, month)] = report
+    return report
+
+def invalidate(user_id: int):
+    global _generation
+    with _lock:
+        _generation += 1
+        _frames.pop(user_id, None)
+        for key in [k for k in _reports if k[0] == user_id]:
+            del _reports[key]
+
+def _on_write(user_id: int, field_name: str):
+    if field_name == "expenses":
+        invalidate(user_id)
+
+firebase_client.register_write_hook(_on_write)
+metrics.register_gauge("analytics.cached_users", lambda: len(_frames))
@@ -0,0 +1,120 @@
+# utils/callback_data.py
+"""
+Structured inline-button callback data.
+
+Buttons carry "<version>|<action>|<arg>|<arg>..." (e.g. "1|income|3"), which
+stays well under Telegram's 64-byte limit and decodes with a single split.
+Buttons sent before this format existed ("income_3", "family_needs_2", ...)
+are still in users' chats, so legacy strings are decoded through a prefix
+trie using longest match: "family_needs_2" resolves to family_needs, never to
+family, regardless of registration order.
+"""
+CALLBACK_VERSION = "1"
+SEPARATOR = "|"
+MAX_CALLBACK_BYTES = 64
+
+# Legacy callback strings that are a complete action on their own
+LEGACY_EXACT = {
+    "goal_custom": "goal_custom",
+    "advice_another": "advice_another",
+    "back_to_menu": "back_to_menu",
+    "log_another_expense": "log_expense",
+    "share_goal_with_family": "share_goal",
+    "start_onboarding": "start_onboarding",
+    "update_goal_progress": "update_goal_progress",
+}
+
+# Legacy "<prefix><arg>" callback strings
+LEGACY_PREFIXES = {
+    "set_lang_": "set_lang",
+    "menu_": "menu",
+    "income_": "income",
+    "family_needs_": "family_needs",
+    "family_": "family",
+    "spending_": "spending",
+    "goal_type_": "goal_type",
+    "goal_sugg_": "goal_sugg",
+    "goal_confirm_": "goal_confirm",
+    "micro_goal_confirm_": "micro_goal_confirm",
+    "goal_": "goal",
+    "debt_": "debt",
+    "confirm_": "confirm",
+    "deadline_": "deadline",
+    "steps_": "steps",
+    "advice_": "advice",
+}
+
+class _TrieNode:
+    __slots__ = ("children", "exact", "prefix")
+
+    def __init__(self):
+        self.children = {}
+        self.exact = None
+        self.prefix = None
+
+def _build_legacy_trie() -> _TrieNode:
+    root = _TrieNode()
+    for table, attribute in ((LEGACY_EXACT, "exact"), (LEGACY_PREFIXES, "prefix")):
+        for key, action in table.items():
+            node = root
+            for char in key:
+                node = node.children.setdefault(char, _TrieNode())
+            setattr(node, attribute, action)
+    return root
+
+_legacy_trie = _build_legacy_trie()
+
+def encode_callback(action: str, *args) -> str:
+    """Encodes an action and its arguments as callback data."""
+    data = SEPARATOR.join([CALLBACK_VERSION, action, *(str(a) for a in args)])
+    if len(data.encode("utf-8")) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"Callback data exceeds {MAX_CALLBACK_BYTES} bytes: {data!r}")
+    return data
+
+def _decode_legacy(data: str) -> tuple:
+    node = _legacy_trie
+    match = None
+    for index, char in enumerate(data):
+        node = node.children.get(char)
+        if node is None:
+            break
+        if node.prefix is not None:
+            match = (node.prefix, [data[index + 1:]] if index + 1 < len(data) else [])
+        if index == len(data) - 1 and node.exact is not None:
+            return node.exact, []
+    return match if match else (None, [])
+
+def decode_callback(data: str) -> tuple:
+    """
+    Decodes callback data into (action, args).
+
+    Returns (None, []) for data that matches no known action.
+    """
+    if not data:
+        return None, []
+    if data.startswith(CALLBACK_VERSION + SEPARATOR):
+        parts = data.split(SEPARATOR)
+        return parts[1], parts[2:]
+    return _decode_legacy(data)
+
+def callback_pattern(action: str, *args):
+    """
+    Returns a CallbackQueryHandler pattern matching an action (and optional leading args).
+
+    Used where python-telegram-bot still selects handlers itself, e.g. the
+    states of a ConversationHandler.
+    """
+    expected = [str(a) for a in args]
+
+    def matches(data) -> bool:
+        if not isinstance(data, str):
+            return False
+        decoded_action, decoded_args = decode_callback(data)
+        return decoded_action == action and decoded_args[:len(expected)] == expected
+
+    return matches
+
+def shadowed_legacy_prefixes() -> list:
+    """Lists (shorter, longer) legacy prefix pairs that a naive prefix match would confuse."""
+    keys = sorted(list(LEGACY_PREFIXES) + list(LEGACY_EXACT))
+    return [(a, b) for a in LEGACY_PREFIXES for b in keys if a != b and b.startswith(a)]
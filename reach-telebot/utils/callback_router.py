@@ -0,0 +1,64 @@
+# utils/callback_router.py
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes, CallbackQueryHandler
+from utils.profiling import span, handler_name
+from utils.callback_data import decode_callback, shadowed_legacy_prefixes, LEGACY_EXACT, LEGACY_PREFIXES
+
+logger = logging.getLogger(__name__)
+
+class CallbackRouter:
+    """
+    Dispatches callback queries by action through a single dict lookup.
+
+    Replaces a chain of regex-matched CallbackQueryHandlers: one handler is
+    registered with the application, the callback data is decoded once and the
+    action selects exactly one callback, independent of registration order.
+    """
+
+    def __init__(self):
+        self._routes = {}
+
+    def route(self, action: str, callback):
+        """Registers the callback for an action; each action may only be routed once."""
+        if action in self._routes:
+            raise ValueError(
+                f"Ambiguous route for '{action}': {self._routes[action].__qualname__} and {callback.__qualname__}"
+            )
+        self._routes[action] = callback
+
+    def resolve(self, data: str):
+        """Returns (action, args, callback) for callback data; callback is None if unrouted."""
+        action, args = decode_callback(data)
+        return action, args, self._routes.get(action)
+
+    def check(self) -> list:
+        """
+        Reports routing problems; meant to be called once at startup.
+
+        Returns a list of human-readable findings: legacy prefixes that shadow
+        one another under prefix matching (resolved here by longest match) and
+        legacy actions that have no route.
+        """
+        findings = [
+            f"Legacy prefix '{short}' also matches '{long}'; resolved by longest match"
+            for short, long in shadowed_legacy_prefixes()
+        ]
+        legacy_actions = set(LEGACY_EXACT.values()) | set(LEGACY_PREFIXES.values())
+        for action in sorted(legacy_actions - set(self._routes)):
+            findings.append(f"Action '{action}' has no standalone route")
+        return findings
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        query = update.callback_query
+        action, _, callback = self.resolve(query.data)
+        if callback is None:
+            await query.answer()
+            logger.warning("Unhandled callback pattern: %s", query.data)
+            return
+        with span(handler_name(callback)):
+            await callback(update, context)
+
+    def handler(self) -> CallbackQueryHandler:
+        """Returns the single CallbackQueryHandler to register with the application."""
+        return CallbackQueryHandler(self.dispatch)
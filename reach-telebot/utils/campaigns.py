@@ -0,0 +1,208 @@
+# utils/campaigns.py
+"""
+Broadcast campaigns to user segments (see utils/segments.py).
+
+Creating a campaign resolves its segment once into a recipient list, stored
+in chunks in the state store. The runner sends to recipients in batches of
+CHECKPOINT_EVERY, up to CAMPAIGN_CONCURRENCY at once, paced by a token
+bucket shared through the state store at CAMPAIGN_RATE_PER_SECOND (Telegram
+allows about 30 bulk messages per second per bot) and honouring RetryAfter.
+After each batch it saves its cursor, the lowest recipient not yet sent to,
+and delivery stats; pausing or cancelling a campaign takes effect at the next
+checkpoint, and starting a paused campaign resumes at the cursor.
+
+Statuses: ready -> running -> done, with paused and cancelled on the side.
+"""
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from config import CAMPAIGN_RATE_PER_SECOND, CAMPAIGN_CONCURRENCY, DEFAULT_LANGUAGE
+from utils import metrics, segments, state_store
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+STORE_NAMESPACE = "campaign"
+CHUNK_SIZE = 1000
+CHECKPOINT_EVERY = 25
+MAX_SEND_ATTEMPTS = 3
+OUTCOMES = ("sent", "blocked", "failed")
+
+_bucket = TokenBucket(CAMPAIGN_RATE_PER_SECOND * 60, CAMPAIGN_RATE_PER_SECOND)
+
+class CampaignError(Exception):
+    pass
+
+def _recipients_namespace(campaign_id: str) -> str:
+    return f"campaign_recipients:{campaign_id}"
+
+def create(segment: str, texts: dict) -> dict:
+    """Resolves a segment and stores a ready campaign; texts maps language codes to message text."""
+    if not texts:
+        raise CampaignError("A campaign needs at least one message text")
+    recipients = segments.resolve(segment)
+    campaign_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    for start in range(0, len(recipients), CHUNK_SIZE):
+        state_store.set(_recipients_namespace(campaign_id), f"{start // CHUNK_SIZE:06d}",
+                        recipients[start:start + CHUNK_SIZE])
+    campaign = {
+        "id": campaign_id,
+        "segment": segment,
+        "texts": texts,
+        "status": "ready",
+        "total": len(recipients),
+        "cursor": 0,
+        "stats": {outcome: 0 for outcome in OUTCOMES},
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None
+    }
+    state_store.set(STORE_NAMESPACE, campaign_id, campaign)
+    logger.info("Created campaign %s for segment %s with %s recipients", campaign_id, segment, len(recipients))
+    return campaign
+
+def get(campaign_id: str) -> dict:
+    return state_store.get(STORE_NAMESPACE, campaign_id)
+
+def list_campaigns() -> list:
+    """All campaigns, newest first."""
+    return sorted((c for _, c in state_store.items(STORE_NAMESPACE)), key=lambda c: c["created_at"], reverse=True)
+
+def _transition(campaign_id: str, allowed: tuple, status: str, **fields) -> dict:
+    result = {}
+
+    def apply(campaign):
+        result["campaign"] = campaign
+        result["changed"] = bool(campaign) and campaign["status"] in allowed
+        if result["changed"]:
+            campaign["status"] = status
+            for name, value in fields.items():
+                if campaign.get(name) is None:
+                    campaign[name] = value
+        return campaign
+
+    state_store.update(STORE_NAMESPACE, campaign_id, apply)
+    campaign = result["campaign"]
+    if campaign is None:
+        raise CampaignError(f"No campaign {campaign_id}")
+    # Repeating a pause or cancel is harmless; claiming a campaign another runner holds is not
+    if not result["changed"] and (campaign["status"] != status or status == "running"):
+        raise CampaignError(f"Campaign {campaign_id} is {campaign['status']}")
+    return campaign
+
+def pause(campaign_id: str) -> dict:
+    return _transition(campaign_id, ("ready", "running"), "paused")
+
+def cancel(campaign_id: str) -> dict:
+    return _transition(campaign_id, ("ready", "running", "paused"), "cancelled")
+
+def claim(campaign_id: str, force: bool = False) -> dict:
+    """Marks a ready or paused campaign as running; force also takes over one left running by a dead runner."""
+    allowed = ("ready", "paused", "running") if force else ("ready", "paused")
+    return _transition(campaign_id, allowed, "running", started_at=time.time())
+
+def _iter_recipients(campaign_id: str, start: int):
+    """Yields (index, user_id) from position start onwards."""
+    chunk = start // CHUNK_SIZE
+    while True:
+        user_ids = state_store.get(_recipients_namespace(campaign_id), f"{chunk:06d}")
+        if not user_ids:
+            return
+        for offset, user_id in enumerate(user_ids):
+            index = chunk * CHUNK_SIZE + offset
+            if index >= start:
+                yield index, user_id
+        chunk += 1
+
+def _text_for(campaign: dict, user_id: int) -> str:
+    texts = campaign["texts"]
+    language = (segments.user_terms(user_id).get("language") or [DEFAULT_LANGUAGE])[0]
+    return texts.get(language) or texts.get(DEFAULT_LANGUAGE) or next(iter(texts.values()))
+
+async def _send(bot, user_id: int, text: str) -> str:
+    for attempt in range(MAX_SEND_ATTEMPTS):
+        try:
+            await bot.send_message(chat_id=user_id, text=text)
+            return "sent"
+        except RetryAfter as e:
+            # Flood control: Telegram says how long to back off
+            metrics.increment("campaigns.retry_after")
+            delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            await asyncio.sleep(delay)
+        except Forbidden:
+            return "blocked"
+        except (BadRequest, TelegramError) as e:
+            logger.warning("Campaign message to user %s failed: %s", user_id, e)
+            return "failed"
+    return "failed"
+
+def _advance(cursor: int, outcomes: dict, stats: dict) -> int:
+    """Moves the cursor past the finished sends directly after it, counting them into stats."""
+    while cursor in outcomes:
+        stats[outcomes.pop(cursor)] += 1
+        cursor += 1
+    return cursor
+
+def _checkpoint(campaign_id: str, cursor: int, stats: dict, finished: bool = False) -> str:
+    """Saves progress and returns the stored status, which may have been paused or cancelled meanwhile."""
+    def apply(campaign):
+        campaign["cursor"] = cursor
+        campaign["stats"] = stats
+        if finished and campaign["status"] == "running":
+            campaign["status"] = "done"
+            campaign["finished_at"] = time.time()
+        return campaign
+
+    return state_store.update(STORE_NAMESPACE, campaign_id, apply)["status"]
+
+async def run(bot, campaign_id: str, force: bool = False) -> dict:
+    """Sends a campaign from its cursor until it finishes, is paused or is cancelled."""
+    campaign = claim(campaign_id, force)
+    cursor, stats = campaign["cursor"], dict(campaign["stats"])
+    logger.info("Running campaign %s from %s/%s", campaign_id, cursor, campaign["total"])
+
+    status = "running"
+    # Outcomes of sends finished ahead of the cursor, by recipient index
+    outcomes = {}
+    semaphore = asyncio.Semaphore(CAMPAIGN_CONCURRENCY)
+
+    async def deliver(index: int, user_id: int):
+        async with semaphore:
+            wait = _bucket.reserve("campaigns", max_wait=60)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            outcome = await _send(bot, user_id, _text_for(campaign, user_id))
+        metrics.increment(f"campaigns.{outcome}")
+        outcomes[index] = outcome
+
+    recipients = _iter_recipients(campaign_id, cursor)
+    try:
+        while batch := list(itertools.islice(recipients, CHECKPOINT_EVERY)):
+            await asyncio.gather(*(deliver(index, user_id) for index, user_id in batch))
+            cursor = _advance(cursor, outcomes, stats)
+            status = _checkpoint(campaign_id, cursor, stats)
+            if status != "running":
+                break
+    except asyncio.CancelledError:
+        # Shutdown or Ctrl-C: keep the progress and leave the campaign resumable. Recipients sent to
+        # past the first unfinished send are sent to again on resume.
+        cursor = _advance(cursor, outcomes, stats)
+        _checkpoint(campaign_id, cursor, stats)
+        pause(campaign_id)
+        logger.info("Campaign %s paused at %s/%s on shutdown", campaign_id, cursor, campaign["total"])
+        raise
+
+    if status == "running":
+        status = _checkpoint(campaign_id, cursor, stats, finished=True)
+    logger.info("Campaign %s stopped (%s) at %s/%s: %s", campaign_id, status, cursor, campaign["total"], stats)
+    return get(campaign_id)
+
+def format_campaign(campaign: dict) -> str:
+    stats = campaign["stats"]
+    total = campaign["total"]
+    progress = f"{campaign['cursor']}/{total}" + (f" ({campaign['cursor'] / total:.0%})" if total else "")
+    return (f"{campaign['id']} [{campaign['status']}] {campaign['segment']}\n"
+            f"  progress {progress}; sent {stats['sent']}, blocked {stats['blocked']}, failed {stats['failed']}")
@@ -0,0 +1,138 @@
+# utils/categories.py
+"""
+Canonical expense category taxonomy.
+
+The LLM and the local categorizer produce free-text categories ("Food",
+"meals", "Groceries", "খাবার", "உணவு", ...). normalize() maps that label to
+one of a small fixed set of categories, identified by an integer ID that is
+stored on the expense next to the original label. Aggregates key on the ID,
+and the category_<key> locale strings give each category its display name in
+the user's language.
+
+Labels are matched after case-folding and dropping punctuation: first as a
+whole against the synonyms, then word by word (so "Food & Drinks" is food);
+anything else is Other. IDs are stored, so never renumber or reuse one; add
+new categories at the end. When synonyms change, backfill_categories.py
+re-maps stored expenses.
+"""
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from utils.localization import get_text
+from utils.models import Expense
+
+@dataclass(frozen=True, slots=True)
+class Category:
+    id: int
+    key: str  # Display name is the category_<key> locale string
+    synonyms: tuple  # Lower-case labels in any supported language
+
+OTHER = 0
+
+TAXONOMY = (
+    Category(0, "other", ("other", "others", "misc", "miscellaneous", "general", "অন্যান্য", "மற்றவை", "இதர")),
+    Category(1, "food", (
+        "food", "foods", "meal", "meals", "dining", "eating out", "restaurant", "restaurants", "lunch", "dinner",
+        "breakfast", "snack", "snacks", "drinks", "beverage", "beverages", "coffee", "tea", "hawker", "canteen",
+        "খাবার", "খাদ্য", "দুপুরের খাবার", "রাতের খাবার", "নাস্তা", "চা",
+        "உணவு", "சாப்பாடு", "மதிய உணவு", "இரவு உணவு", "காலை உணவு", "சிற்றுண்டி", "டீ", "காபி",
+    )),
+    Category(2, "groceries", (
+        "groceries", "grocery", "supermarket", "market", "provisions", "vegetables", "rice",
+        "বাজার", "মুদি", "সবজি", "চাল",
+        "மளிகை", "மளிகைப் பொருட்கள்", "காய்கறி", "அரிசி",
+    )),
+    Category(3, "transport", (
+        "transport", "transportation", "travel", "commute", "taxi", "bus", "mrt", "train", "grab", "uber",
+        "fuel", "petrol", "ez link", "ezlink", "fare", "ride", "flight", "airfare",
+        "যাতায়াত", "পরিবহন", "ভাড়া গাড়ি", "বাস", "ট্রেন", "ট্যাক্সি",
+        "போக்குவரத்து", "பயணம்", "பேருந்து", "ரயில்", "டாக்ஸி",
+    )),
+    Category(4, "housing", (
+        "housing", "rent", "accommodation", "dormitory", "dorm", "lodging", "room", "hostel",
+        "বাসা ভাড়া", "ঘর ভাড়া", "আবাসন", "ডরমিটরি",
+        "வாடகை", "வீட்டு வாடகை", "தங்குமிடம்", "விடுதி",
+    )),
+    Category(5, "utilities", (
+        "utilities", "utility", "bills", "bill", "phone", "mobile", "top up", "topup", "recharge", "internet",
+        "data", "sim", "electricity",
+        "বিল", "মোবাইল", "রিচার্জ", "ইন্টারনেট", "ফোন", "বিদ্যুৎ",
+        "கட்டணம்", "பில்", "மொபைல்", "ரீசார்ஜ்", "இணையம்", "கைபேசி", "மின்சாரம்",
+    )),
+    Category(6, "remittance", (
+        "remittance", "remittances", "money transfer", "transfer", "sent home", "send home", "family support",
+        "money to family", "family",
+        "রেমিট্যান্স", "টাকা পাঠানো", "বাড়িতে টাকা", "পরিবার",
+        "பணம் அனுப்புதல்", "பணப் பரிமாற்றம்", "குடும்பம்", "வீட்டுக்கு பணம்",
+    )),
+    Category(7, "health", (
+        "health", "healthcare", "medical", "medicine", "medicines", "doctor", "clinic", "hospital", "pharmacy",
+        "dental", "insurance",
+        "চিকিৎসা", "ওষুধ", "ডাক্তার", "স্বাস্থ্য", "হাসপাতাল",
+        "மருத்துவம்", "மருந்து", "மருத்துவர்", "சுகாதாரம்", "மருத்துவமனை",
+    )),
+    Category(8, "education", (
+        "education", "school", "tuition", "course", "courses", "books", "training", "fees",
+        "শিক্ষা", "স্কুল", "বই", "কোর্স",
+        "கல்வி", "பள்ளி", "புத்தகம்", "பயிற்சி",
+    )),
+    Category(9, "shopping", (
+        "shopping", "clothes", "clothing", "apparel", "shoes", "personal care", "toiletries", "household",
+        "electronics", "gifts", "gift",
+        "কেনাকাটা", "জামাকাপড়", "কাপড়", "উপহার",
+        "ஷாப்பிங்", "உடைகள்", "துணி", "பரிசு",
+    )),
+    Category(10, "entertainment", (
+        "entertainment", "leisure", "movies", "movie", "games", "recreation", "outing", "sports",
+        "বিনোদন", "সিনেমা", "খেলা",
+        "பொழுதுபோக்கு", "சினிமா", "விளையாட்டு",
+    )),
+    Category(11, "debt", (
+        "debt", "loan", "loans", "repayment", "loan repayment", "agent fee", "agent fees", "credit card",
+        "ঋণ", "ধার", "কিস্তি", "এজেন্ট ফি",
+        "கடன்", "தவணை", "முகவர் கட்டணம்",
+    )),
+)
+
+_BY_ID = {category.id: category for category in TAXONOMY}
+
+def _clean(label: str) -> str:
+    # Not \W: Bengali and Tamil vowel signs are marks, which \w does not match
+    kept = (" " if unicodedata.category(c)[0] in "PSZC" else c for c in label.casefold())
+    return " ".join("".join(kept).split())
+
+_BY_SYNONYM = {}
+for _category in TAXONOMY:
+    for _label in (_category.key,) + _category.synonyms:
+        _BY_SYNONYM.setdefault(_clean(_label), _category.id)
+
+@lru_cache(maxsize=4096)
+def resolve(label: str) -> int:
+    """The category ID for a free-text label, OTHER if nothing matches."""
+    cleaned = _clean(label or "")
+    if cleaned in _BY_SYNONYM:
+        return _BY_SYNONYM[cleaned]
+    words = cleaned.split()
+    # Two-word synonyms ("eating out", "top up") before single words
+    for phrase in [" ".join(pair) for pair in zip(words, words[1:])] + words:
+        if phrase in _BY_SYNONYM:
+            return _BY_SYNONYM[phrase]
+    return OTHER
+
+def normalize(expense: Expense) -> Expense:
+    """Sets an expense's category ID from its category label."""
+    expense.category_id = resolve(expense.category)
+    return expense
+
+def category_id(expense: Expense) -> int:
+    """An expense's category ID: the stored one, or the label's for older expenses."""
+    if expense.category_id is not None and expense.category_id in _BY_ID:
+        return expense.category_id
+    return resolve(expense.category)
+
+def key_for(category_id: int) -> str:
+    return _BY_ID.get(category_id, _BY_ID[OTHER]).key
+
+def display_name(category_id: int, lang_code: str = "en") -> str:
+    """A category's name in the user's language."""
+    return get_text(f"category_{key_for(category_id)}", lang_code)
@@ -0,0 +1,268 @@
+# utils/category_model.py
+"""
+Local expense categorizer trained on the categories the LLM assigned so far.
+
+Each language has a linear softmax classifier over hashed features: word
+unigrams and bigrams plus character trigrams inside words (which copes with
+Bengali and Tamil inflections and typos). Features are hashed into
+N_FEATURES buckets, so the model is a fixed-size weight matrix per language
+and predicting sums a few dozen rows, which takes microseconds.
+
+train_category_model.py builds the model offline from stored expenses whose
+category came from the LLM (never from this model) and writes it to
+CATEGORY_MODEL_PATH with its evaluation metrics. The bot reruns it every
+CATEGORY_MODEL_RETRAIN_HOURS (see schedule_retraining()); running bots load
+the model lazily and pick up a new file within MODEL_CHECK_SECONDS.
+
+quick_parse() lets expense logging skip the LLM: when the text has exactly
+one amount and the model is at least CATEGORY_MODEL_THRESHOLD confident,
+it returns the parsed expense directly.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+import numpy as np
+from config import CATEGORY_MODEL_PATH, CATEGORY_MODEL_THRESHOLD, CATEGORY_MODEL_RETRAIN_HOURS
+from utils import metrics, state_store
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2 ** 15
+MODEL_CHECK_SECONDS = 60
+STORE_NAMESPACE = "category_model"
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "train_category_model.py")
+_AMOUNT = re.compile(r"(?<!\w)(?<!\d[.,])(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?(?![\w.,]*\d)")
+# Letters right after an amount ("5k", "2lakh") or a scale word ("5 lakh", "২ হাজার") change its value
+_SCALED = re.compile(r"[^\W\d_]|\s*(?:k|m|mn|bn|thousand|hundred|million|billion|lakhs?|lacs?|crores?"
+                     r"|হাজার|লাখ|লক্ষ|কোটি|ஆயிரம்|லட்சம்|கோடி)(?![^\W\d_])", re.I)
+# Quantities: "x2", "2 x", "×3", "* 2", "twice"
+_MULTIPLIER = re.compile(r"(?<!\w)[x×*]\s*\d|\d\s*[x×*](?!\w)|\b(?:twice|thrice)\b", re.I)
+# ISO codes and symbols users type next to amounts
+_CURRENCIES = (
+    ("SGD", re.compile(r"S\$|\bsgd\b", re.I)), ("MYR", re.compile(r"\bRM\b|\bmyr\b", re.I)),
+    ("INR", re.compile(r"₹|\brs\.?(?=\s|\d)|\binr\b|\brupees?\b", re.I)),
+    ("BDT", re.compile(r"৳|\btk\.?(?=\s|\d)|\bbdt\b|\btaka\b", re.I)),
+    ("LKR", re.compile(r"\blkr\b", re.I)), ("USD", re.compile(r"US\$|\busd\b|\$", re.I)),
+)
+
+def features(text: str) -> np.ndarray:
+    """Hashed feature indexes of a text (with repeats)."""
+    # Words are runs of letters and marks; \w would split Bengali and Tamil words at their vowel signs
+    words = "".join(c if unicodedata.category(c)[0] in "LM" else " " for c in text.lower()).split()
+    tokens = [f"w:{w}" for w in words]
+    tokens += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        tokens += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return np.fromiter((zlib.crc32(t.encode("utf-8")) % N_FEATURES for t in tokens), dtype=np.int64,
+                       count=len(tokens))
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    exp = np.exp(scores - scores.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+class LanguageModel:
+    """Softmax regression over hashed features for one language."""
+
+    def __init__(self, classes: list, weights: np.ndarray = None, bias: np.ndarray = None):
+        self.classes = list(classes)
+        self.weights = weights if weights is not None else np.zeros((N_FEATURES, len(classes)), dtype=np.float32)
+        self.bias = bias if bias is not None else np.zeros(len(classes), dtype=np.float32)
+
+    def probabilities(self, indexes: np.ndarray) -> np.ndarray:
+        # Scaling by 1/sqrt(n) (an L2-normalized feature vector) keeps long and short texts on the same scale
+        return _softmax(self.weights[indexes].sum(axis=0) / np.sqrt(len(indexes)) + self.bias)
+
+    def predict(self, text: str) -> tuple:
+        """Returns (category, confidence), or (None, 0.0) for text without words."""
+        indexes = features(text)
+        if not len(indexes):
+            return None, 0.0
+        probabilities = self.probabilities(indexes)
+        best = int(probabilities.argmax())
+        return self.classes[best], float(probabilities[best])
+
+    def fit(self, examples: list, epochs: int = 5, learning_rate: float = 0.5, l2: float = 1e-6, seed: int = 0):
+        """Trains with SGD on [(text, category)]; categories must be in classes."""
+        codes = {name: i for i, name in enumerate(self.classes)}
+        encoded = [(features(text), codes[category]) for text, category in examples]
+        encoded = [(indexes, code) for indexes, code in encoded if len(indexes)]
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            rate = learning_rate / (1 + epoch)
+            for i in rng.permutation(len(encoded)):
+                indexes, code = encoded[i]
+                gradient = self.probabilities(indexes)
+                gradient[code] -= 1.0
+                np.add.at(self.weights, indexes,
+                          (-rate / np.sqrt(len(indexes))) * gradient - rate * l2 * self.weights[indexes])
+                self.bias -= rate * gradient
+        return self
+
+def evaluate(model: LanguageModel, examples: list, threshold: float) -> dict:
+    """Accuracy, macro F1 and the confident share and its accuracy at threshold."""
+    if not examples:
+        return {"examples": 0}
+    correct = confident = confident_correct = 0
+    true_positive, predicted, actual = {}, {}, {}
+    for text, category in examples:
+        guess, confidence = model.predict(text)
+        hit = guess == category
+        correct += hit
+        predicted[guess] = predicted.get(guess, 0) + 1
+        actual[category] = actual.get(category, 0) + 1
+        true_positive[category] = true_positive.get(category, 0) + hit
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += hit
+    f1_scores = []
+    for category, count in actual.items():
+        tp = true_positive.get(category, 0)
+        precision = tp / predicted[category] if predicted.get(category) else 0.0
+        recall = tp / count
+        f1_scores.append(2 * precision * recall / (precision + recall) if precision + recall else 0.0)
+    return {
+        "examples": len(examples),
+        "accuracy": round(correct / len(examples), 4),
+        "macro_f1": round(sum(f1_scores) / len(f1_scores), 4),
+        "threshold": threshold,
+        "coverage": round(confident / len(examples), 4),
+        "confident_accuracy": round(confident_correct / confident, 4) if confident else None,
+    }
+
+def save(models: dict, metrics_by_language: dict, path: str = CATEGORY_MODEL_PATH):
+    """Writes {language: LanguageModel} to an .npz file atomically."""
+    arrays = {"trained_at": np.array(time.time())}
+    for language, model in models.items():
+        arrays[f"{language}.classes"] = np.array(model.classes)
+        arrays[f"{language}.weights"] = model.weights
+        arrays[f"{language}.bias"] = model.bias
+        arrays[f"{language}.metrics"] = np.array(json.dumps(metrics_by_language.get(language, {})))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def load(path: str = CATEGORY_MODEL_PATH) -> dict:
+    """Reads {language: LanguageModel} from an .npz file."""
+    with np.load(path) as data:
+        languages = {name.split(".", 1)[0] for name in data.files if name.endswith(".classes")}
+        return {
+            language: LanguageModel([str(c) for c in data[f"{language}.classes"]],
+                                    data[f"{language}.weights"], data[f"{language}.bias"])
+            for language in languages
+        }
+
+_models = {}
+_signature = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def _current_models() -> dict:
+    """The loaded models, reloaded when the file has changed (checked every MODEL_CHECK_SECONDS)."""
+    global _models, _signature, _checked_at
+    if time.monotonic() - _checked_at < MODEL_CHECK_SECONDS:
+        return _models
+    with _lock:
+        _checked_at = time.monotonic()
+        try:
+            stat = os.stat(CATEGORY_MODEL_PATH)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == _signature:
+            return _models
+        _signature = signature
+        if signature is None:
+            _models = {}
+            return _models
+        try:
+            _models = load()
+            logger.info("Loaded category models for %s", ", ".join(sorted(_models)))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Could not load the category model from %s: %s", CATEGORY_MODEL_PATH, e)
+        return _models
+
+def predict(text: str, lang_code: str) -> tuple:
+    """Returns (category, confidence) from the language's model, or (None, 0.0) without one."""
+    model = _current_models().get(lang_code)
+    if model is None:
+        return None, 0.0
+    return model.predict(text)
+
+def extract_amount(text: str) -> tuple:
+    """
+    Returns (amount, currency, remaining text) if the text has exactly one
+    plain amount, else None: scaled amounts ("5k") and quantities ("2.50 x2")
+    are left to the LLM.
+    """
+    matches = list(_AMOUNT.finditer(text))
+    if len(matches) != 1 or _MULTIPLIER.search(text):
+        return None
+    match = matches[0]
+    if _SCALED.match(text, match.end()):
+        return None
+    amount = float(match.group(1).replace(",", "") + (f".{match.group(2)}" if match.group(2) else ""))
+    if amount <= 0:
+        return None
+    currency = next((code for code, marker in _CURRENCIES if marker.search(text)), "")
+    rest = text[:match.start()] + " " + text[match.end():]
+    for _, marker in _CURRENCIES:
+        rest = marker.sub(" ", rest)
+    return amount, currency, re.sub(r"\s+", " ", rest).strip(" -:,")
+
+def quick_parse(text: str, lang_code: str) -> dict:
+    """parse_expense output for text the local model is confident about, or None to ask the LLM."""
+    extracted = extract_amount(text)
+    if extracted is None:
+        return None
+    amount, currency, description = extracted
+    category, confidence = predict(description, lang_code)
+    if category is None or confidence < CATEGORY_MODEL_THRESHOLD:
+        metrics.increment("category_model.deferred")
+        return None
+    metrics.increment("category_model.used")
+    return {"amount": amount, "currency": currency, "category": category, "description": description,
+            "category_source": "model"}
+
+def _claim_retraining() -> bool:
+    """Claims this round of retraining, so only one of several bot processes runs it."""
+    interval = CATEGORY_MODEL_RETRAIN_HOURS * 3600
+    claimed = {}
+
+    def apply(state):
+        now = time.time()
+        claimed["ok"] = not state or now - state["started_at"] >= interval * 0.9
+        return {"started_at": now} if claimed["ok"] else state
+
+    state_store.update(STORE_NAMESPACE, "retraining", apply)
+    return claimed["ok"]
+
+async def _retrain(context) -> None:
+    if not await asyncio.to_thread(_claim_retraining):
+        return
+    # A separate process keeps the training's CPU and memory away from the bot
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, TRAIN_SCRIPT, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    output, _ = await process.communicate()
+    metrics.increment("category_model.retrained" if process.returncode == 0 else "category_model.retrain_failed")
+    logger.info("Category model retraining exited with %s:\n%s", process.returncode,
+                output.decode("utf-8", "replace").strip())
+
+def schedule_retraining(application):
+    """Retrains the model every CATEGORY_MODEL_RETRAIN_HOURS."""
+    if CATEGORY_MODEL_RETRAIN_HOURS <= 0:
+        return
+    if application.job_queue is None:
+        logger.warning("JobQueue unavailable; the category model is not retrained automatically")
+        return
+    interval = CATEGORY_MODEL_RETRAIN_HOURS * 3600
+    application.job_queue.run_repeating(_retrain, interval=interval, first=min(interval, 600))
@@ -0,0 +1,148 @@
+# utils/charts.py
+"""
+PNG charts for expenses and goal progress.
+
+Rendering (matplotlib) is CPU-bound, so it runs in a process pool off the
+event loop. Each chart is identified by a content hash of its kind and input
+aggregates. After the first upload, the Telegram file_id for that hash is
+kept in the state store, and later views resend the file_id instead of
+rendering and uploading again.
+
+The workers only have DejaVu Sans, which has no Bengali or Tamil glyphs, so
+charts draw Latin text only: localized names go in the caption instead.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from telegram.error import BadRequest
+from config import CHART_WORKERS
+from utils import metrics, state_store
+
+logger = logging.getLogger(__name__)
+
+STORE_NAMESPACE = "chart_file_id"
+FIGURE_SIZE = (6, 4)
+DPI = 120
+
+def _figure():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt, plt.figure(figsize=FIGURE_SIZE, dpi=DPI)
+
+def _to_png(plt, fig) -> bytes:
+    buffer = io.BytesIO()
+    fig.tight_layout()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.getvalue()
+
+def render_category_pie(payload: dict) -> bytes:
+    """payload: {"title", "currency", "shares": [[key, amount], ...]}; the caption maps each key to its category."""
+    plt, fig = _figure()
+    ax = fig.add_subplot()
+    labels = [key for key, _ in payload["shares"]]
+    values = [amount for _, amount in payload["shares"]]
+    ax.pie(values, labels=labels, autopct="%1.0f%%", startangle=90, counterclock=False)
+    ax.set_title(payload["title"])
+    ax.axis("equal")
+    return _to_png(plt, fig)
+
+def render_monthly_bars(payload: dict) -> bytes:
+    """payload: {"title", "currency", "months": [[label, amount], ...]}"""
+    plt, fig = _figure()
+    ax = fig.add_subplot()
+    labels = [label for label, _ in payload["months"]]
+    values = [amount for _, amount in payload["months"]]
+    ax.bar(labels, values, color="#4C9F70")
+    ax.set_title(payload["title"])
+    ax.set_ylabel(payload["currency"])
+    ax.grid(axis="y", alpha=0.3)
+    return _to_png(plt, fig)
+
+def render_goal_burndown(payload: dict) -> bytes:
+    """payload: {"title", "amount", "remaining", "start", "deadline", "today"} with ISO dates"""
+    from datetime import date
+    plt, fig = _figure()
+    ax = fig.add_subplot()
+    start, deadline, today = (date.fromisoformat(payload[k]) for k in ("start", "deadline", "today"))
+    ax.plot([start, deadline], [payload["amount"], 0], linestyle="--", color="gray", label="Plan")
+    ax.plot([start, today], [payload["amount"], payload["remaining"]], marker="o", color="#D9822B", label="Remaining")
+    ax.set_title(payload["title"])
+    ax.set_ylim(bottom=0)
+    ax.legend()
+    fig.autofmt_xdate()
+    return _to_png(plt, fig)
+
+_RENDERERS = {
+    "category_pie": render_category_pie,
+    "monthly_bars": render_monthly_bars,
+    "goal_burndown": render_goal_burndown,
+}
+
+_pool = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and worker threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _reset_pool(broken: ProcessPoolExecutor):
+    """Drops a pool whose worker died (OOM, a native crash); the next _get_pool() starts a fresh one."""
+    global _pool
+    if _pool is broken:
+        _pool = None
+        metrics.increment("charts.pool_restarts")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+async def _run_in_pool(fn, *args):
+    """Runs fn in the pool, retrying once in a fresh pool if the current one is broken."""
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            return await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            if attempt:
+                raise
+            logger.warning("Chart process pool broken; retrying in a new pool")
+
+def chart_key(kind: str, payload: dict) -> str:
+    """Content hash identifying a chart."""
+    encoded = json.dumps({"kind": kind, "payload": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+async def render(kind: str, payload: dict) -> bytes:
+    """Renders a chart in the process pool."""
+    with metrics.timer(f"charts.render.{kind}"):
+        return await _run_in_pool(_RENDERERS[kind], payload)
+
+async def send_chart(bot, chat_id: int, kind: str, payload: dict, caption: str = None):
+    """Sends a chart, reusing the Telegram file_id of an identical chart when one was uploaded before."""
+    key = chart_key(kind, payload)
+    file_id = state_store.get(STORE_NAMESPACE, key)
+    if file_id:
+        try:
+            message = await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+            metrics.increment("charts.file_id_hits")
+            return message
+        except BadRequest as e:
+            # File ids can expire or belong to another bot token; upload again
+            logger.warning("Cached chart file_id rejected (%s); re-rendering", e)
+            state_store.delete(STORE_NAMESPACE, key)
+
+    metrics.increment("charts.rendered")
+    image = await render(kind, payload)
+    message = await bot.send_photo(chat_id=chat_id, photo=image, caption=caption)
+    if message.photo:
+        # The largest size is last
+        state_store.set(STORE_NAMESPACE, key, message.photo[-1].file_id)
+    return message
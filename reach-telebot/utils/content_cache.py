@@ -0,0 +1,71 @@
+# utils/content_cache.py
+import json
+import logging
+import os
+import threading
+from config import CONTENT_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Pre-generated LLM content, filled offline by batch_jobs.py:
+#   {"suggestions": {"<income>:<family>:<spending>:<lang>": [...]},
+#    "advice": {"<category>:<lang>": "..."}}
+_cache = None
+_lock = threading.Lock()
+
+def _load() -> dict:
+    """Loads the cache file once, returning an empty cache if it does not exist."""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                data = {"suggestions": {}, "advice": {}}
+                if os.path.exists(CONTENT_CACHE_PATH):
+                    try:
+                        with open(CONTENT_CACHE_PATH, 'r', encoding='utf-8') as f:
+                            data.update(json.load(f))
+                        logger.info("Loaded content cache from %s", CONTENT_CACHE_PATH)
+                    except Exception as e:
+                        logger.error("Error loading content cache %s: %s", CONTENT_CACHE_PATH, e)
+                _cache = data
+    return _cache
+
+def save():
+    """Atomically writes the cache back to disk."""
+    data = _load()
+    directory = os.path.dirname(CONTENT_CACHE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = CONTENT_CACHE_PATH + ".tmp"
+    with _lock:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, CONTENT_CACHE_PATH)
+
+def suggestion_key(income_level: int, family_option: int, spending_option: int, lang_code: str) -> str:
+    """Builds the cache key for an assessment combination."""
+    return f"{income_level}:{family_option}:{spending_option}:{lang_code}"
+
+def get_suggestions(income_level: int, family_option: int, spending_option: int, lang_code: str) -> list:
+    """Returns pre-generated goal suggestions for an assessment combination, or None."""
+    return _load()["suggestions"].get(suggestion_key(income_level, family_option, spending_option, lang_code))
+
+def put_suggestions(key: str, suggestions: list):
+    """Stores goal suggestions under a key built by suggestion_key."""
+    _load()["suggestions"][key] = suggestions
+
+def advice_key(category: str, lang_code: str) -> str:
+    """Builds the cache key for a preset advice question."""
+    return f"{category}:{lang_code}"
+
+def get_advice(category: str, lang_code: str) -> str:
+    """Returns the canned answer for a preset advice category, or None."""
+    return _load()["advice"].get(advice_key(category, lang_code))
+
+def put_advice(key: str, advice: str):
+    """Stores a canned advice answer under a key built by advice_key."""
+    _load()["advice"][key] = advice
+
+def has_entry(section: str, key: str) -> bool:
+    """Returns whether a suggestions/advice entry is already cached."""
+    return key in _load()[section]
@@ -1,96 +1,262 @@
 # utils/firebase_client.py
 import firebase_admin
 from firebase_admin import credentials, firestore
-from config import FIREBASE_SERVICE_ACCOUNT_KEY_PATH, DEFAULT_LANGUAGE
+from utils import metrics, write_journal
+from utils.models import UserProfile, Goal, Expense
+from utils.profiling import span
+from config import FIREBASE_SERVICE_ACCOUNT_KEY_PATH, FIRESTORE_BACKEND, FIREBASE_PROJECT_ID, DEFAULT_LANGUAGE
 import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 _db = None
+_write_hooks = []
+
+FALLBACK_FIELD = "_fallback"  # Set on the defaults get_user_data returns when the document could not be read
+
+class UserDataUnavailableError(Exception):
+    """Raised instead of writing back data that came from a failed read."""
 
 def initialize_firebase():
     """Initializes the Firebase Admin SDK."""
     global _db
     if _db is None:
         try:
-            cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_KEY_PATH)
-            firebase_admin.initialize_app(cred)
-            _db = firestore.client()
-            logging.info("Firebase initialized successfully.")
+            if FIRESTORE_BACKEND == "memory":
+                from devtools.fake_firestore import FakeFirestoreClient
+                _db = FakeFirestoreClient()
+            elif FIRESTORE_BACKEND == "emulator":
+                # The emulator accepts anonymous credentials; the client reads FIRESTORE_EMULATOR_HOST itself
+                from google.auth.credentials import AnonymousCredentials
+                from google.cloud import firestore as cloud_firestore
+                _db = cloud_firestore.Client(project=FIREBASE_PROJECT_ID, credentials=AnonymousCredentials())
+            else:
+                cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_KEY_PATH)
+                firebase_admin.initialize_app(cred)
+                _db = firestore.client()
+            logger.info("Firebase initialized successfully (%s backend).", FIRESTORE_BACKEND)
         except Exception as e:
-            logging.error(f"Failed to initialize Firebase: {e}", exc_info=True)
+            logger.error("Failed to initialize Firebase: %s", e, exc_info=True)
             raise Exception(f"Failed to initialize Firebase: {e}")
 
+def get_db():
+    """Returns the Firestore client, initializing it if needed."""
+    if not _db:
+        initialize_firebase()
+    return _db
+
+def register_write_hook(hook):
+    """Registers hook(user_id, field) to run after a user's field is written (e.g. to invalidate caches)."""
+    _write_hooks.append(hook)
+
+def _notify_write(user_id: int, field: str):
+    for hook in _write_hooks:
+        try:
+            hook(user_id, field)
+        except Exception as e:
+            logger.error("Write hook %s failed for user %s: %s", hook.__qualname__, user_id, e, exc_info=True)
+
+def _default_user_data() -> dict:
+    return {'language': DEFAULT_LANGUAGE, 'profile': {}, 'goals': [], 'expenses': []}
+
+def is_fallback(data: dict) -> bool:
+    """Whether get_user_data returned defaults because the document could not be read."""
+    return bool(data.get(FALLBACK_FIELD))
+
 def get_user_data(user_id: int) -> dict:
-    """Retrieves user data from Firestore."""
+    """
+    Retrieves user data from Firestore, including the user's writes still waiting in the journal.
+
+    If Firestore cannot be read, returns defaults marked with FALLBACK_FIELD
+    (see is_fallback()); those are fine to show but must never be written back.
+    """
     if not _db:
         initialize_firebase()
         
     try:
         user_ref = _db.collection('users').document(str(user_id))
-        user_snapshot = user_ref.get()
+        with span("firestore.get_user_data"):
+            user_snapshot = user_ref.get()
         if user_snapshot.exists:
-            return user_snapshot.to_dict()
+            data = user_snapshot.to_dict()
         else:
             # Return a default structure for new users
-            return {'language': DEFAULT_LANGUAGE, 'profile': {}, 'goals': [], 'expenses': []}
+            data = _default_user_data()
+    except Exception as e:
+        logger.error("Error getting user data for %s: %s", user_id, e, exc_info=True)
+        data = _default_user_data()
+        data[FALLBACK_FIELD] = True
+    data.pop(write_journal.SEQUENCE_FIELD, None)
+
+    try:
+        pending = write_journal.get_journal().pending(user_id)
     except Exception as e:
-        logging.error(f"Error getting user data for {user_id}: {e}", exc_info=True)
-        return {'language': DEFAULT_LANGUAGE, 'profile': {}, 'goals': [], 'expenses': []}
+        logger.error("Error reading the write journal for %s: %s", user_id, e, exc_info=True)
+        pending = []
+    for entry in pending:
+        write_journal.merge_into(data, entry)
+    return data
+
+def update_user_document(user_id: int, fn) -> dict:
+    """
+    Read-modify-write of a user's stored document in a Firestore transaction.
+
+    fn(stored data) returns the fields to update, or None to leave the
+    document alone; it may run more than once if the document changes
+    meanwhile. The write bypasses the journal: a failed transaction writes
+    nothing, whereas a journaled copy would be replayed over later writes.
+    Returns the fields written (None if none); raises if Firestore fails.
+    """
+    if not _db:
+        initialize_firebase()
+
+    ref = _db.collection('users').document(str(user_id))
+    if FIRESTORE_BACKEND == "memory":
+        from devtools.fake_firestore import transactional
+    else:
+        transactional = firestore.transactional
+
+    @transactional
+    def apply(transaction):
+        snapshot = ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict() or {}
+        data.pop(write_journal.SEQUENCE_FIELD, None)
+        updates = fn(data)
+        if updates:
+            transaction.update(ref, updates)
+        return updates
+
+    with span("firestore.update_user_document"):
+        return apply(_db.transaction())
+
+def _write_user_data(user_id: int, data: dict):
+    user_ref = _db.collection('users').document(str(user_id))
+    data = {key: firestore.ArrayUnion(value.items) if isinstance(value, write_journal.ArrayAppend) else value
+            for key, value in data.items()}
+    # Use merge=True to only update fields present in the data dict
+    with span("firestore.update_user_data"):
+        user_ref.set(data, merge=True)
 
 def update_user_data(user_id: int, data: dict):
-    """Updates user data in Firestore."""
+    """
+    Updates user data in Firestore, journaling the write first so a Firestore outage cannot lose it.
+
+    Add to array fields with write_journal.ArrayAppend rather than writing the
+    whole array, so the write cannot replace items it did not read.
+
+    Raises:
+        UserDataUnavailableError: If data carries the fallback marker of a failed read
+    """
+    if FALLBACK_FIELD in data:
+        raise UserDataUnavailableError(f"Refusing to write fallback data for user {user_id}")
     if not _db:
         initialize_firebase()
-    
+
     try:
-        user_ref = _db.collection('users').document(str(user_id))
-        # Use merge=True to only update fields present in the data dict
-        user_ref.set(data, merge=True)
-        logging.debug(f"Updated data for user {user_id}")
+        journal = write_journal.get_journal()
+        seq, leased = journal.append(user_id, data)
+    except Exception as e:
+        logger.error("Could not journal the write for user %s, writing directly: %s", user_id, e, exc_info=True)
+        try:
+            _write_user_data(user_id, data)
+        except Exception as e:
+            logger.error("Error updating user data for %s: %s", user_id, e, exc_info=True)
+        return
+
+    if not leased:
+        # Earlier writes for this user are still pending; the replayer applies this one after them
+        metrics.increment("journal.deferred")
+        return
+    try:
+        _write_user_data(user_id, {**data, write_journal.SEQUENCE_FIELD: {journal.journal_id: seq}})
+        journal.ack(seq)
+        logger.debug("Updated data for user %s", user_id)
     except Exception as e:
-        logging.error(f"Error updating user data for {user_id}: {e}", exc_info=True)
+        journal.release(seq, str(e))
+        metrics.increment("journal.deferred")
+        logger.warning("Firestore write for user %s failed; journaled for replay: %s", user_id, e)
+
+def apply_journal_entries(user_id: int, entries: list) -> int:
+    """Writes a user's journaled entries in order, skipping those the document already has."""
+    if not _db:
+        initialize_firebase()
+
+    journal_id = write_journal.get_journal().journal_id
+    with span("firestore.get_user_data"):
+        snapshot = _db.collection('users').document(str(user_id)).get()
+    applied_seq = ((snapshot.to_dict() or {}).get(write_journal.SEQUENCE_FIELD) or {}).get(journal_id, 0) \
+        if snapshot.exists else 0
+    for seq, data in entries:
+        if seq > applied_seq:
+            _write_user_data(user_id, {**data, write_journal.SEQUENCE_FIELD: {journal_id: seq}})
+    return len(entries)
 
 def set_user_language(user_id: int, lang_code: str):
     """Specifically sets the user's language preference."""
     update_user_data(user_id, {'language': lang_code})
+    _notify_write(user_id, 'language')
 
 def get_user_language(user_id: int) -> str:
     """Gets the user's language preference, falling back to default."""
     user_data = get_user_data(user_id)
     return user_data.get('language', DEFAULT_LANGUAGE)
 
-def save_goal(user_id: int, goal_data: dict):
+def save_goal(user_id: int, goal: Goal):
     """Saves a user's financial goal."""
-    user_data = get_user_data(user_id)
-    goals = user_data.get('goals', [])
-    goals.append(goal_data)
-    update_user_data(user_id, {'goals': goals})
+    # Only the new goal is written (and journaled), so an outage cannot replace the stored list
+    update_user_data(user_id, {'goals': write_journal.ArrayAppend([goal.to_firestore()])})
+    _notify_write(user_id, 'goals')
 
 def get_goals(user_id: int) -> list:
-    """Gets the user's financial goals."""
+    """Gets the user's financial goals as Goal objects."""
     user_data = get_user_data(user_id)
-    return user_data.get('goals', [])
+    return [Goal.from_firestore(g) for g in user_data.get('goals', [])]
 
-def save_expense(user_id: int, expense_data: dict):
+def save_expense(user_id: int, expense: Expense):
     """Saves a user's expense."""
-    user_data = get_user_data(user_id)
-    expenses = user_data.get('expenses', [])
-    expenses.append(expense_data)
-    update_user_data(user_id, {'expenses': expenses})
+    update_user_data(user_id, {'expenses': write_journal.ArrayAppend([expense.to_firestore()])})
+    _notify_write(user_id, 'expenses')
 
 def get_expenses(user_id: int) -> list:
-    """Gets the user's expenses."""
+    """Gets the user's expenses as Expense objects, oldest first."""
     user_data = get_user_data(user_id)
-    return user_data.get('expenses', [])
+    return [Expense.from_firestore(e) for e in user_data.get('expenses', [])]
 
-def save_profile(user_id: int, profile_data: dict):
+def save_profile(user_id: int, profile: UserProfile):
     """Saves a user's profile information."""
-    update_user_data(user_id, {'profile': profile_data})
+    update_user_data(user_id, {'profile': profile.to_firestore()})
+    _notify_write(user_id, 'profile')
 
-def get_profile(user_id: int) -> dict:
-    """Gets the user's profile information."""
+def get_profile(user_id: int) -> UserProfile:
+    """Gets the user's profile information, or None if they have not completed onboarding."""
     user_data = get_user_data(user_id)
-    return user_data.get('profile', {})
+    return UserProfile.from_firestore(user_data.get('profile', {}))
+
+def iter_user_documents(page_size: int = 500, start_after: str = None):
+    """
+    Streams the users collection in document id order, one page at a time.
+
+    Yields lists of (user_id string, data dict) so callers never hold more than a
+    page in memory; pass the last id seen as start_after to resume a scan.
+    """
+    if not _db:
+        initialize_firebase()
+
+    users = _db.collection('users')
+    while True:
+        query = users.order_by('__name__').limit(page_size)
+        if start_after is not None:
+            query = query.start_after({'__name__': users.document(start_after)})
+        page = [(snapshot.id, snapshot.to_dict() or {}) for snapshot in query.stream()]
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        start_after = page[-1][0]
 
 # Initialize Firebase when the module is imported
 initialize_firebase()
\ No newline at end of file
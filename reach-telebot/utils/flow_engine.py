@@ -0,0 +1,197 @@
+# utils/flow_engine.py
+"""
+Declarative state machine for multi-step conversations.
+
+A Flow is a transition table: each state names the events it accepts
+(callback actions, or TEXT for a typed message) and the handler to run.
+Handlers return the next state, or END. The engine keeps at most one active
+flow per user in user_data and mirrors it, together with the user_data keys
+the flow owns, to the state store, so a half-finished flow survives restarts.
+
+Every transition is timed and every step entry counted, which gives the
+per-step drop-off reported by funnel().
+"""
+import logging
+import time
+from dataclasses import dataclass
+from telegram import Update
+from telegram.ext import ContextTypes, ConversationHandler
+from utils import metrics, state_store
+from utils.callback_data import decode_callback
+from utils.profiling import span, handler_name
+from utils.localization import get_text
+
+logger = logging.getLogger(__name__)
+
+END = ConversationHandler.END
+TEXT = "text"
+FLOW_KEY = "flow"
+STORE_NAMESPACE = "flow"
+
+@dataclass
+class Flow:
+    """A named conversation and its transition table."""
+    name: str
+    entry: object  # async (update, context) -> first state
+    states: dict  # state -> (step name, {event: handler})
+    cancel: object = None  # async (update, context) -> END, run on /cancel
+    data_prefixes: tuple = ()  # user_data keys owned by the flow
+
+    def step_name(self, state) -> str:
+        return self.states[state][0] if state in self.states else str(state)
+
+    def handler_for(self, state, event):
+        return self.states.get(state, (None, {}))[1].get(event)
+
+    def events(self) -> set:
+        return {event for _, transitions in self.states.values() for event in transitions}
+
+class FlowEngine:
+    def __init__(self, flows: list):
+        self._flows = {flow.name: flow for flow in flows}
+
+    def callback_actions(self) -> set:
+        """Returns every callback action accepted by some flow state."""
+        return {event for flow in self._flows.values() for event in flow.events() if event != TEXT}
+
+    def active(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> dict:
+        """Returns the user's active flow record, restoring it from the state store once per process."""
+        if FLOW_KEY not in context.user_data:
+            persisted = state_store.get(STORE_NAMESPACE, str(update.effective_user.id))
+            if persisted and persisted["flow"]["name"] in self._flows:
+                context.user_data.update(persisted["data"])
+                context.user_data[FLOW_KEY] = persisted["flow"]
+                logger.info("Restored %s flow for user %s", persisted['flow']['name'], update.effective_user.id)
+            else:
+                context.user_data[FLOW_KEY] = None
+        return context.user_data[FLOW_KEY]
+
+    def _clear_data(self, flow: Flow, context: ContextTypes.DEFAULT_TYPE):
+        for key in list(context.user_data.keys()):
+            if flow.data_prefixes and key.startswith(flow.data_prefixes):
+                del context.user_data[key]
+
+    def _persist(self, user_id: int, context: ContextTypes.DEFAULT_TYPE, flow: Flow):
+        record = context.user_data.get(FLOW_KEY)
+        if record is None:
+            state_store.delete(STORE_NAMESPACE, str(user_id))
+            return
+        data = {k: v for k, v in context.user_data.items() if flow.data_prefixes and k.startswith(flow.data_prefixes)}
+        state_store.set(STORE_NAMESPACE, str(user_id), {"flow": record, "data": data})
+
+    def _finish(self, user_id: int, context: ContextTypes.DEFAULT_TYPE, flow: Flow):
+        self._clear_data(flow, context)
+        context.user_data[FLOW_KEY] = None
+        self._persist(user_id, context, flow)
+
+    def _enter(self, user_id: int, context: ContextTypes.DEFAULT_TYPE, flow: Flow, state):
+        if state == END:
+            metrics.increment(f"flow.{flow.name}.completed")
+            self._finish(user_id, context, flow)
+            return
+        previous = context.user_data.get(FLOW_KEY)
+        if not previous or previous["name"] != flow.name or previous["state"] != state:
+            metrics.increment(f"flow.{flow.name}.entered.{flow.step_name(state)}")
+        context.user_data[FLOW_KEY] = {"name": flow.name, "state": state, "since": time.time()}
+        self._persist(user_id, context, flow)
+
+    async def _run(self, flow: Flow, step: str, event: str, handler, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        started = time.perf_counter()
+        try:
+            with span(handler_name(handler)):
+                next_state = await handler(update, context)
+        finally:
+            metrics.observe(f"flow.{flow.name}.{step}.{event}", time.perf_counter() - started)
+        if next_state is None:
+            # Handlers that keep the user on the current step may return nothing
+            record = context.user_data.get(FLOW_KEY)
+            next_state = record["state"] if record else END
+        self._enter(update.effective_user.id, context, flow, next_state)
+
+    async def start(self, name: str, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Starts a flow from its entry handler, abandoning any flow already in progress."""
+        flow = self._flows[name]
+        self.abandon(update, context)
+        self._clear_data(flow, context)
+        await self._run(flow, "start", "entry", flow.entry, update, context)
+
+    def entry(self, name: str):
+        """Returns a handler callback that starts the named flow (for commands and buttons)."""
+        async def start_flow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+            await self.start(name, update, context)
+        start_flow.__qualname__ = f"FlowEngine.entry({name!r})"
+        return start_flow
+
+    def abandon(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ends the active flow without replying, e.g. when the user leaves it through the menu."""
+        record = self.active(update, context)
+        if not record:
+            return
+        flow = self._flows[record["name"]]
+        metrics.increment(f"flow.{flow.name}.abandoned.{flow.step_name(record['state'])}")
+        self._finish(update.effective_user.id, context, flow)
+
+    async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """/cancel: runs the active flow's cancel handler and ends the flow."""
+        record = self.active(update, context)
+        if not record:
+            return
+        flow = self._flows[record["name"]]
+        metrics.increment(f"flow.{flow.name}.cancelled.{flow.step_name(record['state'])}")
+        if flow.cancel:
+            await flow.cancel(update, context)
+        self._finish(update.effective_user.id, context, flow)
+
+    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Router callback for every action that belongs to a flow step."""
+        query = update.callback_query
+        action, _ = decode_callback(query.data)
+        record = self.active(update, context)
+        flow = self._flows[record["name"]] if record else None
+        handler = flow.handler_for(record["state"], action) if flow else None
+        if handler is None:
+            # A button left over from a finished flow or an earlier step
+            metrics.increment("flow.stale_callbacks")
+            logger.info("Stale flow callback %s from user %s (active: %s)", query.data, query.from_user.id, record)
+            from utils.firebase_client import get_user_language
+            await query.answer(get_text("flow_step_expired", get_user_language(query.from_user.id)))
+            return
+        await self._run(flow, flow.step_name(record["state"]), action, handler, update, context)
+
+    async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        """Feeds a text message to the active flow; returns False if the current step takes no text."""
+        record = self.active(update, context)
+        if not record:
+            return False
+        flow = self._flows[record["name"]]
+        handler = flow.handler_for(record["state"], TEXT)
+        if handler is None:
+            return False
+        await self._run(flow, flow.step_name(record["state"]), TEXT, handler, update, context)
+        return True
+
+    def funnel(self, name: str) -> list:
+        """
+        Returns per-step entry counts and drop-off for a flow.
+
+        Each item is (step, entered, drop_off), where drop_off is the share of
+        entries that did not reach the next step (or completion, for the last).
+        """
+        flow = self._flows[name]
+        steps = [step for step, _ in flow.states.values()]
+        counts = [metrics.get_counter(f"flow.{name}.entered.{step}") for step in steps]
+        counts.append(metrics.get_counter(f"flow.{name}.completed"))
+        report = []
+        for i, step in enumerate(steps):
+            entered, reached = counts[i], counts[i + 1]
+            drop_off = max(0.0, 1 - reached / entered) if entered else 0.0
+            report.append((step, entered, drop_off))
+        return report
+
+    def format_funnels(self) -> str:
+        lines = []
+        for name in self._flows:
+            lines.append(f"{name}:")
+            for step, entered, drop_off in self.funnel(name):
+                lines.append(f"  {step}: entered={entered} drop_off={drop_off:.0%}")
+        return "\n".join(lines)
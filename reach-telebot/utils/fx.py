@@ -0,0 +1,155 @@
+# utils/fx.py
+"""
+Currency conversion from a local, versioned FX rate table.
+
+The table lives at FX_RATES_PATH as JSON:
+
+    {"version": "2026-10-01", "base": "USD",
+     "rates": {"2026-09-01": {"SGD": 1.35, "INR": 83.2},
+               "2026-10-01": {"SGD": 1.34, "INR": 83.5}}}
+
+Rates are units of each currency per one unit of the base currency. An
+expense dated D uses the latest rate on or before D (or the earliest rate,
+for expenses older than the table). Without a "version" the version is a
+hash of the file. `python fx_rates.py import FILE` validates and installs a
+new table; running processes pick it up within FX_CHECK_SECONDS.
+
+Expenses are normalized to HOME_CURRENCY when they are saved, so totals add
+up stored home amounts instead of converting at render time. Expenses
+without a currency are taken to be in the home currency. Conversion factors
+are memoized per (currency, date) on each table version.
+"""
+import bisect
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date
+from config import HOME_CURRENCY, FX_RATES_PATH
+from utils import metrics
+from utils.models import Expense, from_minor, to_minor
+
+logger = logging.getLogger(__name__)
+
+FX_CHECK_SECONDS = 60
+
+class RateTable:
+    def __init__(self, base: str, rates: dict, version: str):
+        self.base = base.upper()
+        self.version = version
+        self.dates = sorted(rates)
+        self.rates = {day: {code.upper(): float(rate) for code, rate in rates[day].items()} for day in self.dates}
+        self._factors = {}  # (currency, day, home) -> factor; lives as long as this version
+
+    @classmethod
+    def parse(cls, text: str):
+        """Builds a table from the JSON text of a rate file; raises ValueError on bad input."""
+        data = json.loads(text)
+        if not isinstance(data, dict) or not isinstance(data.get("rates"), dict) or not data.get("base"):
+            raise ValueError("An FX rate file needs a base currency and a rates object")
+        for day, rates in data["rates"].items():
+            date.fromisoformat(day)
+            if not isinstance(rates, dict) or any(not isinstance(r, (int, float)) or r <= 0 for r in rates.values()):
+                raise ValueError(f"Rates for {day} must map currency codes to positive numbers")
+        version = str(data.get("version") or hashlib.sha256(text.encode("utf-8")).hexdigest()[:12])
+        return cls(data["base"], data["rates"], version)
+
+    def rate(self, currency: str, day: str) -> float:
+        """Units of currency per base unit on an ISO date, or None if the table does not know it."""
+        if currency == self.base:
+            return 1.0
+        index = bisect.bisect_right(self.dates, day)
+        # Latest rate on or before the day, then the earliest one after it
+        for candidate in list(reversed(self.dates[:index])) + self.dates[index:]:
+            rate = self.rates[candidate].get(currency)
+            if rate is not None:
+                return rate
+        return None
+
+    def factor(self, currency: str, day: str, home: str) -> float:
+        """Multiplier from currency to home amounts on an ISO date, or None without rates; memoized."""
+        key = (currency, day, home)
+        if key not in self._factors:
+            source_rate, home_rate = self.rate(currency, day), self.rate(home, day)
+            self._factors[key] = home_rate / source_rate if source_rate and home_rate else None
+        return self._factors[key]
+
+_EMPTY = RateTable(HOME_CURRENCY, {}, "none")
+_table = _EMPTY
+_signature = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def _file_signature():
+    try:
+        stat = os.stat(FX_RATES_PATH)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+def table() -> RateTable:
+    """The current rate table, reloaded when the file has changed (checked every FX_CHECK_SECONDS)."""
+    global _table, _signature, _checked_at
+    if time.monotonic() - _checked_at < FX_CHECK_SECONDS:
+        return _table
+    with _lock:
+        _checked_at = time.monotonic()
+        signature = _file_signature()
+        if signature == _signature:
+            return _table
+        _signature = signature
+        if signature is None:
+            logger.warning("No FX rate table at %s; only %s amounts can be totalled", FX_RATES_PATH, HOME_CURRENCY)
+            _table = _EMPTY
+            return _table
+        try:
+            with open(FX_RATES_PATH, 'r', encoding='utf-8') as f:
+                _table = RateTable.parse(f.read())
+            logger.info("Loaded FX rates version %s (%s dates)", _table.version, len(_table.dates))
+        except (OSError, ValueError) as e:
+            # Keep converting with the previous table rather than failing every expense
+            logger.error("Could not load FX rates from %s: %s", FX_RATES_PATH, e)
+        return _table
+
+def import_rates(source_path: str) -> RateTable:
+    """Validates a rate file and installs it as the current table; raises ValueError on bad input."""
+    global _checked_at
+    with open(source_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    rates = RateTable.parse(text)
+    os.makedirs(os.path.dirname(FX_RATES_PATH) or ".", exist_ok=True)
+    tmp_path = f"{FX_RATES_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, FX_RATES_PATH)
+    _checked_at = 0.0
+    return rates
+
+def convert_minor(amount_minor: int, currency: str, on: date, home: str = HOME_CURRENCY) -> int:
+    """Converts minor units of currency on a date to minor units of home; None without a rate."""
+    currency = (currency or home).upper()
+    if currency == home:
+        return amount_minor
+    factor = table().factor(currency, on.isoformat(), home)
+    if factor is None:
+        metrics.increment("fx.missing_rate")
+        return None
+    return to_minor(from_minor(amount_minor, currency) * factor, home)
+
+def _expense_date(expense: Expense) -> date:
+    return expense.timestamp.astimezone().date() if expense.timestamp else date.today()
+
+def normalize(expense: Expense) -> Expense:
+    """Sets an expense's home amount, home currency and rate table version."""
+    expense.home_currency = HOME_CURRENCY
+    expense.home_amount_minor = convert_minor(expense.amount_minor, expense.currency, _expense_date(expense))
+    expense.fx_version = table().version
+    return expense
+
+def home_amount_minor(expense: Expense) -> int:
+    """An expense's amount in HOME_CURRENCY: the stored value, or a conversion for older expenses."""
+    if expense.home_amount_minor is not None and expense.home_currency == HOME_CURRENCY:
+        return expense.home_amount_minor
+    return convert_minor(expense.amount_minor, expense.currency, _expense_date(expense))
@@ -0,0 +1,216 @@
+# utils/llm_pipeline.py
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from openai import APIStatusError, BadRequestError
+
+logger = logging.getLogger(__name__)
+
+JSON_INSTRUCTION = "\nReturn your response as a valid JSON object."
+# 4xx statuses that still say the model is overloaded or slow rather than that the request was bad
+TRANSIENT_CLIENT_STATUSES = {408, 409, 429}
+
+class LLMUnavailableError(Exception):
+    """Raised when no model in the fallback chain produced a response."""
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures for one model and fails fast while it is down.
+
+    The breaker opens after `failure_threshold` consecutive failures. While open,
+    calls are rejected until `cooldown` seconds have passed; then a single trial
+    call is let through (half-open). A success closes the breaker again, a
+    failure re-opens it for another cooldown. Calls the model rejected as
+    invalid (see is_client_error) count as neither: they say nothing about
+    whether the model is up.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Returns True if a call may be attempted now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_client_error(self):
+        """Leaves the failure count alone; a half-open breaker lets the next trial call through."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit breaker opened after %s consecutive failures", self._failures)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+class LLMPipeline:
+    """
+    Shared call path for all OpenAI chat completions.
+
+    Each request walks a model fallback chain. For every model it applies the
+    model's timeout, skips it while its circuit breaker is open, optionally
+    hedges slow calls with a second identical request, and remembers whether
+    the model accepts `response_format={"type": "json_object"}` so that
+    unsupported models are not re-probed on every call.
+    """
+
+    def __init__(self, client, fallback_models: list = None, timeouts: dict = None,
+                 default_timeout: float = 30.0, hedge_delay: float = 0.0,
+                 breaker_failures: int = 5, breaker_cooldown: float = 30.0, max_workers: int = 16):
+        self._client = client
+        self.fallback_models = fallback_models or []
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.hedge_delay = hedge_delay
+        self._breaker_failures = breaker_failures
+        self._breaker_cooldown = breaker_cooldown
+        self._breakers = {}
+        self._json_support = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        """Returns the circuit breaker for a model, creating it on first use."""
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(self._breaker_failures, self._breaker_cooldown)
+            return self._breakers[model]
+
+    def supports_json_mode(self, model: str) -> bool:
+        """Returns whether a model is known (or assumed) to accept json_object output."""
+        return self._json_support.get(model, True)
+
+    def model_chain(self, model: str) -> list:
+        """Returns the requested model followed by its configured fallbacks."""
+        return [model] + [m for m in self.fallback_models if m != model]
+
+    def complete(self, model: str, messages: list, json_mode: bool = False) -> str:
+        """
+        Runs a chat completion through the fallback chain.
+
+        Args:
+            model: The preferred model
+            messages: The chat messages to send
+            json_mode: Whether the response must be a JSON object
+
+        Returns:
+            The content of the first successful response
+
+        Raises:
+            LLMUnavailableError: If every model failed or was short-circuited
+        """
+        errors = []
+        for candidate in self.model_chain(model):
+            breaker = self.breaker(candidate)
+            if not breaker.allow():
+                logger.warning("Skipping %s: circuit breaker is open", candidate)
+                errors.append(f"{candidate}: circuit open")
+                continue
+            try:
+                content = self._hedged_call(candidate, messages, json_mode)
+            except Exception as e:
+                if is_client_error(e):
+                    breaker.record_client_error()
+                else:
+                    breaker.record_failure()
+                logger.error("OpenAI call to %s failed: %s: %s", candidate, type(e).__name__, e)
+                errors.append(f"{candidate}: {type(e).__name__}")
+                continue
+            breaker.record_success()
+            return content
+        raise LLMUnavailableError("; ".join(errors) or "no models configured")
+
+    def _hedged_call(self, model: str, messages: list, json_mode: bool) -> str:
+        """Calls a model, issuing a second identical request if the first is slow."""
+        if self.hedge_delay <= 0:
+            return self._call(model, messages, json_mode)
+
+        primary = self._executor.submit(self._call, model, messages, json_mode)
+        done, _ = wait([primary], timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+
+        logger.info("Hedging slow request to %s after %ss", model, self.hedge_delay)
+        hedge = self._executor.submit(self._call, model, messages, json_mode)
+        pending = {primary, hedge}
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+        raise last_error
+
+    def _call(self, model: str, messages: list, json_mode: bool) -> str:
+        """Makes a single upstream call with the model's timeout and no SDK retries."""
+        client = self._client.with_options(
+            timeout=self.timeouts.get(model, self.default_timeout),
+            max_retries=0
+        )
+        if json_mode and self.supports_json_mode(model):
+            try:
+                response = client.chat.completions.create(
+                    model=model, messages=messages, response_format={"type": "json_object"}
+                )
+                return self._content(response)
+            except BadRequestError as e:
+                # Only a rejected response_format means the model lacks JSON mode;
+                # remember that so later calls go straight to the prompt-only variant
+                if "response_format" not in str(e):
+                    raise
+                logger.warning("Model %s does not support json_object output; disabling it", model)
+                self._json_support[model] = False
+
+        if json_mode:
+            messages = with_json_instruction(messages)
+        response = client.chat.completions.create(model=model, messages=messages)
+        return self._content(response)
+
+    @staticmethod
+    def _content(response) -> str:
+        if not response.choices:
+            raise ValueError("OpenAI response missing choices")
+        return (response.choices[0].message.content or "").strip()
+
+def is_client_error(error: Exception) -> bool:
+    """Whether an upstream error is a 4xx rejection of the request itself (bad input, context too long)."""
+    status = getattr(error, "status_code", None) if isinstance(error, APIStatusError) else None
+    return status is not None and 400 <= status < 500 and status not in TRANSIENT_CLIENT_STATUSES
+
+def with_json_instruction(messages: list) -> list:
+    """Returns a copy of messages asking for JSON in the system prompt."""
+    messages = [dict(m) for m in messages]
+    for message in messages:
+        if message.get("role") == "system":
+            message["content"] += JSON_INSTRUCTION
+            return messages
+    return [{"role": "system", "content": JSON_INSTRUCTION.strip()}] + messages
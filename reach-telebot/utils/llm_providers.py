@@ -0,0 +1,188 @@
+# utils/llm_providers.py
+"""
+LLM providers and per-task routing.
+
+Every LLM request names its task (TASKS: parse, suggest, advise). LLM_ROUTES
+lists the providers to try for each task, in order; a provider that is
+unavailable, busy past its timeout or failing hands the request to the next
+one. Providers:
+
+    openai - the OpenAI pipeline from utils/openai_client.py (fallback models,
+             circuit breakers, hedging)
+    local  - a quantized GGUF model run on the CPU by llama.cpp
+             (llama-cpp-python, optional; needs LOCAL_LLM_MODEL_PATH)
+
+Each provider has its own pool of LLM_PROVIDER_CONCURRENCY slots and an
+LLM_PROVIDER_TIMEOUTS budget covering the wait for a slot and, for the local
+model, the generation itself (OpenAI calls are bounded by
+OPENAI_MODEL_TIMEOUTS). The local provider keeps one llama.cpp instance per
+slot, since an instance cannot run two generations at once.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from config import (
+    LLM_ROUTES, LLM_PROVIDER_CONCURRENCY, LLM_PROVIDER_TIMEOUTS, LOCAL_LLM_MODEL_PATH, LOCAL_LLM_THREADS,
+    LOCAL_LLM_CONTEXT, LOCAL_LLM_MAX_TOKENS
+)
+from utils import metrics
+from utils.llm_pipeline import LLMUnavailableError, with_json_instruction
+from utils.profiling import span
+
+logger = logging.getLogger(__name__)
+
+TASKS = ("parse", "suggest", "advise")
+DEFAULT_CONCURRENCY = {"openai": 16, "local": 1}
+DEFAULT_TIMEOUTS = {"openai": 60.0, "local": 20.0}
+
+class ProviderBusyError(Exception):
+    """Raised when no slot of a provider freed up within its timeout."""
+
+class Provider:
+    """A named LLM backend with a fixed number of concurrent slots."""
+    name = ""
+
+    def __init__(self, concurrency: int = None, timeout: float = None):
+        self.concurrency = max(1, int(concurrency or LLM_PROVIDER_CONCURRENCY.get(self.name)
+                                      or DEFAULT_CONCURRENCY.get(self.name, 4)))
+        self.timeout = timeout or LLM_PROVIDER_TIMEOUTS.get(self.name) or DEFAULT_TIMEOUTS.get(self.name, 30.0)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    def available(self) -> bool:
+        return True
+
+    def complete(self, messages: list, json_mode: bool = False, model: str = None) -> str:
+        """Runs one chat completion in a free slot."""
+        deadline = time.monotonic() + self.timeout
+        if not self._slots.acquire(timeout=self.timeout):
+            raise ProviderBusyError(f"{self.name}: no free slot within {self.timeout:g}s")
+        try:
+            return self._complete(messages, json_mode, model, deadline)
+        finally:
+            self._slots.release()
+
+    def _complete(self, messages: list, json_mode: bool, model: str, deadline: float) -> str:
+        raise NotImplementedError
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def __init__(self, pipeline, default_model: str = "gpt-3.5-turbo", **kwargs):
+        super().__init__(**kwargs)
+        self._pipeline = pipeline
+        self.default_model = default_model
+
+    def _complete(self, messages: list, json_mode: bool, model: str, deadline: float) -> str:
+        return self._pipeline.complete(model or self.default_model, messages, json_mode=json_mode)
+
+class LlamaCppProvider(Provider):
+    name = "local"
+
+    def __init__(self, model_path: str = LOCAL_LLM_MODEL_PATH, threads: int = LOCAL_LLM_THREADS,
+                 context: int = LOCAL_LLM_CONTEXT, max_tokens: int = LOCAL_LLM_MAX_TOKENS, **kwargs):
+        super().__init__(**kwargs)
+        self.model_path = model_path
+        self.threads = threads or None
+        self.context = context
+        self.max_tokens = max_tokens
+        self._idle = queue.LifoQueue()  # Loaded llama.cpp instances not generating right now
+        self._unavailable_logged = False
+
+    def available(self) -> bool:
+        """Whether llama-cpp-python is installed and the model file exists."""
+        if not self.model_path or not os.path.exists(self.model_path):
+            return False
+        try:
+            import llama_cpp  # noqa: F401
+            return True
+        except ImportError:
+            if not self._unavailable_logged:
+                logger.warning("LOCAL_LLM_MODEL_PATH is set but llama-cpp-python is not installed")
+                self._unavailable_logged = True
+            return False
+
+    def _instance(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        from llama_cpp import Llama
+        with metrics.timer("llm.local.load"):
+            llm = Llama(model_path=self.model_path, n_ctx=self.context, n_threads=self.threads, verbose=False)
+        logger.info("Loaded local model %s", os.path.basename(self.model_path))
+        return llm
+
+    def _complete(self, messages: list, json_mode: bool, model: str, deadline: float) -> str:
+        llm = self._instance()
+        try:
+            if json_mode:
+                messages = with_json_instruction(messages)
+            # Streamed so a slow generation can be cut off at the deadline
+            chunks = llm.create_chat_completion(
+                messages=messages, max_tokens=self.max_tokens, temperature=0.2, stream=True,
+                response_format={"type": "json_object"} if json_mode else None
+            )
+            parts = []
+            for chunk in chunks:
+                parts.append(chunk["choices"][0]["delta"].get("content") or "")
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"local model took longer than {self.timeout:g}s")
+            return "".join(parts).strip()
+        finally:
+            self._idle.put(llm)
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+def register(provider: Provider):
+    """Makes a provider available to the routes under its name."""
+    with _providers_lock:
+        _providers[provider.name] = provider
+
+def get_provider(name: str) -> Provider:
+    """Returns a registered provider; the local provider is created on first use."""
+    with _providers_lock:
+        if name not in _providers and name == LlamaCppProvider.name:
+            _providers[name] = LlamaCppProvider()
+        return _providers.get(name)
+
+def route(task: str) -> list:
+    """The provider names to try for a task, in order."""
+    return LLM_ROUTES.get(task) or ["openai"]
+
+def complete(task: str, messages: list, json_mode: bool = False, model: str = None, providers: list = None) -> str:
+    """
+    Runs a chat completion for a task on the first provider of its route that answers.
+
+    Args:
+        task: One of TASKS
+        messages: The chat messages to send
+        json_mode: Whether the response must be a JSON object
+        model: Preferred OpenAI model; ignored by the local provider
+        providers: Provider names to use instead of the task's route
+
+    Raises:
+        LLMUnavailableError: If no provider on the route answered
+    """
+    errors = []
+    for name in providers or route(task):
+        provider = get_provider(name)
+        if provider is None or not provider.available():
+            errors.append(f"{name}: unavailable")
+            continue
+        started = time.perf_counter()
+        try:
+            with span(f"llm.{name}.{task}"):
+                content = provider.complete(messages, json_mode=json_mode, model=model)
+        except Exception as e:
+            metrics.increment(f"llm.{name}.failed")
+            logger.warning("LLM provider %s failed for %s: %s: %s", name, task, type(e).__name__, e)
+            errors.append(f"{name}: {type(e).__name__}")
+            continue
+        metrics.observe(f"llm.{name}.{task}", time.perf_counter() - started)
+        if errors:
+            metrics.increment("llm.route_fallbacks")
+        return content
+    raise LLMUnavailableError("; ".join(errors) or f"no providers routed for {task}")
@@ -1,54 +1,214 @@
 # utils/localization.py
+"""
+Translated UI text from locales/<lang>.json.
+
+The files are compiled into an immutable Catalog: every template is parsed
+once into a render callable (a generated f-string function for plain
+{name} and {name:spec} fields, str.format otherwise), so render_text does no
+parsing per message. At load, each translation is checked against the
+default language: a translation with invalid braces or placeholders the
+default language does not have would fail to render, so it is dropped and
+the default language's text is used instead; a translation that leaves out
+a placeholder is only reported. Keys missing from a language fall back to
+the default language.
+
+reload() compiles a new catalog and swaps it in with one assignment, so
+readers see either the old or the new catalog, never a mix. It runs in a
+worker thread, either from the LOCALE_RELOAD_SECONDS file watcher (see
+watch()) or from the admin /reload_locales command. A reload whose default
+language file cannot be read is rejected and the current catalog stays.
+"""
+import asyncio
 import json
+import keyword
 import os
 import logging
-from config import DEFAULT_LANGUAGE, SUPPORTED_LANGUAGES
+import string
+import threading
+from config import DEFAULT_LANGUAGE, SUPPORTED_LANGUAGES, LOCALE_RELOAD_SECONDS
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+LOCALES_DIR = os.path.join(os.path.dirname(__file__), '..', 'locales')
+
+_formatter = string.Formatter()
+
+class Template:
+    __slots__ = ("text", "fields", "render")
+
+    def __init__(self, text: str, fields: frozenset, render):
+        self.text = text
+        self.fields = fields
+        self.render = render
 
-_translations = {}
+def _is_simple(name: str, spec: str, conversion: str) -> bool:
+    """Whether a field can be inlined into a generated f-string."""
+    return (name.isidentifier() and not keyword.iskeyword(name)
+            and "{" not in spec and "}" not in spec and conversion in (None, "r", "s", "a"))
 
-def load_translations():
-    """Loads translation files from the locales directory."""
-    locales_dir = os.path.join(os.path.dirname(__file__), '..', 'locales')
-    logging.debug(f"Looking for locales in: {locales_dir}")
-    
+def compile_template(text: str) -> Template:
+    """Parses a template into a render callable; raises ValueError on invalid braces."""
+    parsed = list(_formatter.parse(text))
+    fields = frozenset(name for _, name, _, _ in parsed if name is not None)
+    if not fields:
+        constant = "".join(literal for literal, _, _, _ in parsed)
+        return Template(text, fields, lambda **_: constant)
+    if not all(name is None or _is_simple(name, spec, conversion) for _, name, spec, conversion in parsed):
+        return Template(text, fields, text.format)
+
+    body = ""
+    for literal, name, spec, conversion in parsed:
+        body += literal.replace("{", "{{").replace("}", "}}")
+        if name is not None:
+            body += "{" + name + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}"
+    source = f"lambda *, {', '.join(sorted(fields))}, **_: f{body!r}"
+    return Template(text, fields, eval(source, {"__builtins__": {}}))
+
+class Catalog:
+    """An immutable set of compiled templates, {lang: {key: Template}}."""
+
+    def __init__(self, templates: dict, signature: tuple, findings: list):
+        self.templates = templates
+        self.signature = signature
+        self.findings = findings
+
+    def lookup(self, key: str, lang_code: str):
+        template = self.templates.get(lang_code, {}).get(key)
+        if template is None and lang_code != DEFAULT_LANGUAGE:
+            template = self.templates.get(DEFAULT_LANGUAGE, {}).get(key)
+        return template
+
+def _path(lang_code: str) -> str:
+    return os.path.join(LOCALES_DIR, f"{lang_code}.json")
+
+def _signature() -> tuple:
+    """(mtime_ns, size) of each locale file, to notice edits."""
+    signature = []
     for lang_code in SUPPORTED_LANGUAGES:
-        filepath = os.path.join(locales_dir, f"{lang_code}.json")
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    _translations[lang_code] = json.load(f)
-                logging.info(f"Loaded translations for: {lang_code}")
-            except Exception as e:
-                logging.error(f"Error loading translation file {filepath}: {e}")
-        else:
-            logging.warning(f"Translation file not found for language '{lang_code}' at {filepath}")
-
-def get_text(key: str, lang_code: str = DEFAULT_LANGUAGE, return_keys: bool = False) -> str:
-    """Gets translated text for a given key and language code."""
-    # If translations haven't been loaded yet, load them
-    if not _translations:
-        load_translations()
-    
-    # Special case: If return_keys is True, return all available keys
-    if return_keys:
-        return _translations.get(lang_code, {}).keys()
-        
-    # Fallback to default language if the requested language is not available
-    lang_to_use = lang_code if lang_code in _translations else DEFAULT_LANGUAGE
-    
-    # If default language is also not available, return a placeholder
-    if lang_to_use not in _translations:
-        logging.error(f"No translations available for language: {lang_to_use}")
+        try:
+            stat = os.stat(_path(lang_code))
+            signature.append((lang_code, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((lang_code, None, None))
+    return tuple(signature)
+
+def _compile_language(lang_code: str, raw: dict, reference: dict, findings: list) -> dict:
+    templates = {}
+    for key, text in raw.items():
+        if not isinstance(text, str):
+            findings.append(f"{lang_code}.{key}: not a string; dropped")
+            continue
+        try:
+            template = compile_template(text)
+        except ValueError as e:
+            findings.append(f"{lang_code}.{key}: {e}; dropped")
+            continue
+        if reference is not None:
+            expected = reference.get(key)
+            if expected is None:
+                findings.append(f"{lang_code}.{key}: not in {DEFAULT_LANGUAGE}")
+            elif template.fields - expected.fields:
+                findings.append(f"{lang_code}.{key}: unknown placeholders "
+                                f"{', '.join(sorted(template.fields - expected.fields))}; dropped")
+                continue
+            elif expected.fields - template.fields:
+                findings.append(f"{lang_code}.{key}: missing placeholders "
+                                f"{', '.join(sorted(expected.fields - template.fields))}")
+        templates[key] = template
+    return templates
+
+def _read(lang_code: str) -> dict:
+    with open(_path(lang_code), 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise ValueError("expected a JSON object")
+    return raw
+
+def build_catalog() -> Catalog:
+    """Reads and compiles every locale file; raises if the default language cannot be read."""
+    signature = _signature()
+    findings = []
+    templates = {DEFAULT_LANGUAGE: _compile_language(DEFAULT_LANGUAGE, _read(DEFAULT_LANGUAGE), None, findings)}
+    for lang_code in SUPPORTED_LANGUAGES:
+        if lang_code == DEFAULT_LANGUAGE:
+            continue
+        try:
+            raw = _read(lang_code)
+        except FileNotFoundError:
+            logger.warning("Translation file not found for language '%s' at %s", lang_code, _path(lang_code))
+            continue
+        except (OSError, ValueError) as e:
+            findings.append(f"{lang_code}: {e}; using {DEFAULT_LANGUAGE}")
+            continue
+        templates[lang_code] = _compile_language(lang_code, raw, templates[DEFAULT_LANGUAGE], findings)
+    return Catalog(templates, signature, findings)
+
+_catalog = Catalog({}, (), [])
+_reload_lock = threading.Lock()
+
+def reload() -> tuple:
+    """
+    Compiles the locale files and swaps in the new catalog.
+
+    Blocking; call it from a worker thread. Returns (applied, findings).
+    """
+    global _catalog
+    with _reload_lock:
+        try:
+            catalog = build_catalog()
+        except (OSError, ValueError) as e:
+            logger.error("Locale reload rejected, keeping the current catalog: %s", e)
+            metrics.increment("locales.reload_rejected")
+            return False, [f"{DEFAULT_LANGUAGE}: {e}"]
+        _catalog = catalog
+    if catalog.findings:
+        logger.warning("Locale check found %s problems: %s", len(catalog.findings), "; ".join(catalog.findings))
+    metrics.increment("locales.reloads")
+    logger.info("Loaded translations for %s", ", ".join(catalog.templates))
+    return True, catalog.findings
+
+def reload_if_changed() -> bool:
+    """Reloads when a locale file changed since the current catalog was built."""
+    if _signature() == _catalog.signature:
+        return False
+    return reload()[0]
+
+async def _watch_job(context) -> None:
+    await asyncio.to_thread(reload_if_changed)
+
+def watch(application):
+    """Polls the locale files every LOCALE_RELOAD_SECONDS and reloads on change."""
+    if LOCALE_RELOAD_SECONDS <= 0:
+        return
+    if application.job_queue is None:
+        logger.warning("JobQueue unavailable; locale files are not watched")
+        return
+    application.job_queue.run_repeating(_watch_job, interval=LOCALE_RELOAD_SECONDS, first=LOCALE_RELOAD_SECONDS)
+
+def get_text(key: str, lang_code: str = DEFAULT_LANGUAGE) -> str:
+    """Gets translated text for a given key and language code, falling back to the default language."""
+    template = _catalog.lookup(key, lang_code)
+    if template is None:
+        logger.error("Missing translation key '%s' for language %s", key, lang_code)
         return f"[{key}]"
-    
-    # Check if the key exists
-    if key not in _translations.get(lang_to_use, {}):
-        logging.error(f"⚠️ MISSING TRANSLATION KEY: '{key}' for language: {lang_to_use}")
-        # Print available keys for debugging
-        logging.debug(f"Available keys: {list(_translations.get(lang_to_use, {}).keys())[:10]}...")
-        
-    # Return the translation or a placeholder if the key is missing
-    return _translations.get(lang_to_use, {}).get(key, f"[{key}]")
+    return template.text
+
+def render_text(key: str, lang_code: str = DEFAULT_LANGUAGE, **values) -> str:
+    """Gets translated text with its placeholders filled from values."""
+    template = _catalog.lookup(key, lang_code)
+    if template is None:
+        logger.error("Missing translation key '%s' for language %s", key, lang_code)
+        return f"[{key}]"
+    try:
+        return template.render(**values)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        logger.error("Could not render '%s' for language %s: %s", key, lang_code, e)
+        return template.text
+
+def has_text(key: str, lang_code: str = DEFAULT_LANGUAGE) -> bool:
+    """Whether get_text finds a translation for key."""
+    return _catalog.lookup(key, lang_code) is not None
 
 def get_language_name(lang_code: str) -> str:
     """Returns the display name of a language based on its code."""
@@ -60,4 +220,4 @@ def get_language_name(lang_code: str) -> str:
     return language_names.get(lang_code, lang_code)
 
 # Load translations when the module is imported
-load_translations()
\ No newline at end of file
+reload()
@@ -0,0 +1,152 @@
+# utils/memory_manager.py
+"""
+Bounded memory for per-user conversation state.
+
+python-telegram-bot keeps context.user_data for every user forever. This
+module tracks when each user was last seen and periodically evicts user_data:
+
+    - idle longer than USER_DATA_TTL_SECONDS
+    - least recently seen beyond USER_DATA_MAX_USERS
+    - least recently seen, a slice at a time, while RSS exceeds MEMORY_LIMIT_MB
+      (Linux only: elsewhere only the peak RSS is known, which never drops,
+      so memory-based eviction is skipped)
+
+Evicted user_data is offloaded to the state store and restored transparently
+on the user's next update, so a user who comes back mid-flow or with a
+pending prompt carries on where they left off. Offloaded entries older than
+USER_DATA_OFFLOAD_DAYS are purged.
+"""
+import logging
+import resource
+import sys
+import time
+from collections import OrderedDict
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+from config import (
+    USER_DATA_TTL_SECONDS, USER_DATA_MAX_USERS, MEMORY_LIMIT_MB,
+    USER_DATA_SWEEP_SECONDS, USER_DATA_OFFLOAD_DAYS
+)
+from utils import metrics, state_store
+
+logger = logging.getLogger(__name__)
+
+STORE_NAMESPACE = "user_data"
+# Users seen more recently than this are never evicted for LRU or memory pressure
+MIN_IDLE_SECONDS = 60
+# Share of tracked users evicted per sweep while over the memory limit
+RSS_EVICTION_FRACTION = 0.1
+
+def rss_mb() -> float:
+    """Returns this process's current resident set size in MB, or None where it is unavailable (not Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss_mb() -> float:
+    """Returns this process's peak resident set size in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class UserDataManager:
+    def __init__(self, application: Application):
+        self._application = application
+        self._last_seen = OrderedDict()  # user_id -> monotonic time, oldest first
+
+    def register(self):
+        """Hooks the manager into the application: activity tracking, sweeps and gauges."""
+        # Group -1 runs before every other handler, so user_data is restored before it is read
+        self._application.add_handler(TypeHandler(Update, self.touch), group=-1)
+        job_queue = self._application.job_queue
+        if job_queue is None:
+            logger.warning("JobQueue unavailable; user_data eviction is disabled")
+        else:
+            job_queue.run_repeating(self.sweep, interval=USER_DATA_SWEEP_SECONDS, first=USER_DATA_SWEEP_SECONDS)
+            job_queue.run_repeating(self.purge_offloaded, interval=24 * 3600, first=3600)
+        if rss_mb() is None:
+            if MEMORY_LIMIT_MB:
+                logger.warning("Current RSS unavailable on this platform; MEMORY_LIMIT_MB is not enforced")
+        else:
+            metrics.register_gauge("memory.rss_mb", lambda: round(rss_mb(), 1))
+        metrics.register_gauge("memory.peak_rss_mb", lambda: round(peak_rss_mb(), 1))
+        metrics.register_gauge("memory.user_data_users", lambda: len(self._application.user_data))
+        metrics.register_gauge("memory.tracked_users", lambda: len(self._last_seen))
+
+    async def touch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user = update.effective_user
+        if user is None:
+            return
+        if user.id not in self._last_seen:
+            self._restore(user.id, context)
+        self._last_seen[user.id] = time.monotonic()
+        self._last_seen.move_to_end(user.id)
+
+    def _restore(self, user_id: int, context: ContextTypes.DEFAULT_TYPE):
+        offloaded = state_store.get(STORE_NAMESPACE, str(user_id))
+        if offloaded is None:
+            return
+        state_store.delete(STORE_NAMESPACE, str(user_id))
+        # Keys written since (e.g. by another handler group) win over the offloaded copy
+        for key, value in offloaded["data"].items():
+            context.user_data.setdefault(key, value)
+        metrics.increment("memory.restored")
+        logger.debug("Restored user_data for user %s", user_id)
+
+    def evict(self, user_id: int, reason: str):
+        """Offloads a user's user_data to the state store and drops it from memory."""
+        self._last_seen.pop(user_id, None)
+        data = self._application.user_data.get(user_id)
+        if data:
+            state_store.set(STORE_NAMESPACE, str(user_id), {"saved_at": time.time(), "data": dict(data)})
+        if user_id in self._application.user_data:
+            self._application.drop_user_data(user_id)
+        metrics.increment(f"memory.evicted.{reason}")
+
+    def _evict_oldest(self, reason: str, limit: int, now: float) -> int:
+        evicted = 0
+        while evicted < limit and self._last_seen:
+            user_id, last_seen = next(iter(self._last_seen.items()))
+            if now - last_seen < MIN_IDLE_SECONDS:
+                break
+            self.evict(user_id, reason)
+            evicted += 1
+        return evicted
+
+    async def sweep(self, context: ContextTypes.DEFAULT_TYPE = None) -> None:
+        """Evicts idle users, then enforces the user count and memory limits."""
+        started = time.perf_counter()
+        now = time.monotonic()
+        ttl_evicted = 0
+        while self._last_seen:
+            user_id, last_seen = next(iter(self._last_seen.items()))
+            if now - last_seen < USER_DATA_TTL_SECONDS:
+                break
+            self.evict(user_id, "ttl")
+            ttl_evicted += 1
+
+        lru_evicted = self._evict_oldest("lru", max(0, len(self._last_seen) - USER_DATA_MAX_USERS), now)
+
+        rss_evicted = 0
+        rss = rss_mb() if MEMORY_LIMIT_MB else None
+        if rss is not None and rss > MEMORY_LIMIT_MB:
+            limit = max(1, int(len(self._last_seen) * RSS_EVICTION_FRACTION))
+            rss_evicted = self._evict_oldest("rss", limit, now)
+            logger.warning("RSS %.0fMB over the %sMB limit; evicted %s users", rss, MEMORY_LIMIT_MB, rss_evicted)
+
+        metrics.observe("memory.sweep", time.perf_counter() - started)
+        if ttl_evicted or lru_evicted or rss_evicted:
+            logger.info("Evicted user_data: %s idle, %s over limit, %s for memory; %s users in memory",
+                        ttl_evicted, lru_evicted, rss_evicted, len(self._last_seen))
+
+    async def purge_offloaded(self, context: ContextTypes.DEFAULT_TYPE = None) -> None:
+        """Deletes offloaded user_data nobody came back for."""
+        cutoff = time.time() - USER_DATA_OFFLOAD_DAYS * 86400
+        stale = [key for key, value in state_store.items(STORE_NAMESPACE) if value.get("saved_at", 0) < cutoff]
+        for key in stale:
+            state_store.delete(STORE_NAMESPACE, key)
+        if stale:
+            logger.info("Purged %s offloaded user_data entries", len(stale))
@@ -0,0 +1,116 @@
+# utils/metrics.py
+"""
+In-process counters, timings and gauges.
+
+Cheap enough to call on every update. Timings keep count/total/max plus a
+bounded window of recent samples for percentiles. Gauges are either set
+directly or computed on demand by a registered callable. Admins can read a
+snapshot with /metrics.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+TIMING_WINDOW = 1024
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = {}
+_gauges = {}
+_gauge_callbacks = {}
+
+class _Timing:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=TIMING_WINDOW)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def pct(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "max": self.max,
+        }
+
+def increment(name: str, value: int = 1):
+    with _lock:
+        _counters[name] += value
+
+def observe(name: str, seconds: float):
+    """Records one duration sample."""
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = _Timing()
+        timing.add(seconds)
+
+@contextmanager
+def timer(name: str):
+    """Times the enclosed block into `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+def register_gauge(name: str, fn):
+    """Registers a callable evaluated whenever a snapshot is taken."""
+    with _lock:
+        _gauge_callbacks[name] = fn
+
+def get_counter(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+def snapshot() -> dict:
+    """Returns a point-in-time copy of all metrics."""
+    with _lock:
+        counters = dict(_counters)
+        timings = {name: timing.summary() for name, timing in _timings.items()}
+        gauges = dict(_gauges)
+        callbacks = dict(_gauge_callbacks)
+    for name, fn in callbacks.items():
+        try:
+            gauges[name] = fn()
+        except Exception:
+            gauges[name] = None
+    return {"counters": counters, "timings": timings, "gauges": gauges}
+
+def format_snapshot(data: dict = None, prefix: str = "") -> str:
+    """Formats a snapshot as plain text, optionally limited to names starting with prefix."""
+    data = data or snapshot()
+    lines = []
+    for name, value in sorted(data["counters"].items()):
+        if name.startswith(prefix):
+            lines.append(f"{name} = {value}")
+    for name, value in sorted(data["gauges"].items()):
+        if name.startswith(prefix):
+            lines.append(f"{name} = {value}")
+    for name, s in sorted(data["timings"].items()):
+        if name.startswith(prefix):
+            lines.append(
+                f"{name}: n={s['count']} avg={s['avg'] * 1000:.0f}ms "
+                f"p50={s['p50'] * 1000:.0f}ms p95={s['p95'] * 1000:.0f}ms max={s['max'] * 1000:.0f}ms"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+# utils/models.py
+"""
+Typed, slotted models for the data stored in each user's Firestore document.
+
+Amounts are kept as integer minor units (cents) and timestamps as timezone-aware
+datetimes. The from_firestore codecs also accept the legacy layout written by
+earlier versions (float `amount`, "%Y-%m-%d %H:%M:%S" timestamp strings), so
+old documents keep working and are upgraded the next time they are written.
+
+Expenses keep their original currency and amount alongside the amount
+converted to the home currency when they were saved (see utils/fx.py).
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+LEGACY_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+LEGACY_DATE_FORMAT = "%Y-%m-%d"
+
+# Currencies without a minor unit; everything else uses two decimals
+ZERO_DECIMAL_CURRENCIES = {"JPY", "KRW", "VND", "IDR", "CLP", "ISK", "UGX", "XAF", "XOF"}
+
+def minor_unit_factor(currency: str = "") -> int:
+    return 1 if (currency or "").upper() in ZERO_DECIMAL_CURRENCIES else 100
+
+def to_minor(amount, currency: str = "") -> int:
+    """Converts a major-unit amount (number or numeric string) to integer minor units."""
+    try:
+        return int(round(float(amount) * minor_unit_factor(currency)))
+    except (TypeError, ValueError):
+        return 0
+
+def from_minor(amount_minor: int, currency: str = "") -> float:
+    return amount_minor / minor_unit_factor(currency)
+
+def format_amount(amount_minor: int, currency: str = "") -> str:
+    """Formats minor units for display, e.g. 1250 -> '12.50'."""
+    factor = minor_unit_factor(currency)
+    if factor == 1:
+        return str(amount_minor)
+    return f"{amount_minor / factor:.2f}"
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _to_datetime(value, legacy_format: str = LEGACY_TIMESTAMP_FORMAT) -> datetime:
+    """Decodes a Firestore timestamp or a legacy local-time string into an aware datetime."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.astimezone()
+    try:
+        # Legacy strings were written with datetime.now(), i.e. server local time
+        return datetime.strptime(value, legacy_format).astimezone()
+    except (TypeError, ValueError):
+        return None
+
+@dataclass(slots=True)
+class UserProfile:
+    """Onboarding answers; each field holds the selected option number as a string."""
+    income: str = None
+    goal: str = None
+    debt: str = None
+    family: str = None
+
+    @classmethod
+    def from_firestore(cls, data: dict):
+        if not data:
+            return None
+        return cls(data.get('income'), data.get('goal'), data.get('debt'), data.get('family'))
+
+    def to_firestore(self) -> dict:
+        return {k: v for k, v in (('income', self.income), ('goal', self.goal),
+                                  ('debt', self.debt), ('family', self.family)) if v is not None}
+
+@dataclass(slots=True)
+class Goal:
+    type: str
+    amount_minor: int
+    deadline: datetime
+    steps: str = ""
+    created_at: datetime = None
+    progress_minor: int = 0
+    completed: bool = False
+
+    @property
+    def progress_percentage(self) -> float:
+        return (self.progress_minor / self.amount_minor * 100) if self.amount_minor > 0 else 0
+
+    @classmethod
+    def from_firestore(cls, data: dict):
+        if 'amount_minor' in data:
+            amount_minor = data['amount_minor']
+            progress_minor = data.get('progress_minor', 0)
+        else:
+            amount_minor = to_minor(data.get('amount', 0))
+            progress_minor = to_minor(data.get('progress', 0))
+        return cls(
+            type=data.get('type'),
+            amount_minor=amount_minor,
+            deadline=_to_datetime(data.get('deadline'), LEGACY_DATE_FORMAT),
+            steps=data.get('steps') or "",
+            created_at=_to_datetime(data.get('created_at'), LEGACY_DATE_FORMAT),
+            progress_minor=progress_minor,
+            completed=data.get('completed', False)
+        )
+
+    def to_firestore(self) -> dict:
+        return {
+            'type': self.type,
+            'amount_minor': self.amount_minor,
+            'deadline': self.deadline,
+            'steps': self.steps,
+            'created_at': self.created_at,
+            'progress_minor': self.progress_minor,
+            'completed': self.completed
+        }
+
+@dataclass(slots=True)
+class Expense:
+    amount_minor: int
+    currency: str = ""
+    category: str = "Other"
+    description: str = ""
+    timestamp: datetime = None
+    category_source: str = ""  # "llm" or "model" (utils/category_model.py); empty for older expenses
+    category_id: int = None  # Canonical category (utils/categories.py); None for older expenses
+    # Normalized by utils/fx.py; home_amount_minor is None if no rate was known
+    home_amount_minor: int = None
+    home_currency: str = ""
+    fx_version: str = ""
+
+    @property
+    def amount(self) -> float:
+        return from_minor(self.amount_minor, self.currency)
+
+    @property
+    def display_amount(self) -> str:
+        return format_amount(self.amount_minor, self.currency)
+
+    @classmethod
+    def from_parsed(cls, parsed: dict, timestamp: datetime = None):
+        """Builds an expense from parse_expense output."""
+        currency = parsed.get('currency') or ""
+        return cls(
+            amount_minor=to_minor(parsed.get('amount', 0), currency),
+            currency=currency,
+            category=parsed.get('category') or "Other",
+            description=parsed.get('description') or "",
+            timestamp=timestamp or utc_now(),
+            category_source=parsed.get('category_source') or "llm"
+        )
+
+    @classmethod
+    def from_firestore(cls, data: dict):
+        currency = data.get('currency') or ""
+        if 'amount_minor' in data:
+            amount_minor = data['amount_minor']
+        else:
+            amount_minor = to_minor(data.get('amount', 0), currency)
+        return cls(
+            amount_minor=amount_minor,
+            currency=currency,
+            category=data.get('category') or "Other",
+            description=data.get('description') or "",
+            timestamp=_to_datetime(data.get('timestamp')),
+            category_source=data.get('category_source') or "",
+            category_id=data.get('category_id'),
+            home_amount_minor=data.get('home_amount_minor'),
+            home_currency=data.get('home_currency') or "",
+            fx_version=data.get('fx_version') or ""
+        )
+
+    def to_firestore(self) -> dict:
+        data = {
+            'amount_minor': self.amount_minor,
+            'currency': self.currency,
+            'category': self.category,
+            'description': self.description,
+            'timestamp': self.timestamp
+        }
+        if self.category_source:
+            data['category_source'] = self.category_source
+        if self.category_id is not None:
+            data['category_id'] = self.category_id
+        if self.home_amount_minor is not None:
+            data.update(home_amount_minor=self.home_amount_minor, home_currency=self.home_currency,
+                        fx_version=self.fx_version)
+        return data
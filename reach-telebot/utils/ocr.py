@@ -0,0 +1,144 @@
+# utils/ocr.py
+"""
+Receipt OCR with Tesseract (pytesseract and Pillow, both optional).
+
+Decoding and OCR are CPU-bound, so they run in a process pool of
+OCR_WORKERS processes off the event loop. Images are downscaled before OCR;
+Pillow's decompression-bomb guard rejects absurdly large images.
+
+parse_receipt() pulls the total, currency and merchant out of the OCR text
+with simple heuristics: the merchant is the first line with several letters,
+and the total is the largest amount on a line that looks like a total
+("TOTAL", "GRAND TOTAL", "AMOUNT DUE", ...), or else the largest amount on
+the receipt.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from config import OCR_WORKERS, OCR_LANGUAGES
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_OCR_SIDE = 2000  # Pixels; larger images are downscaled before OCR
+MAX_IMAGE_PIXELS = 40_000_000
+
+_AMOUNT = re.compile(r"(?<![\d.,])(\d{1,3}(?:[,\s]\d{3})+|\d+)(?:[.,](\d{2}))?(?![\d%])")
+_TOTAL_LINE = re.compile(r"\b(grand\s*total|total|amount\s*due|balance\s*due|net\s*amount|to\s*pay)\b", re.I)
+_SUBTOTAL_LINE = re.compile(r"\b(sub\s*-?\s*total|tax|gst|vat|change|cash|tendered|discount|saving)\b", re.I)
+# Checked in order, so S$ wins over $
+_CURRENCY_MARKERS = (
+    ("SGD", re.compile(r"S\$|\bSGD\b")), ("MYR", re.compile(r"\bRM\b|\bMYR\b")),
+    ("INR", re.compile(r"₹|\bRs\.?\s|\bINR\b")), ("BDT", re.compile(r"৳|\bTk\.?\s|\bBDT\b")),
+    ("LKR", re.compile(r"\bLKR\b")), ("USD", re.compile(r"US\$|\bUSD\b|\$")),
+)
+
+@dataclass(slots=True)
+class Receipt:
+    total: float = None
+    currency: str = ""
+    merchant: str = ""
+
+    def as_expense_text(self) -> str:
+        """The receipt as a line for parse_expense, e.g. '12.50 SGD at FairPrice'."""
+        parts = [f"{self.total:.2f}"]
+        if self.currency:
+            parts.append(self.currency)
+        if self.merchant:
+            parts.append(f"at {self.merchant}")
+        return " ".join(parts)
+
+def _amounts(line: str) -> list:
+    values = []
+    for whole, cents in _AMOUNT.findall(line):
+        try:
+            values.append(float(re.sub(r"[,\s]", "", whole) + (f".{cents}" if cents else "")))
+        except ValueError:
+            continue
+    return values
+
+def parse_receipt(text: str) -> Receipt:
+    """Extracts the total, currency and merchant from OCR text; total is None if none was found."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    receipt = Receipt()
+    for line in lines[:5]:
+        if sum(c.isalpha() for c in line) >= 3 and not _amounts(line):
+            receipt.merchant = re.sub(r"\s+", " ", line)[:60]
+            break
+
+    totals = [amount for line in lines if _TOTAL_LINE.search(line) and not _SUBTOTAL_LINE.search(line)
+              for amount in _amounts(line)]
+    if not totals:
+        # No line looks like a total: take the largest amount with cents, which avoids dates and phone numbers
+        totals = [amount for line in lines for amount in _amounts(line) if amount != int(amount)]
+    if totals:
+        receipt.total = max(totals)
+
+    for currency, marker in _CURRENCY_MARKERS:
+        if marker.search(text):
+            receipt.currency = currency
+            break
+    return receipt
+
+def available() -> bool:
+    """Whether pytesseract and Pillow can be imported (the tesseract binary is checked on first use)."""
+    try:
+        import pytesseract  # noqa: F401
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _ocr(image: bytes, languages: str) -> str:
+    """Runs in a pool process: decodes, normalizes and OCRs an image."""
+    from PIL import Image, ImageOps
+    import pytesseract
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    with Image.open(io.BytesIO(image)) as img:
+        img = ImageOps.exif_transpose(img).convert("L")
+        img.thumbnail((MAX_OCR_SIDE, MAX_OCR_SIDE))
+        return pytesseract.image_to_string(img, lang=languages)
+
+_pool = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and worker threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _reset_pool(broken: ProcessPoolExecutor):
+    """Drops a pool whose worker died (OOM, a native crash); the next _get_pool() starts a fresh one."""
+    global _pool
+    if _pool is broken:
+        _pool = None
+        metrics.increment("ocr.pool_restarts")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+async def _run_in_pool(fn, *args):
+    """Runs fn in the pool, retrying once in a fresh pool if the current one is broken."""
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            return await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            if attempt:
+                raise
+            logger.warning("OCR process pool broken; retrying in a new pool")
+
+async def read_receipt(image: bytes) -> Receipt:
+    """OCRs a receipt image in the process pool and parses it."""
+    with metrics.timer("ocr.receipt"):
+        text = await _run_in_pool(_ocr, image, OCR_LANGUAGES)
+    receipt = parse_receipt(text)
+    metrics.increment("ocr.total_found" if receipt.total is not None else "ocr.total_missing")
+    logger.debug("Receipt OCR: %s characters, total %s %s", len(text), receipt.total, receipt.currency)
+    return receipt
@@ -1,201 +1,280 @@
 # utils/openai_client.py
 from openai import OpenAI
-from config import OPENAI_API_KEY
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_FALLBACK_MODELS, OPENAI_MODEL_TIMEOUTS, OPENAI_DEFAULT_TIMEOUT,
+    OPENAI_HEDGE_DELAY, OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_COOLDOWN
+)
+from utils import llm_providers, metrics, structured_output
+from utils.llm_pipeline import LLMPipeline, LLMUnavailableError
+from concurrent.futures import Future
+import hashlib
+import json
 import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 _client = None
+_pipeline = None
+
+# Requests currently waiting on an LLM, keyed by a hash of task, model, messages and response format
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+JSON_OBJECT = {"type": "json_object"}
+ADVICE_ERROR_MESSAGE = "Sorry, I encountered an error while generating advice."
 
 def initialize_openai():
-    """Initializes the OpenAI client."""
-    global _client
+    """Initializes the OpenAI client and the shared call pipeline, and registers it as the openai provider."""
+    global _client, _pipeline
     if _client is None:
         try:
             # Initialize with only the required parameters to avoid proxies error
-            _client = OpenAI(api_key=OPENAI_API_KEY)
-            logging.info("OpenAI client initialized successfully.")
+            _client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+            _pipeline = LLMPipeline(
+                _client,
+                fallback_models=OPENAI_FALLBACK_MODELS,
+                timeouts=OPENAI_MODEL_TIMEOUTS,
+                default_timeout=OPENAI_DEFAULT_TIMEOUT,
+                hedge_delay=OPENAI_HEDGE_DELAY,
+                breaker_failures=OPENAI_BREAKER_FAILURES,
+                breaker_cooldown=OPENAI_BREAKER_COOLDOWN
+            )
+            llm_providers.register(llm_providers.OpenAIProvider(_pipeline))
+            logger.info("OpenAI client initialized successfully.")
         except Exception as e:
-            logging.error(f"Failed to initialize OpenAI client: {e}", exc_info=True)
-            logging.warning("Continuing without OpenAI for development")
+            logger.error("Failed to initialize OpenAI client: %s", e, exc_info=True)
+            logger.warning("Continuing without OpenAI for development")
             # We'll continue without raising an exception
 
+def _ensure_client():
+    """Initializes the client on demand; without it the openai provider is simply unavailable."""
+    if not _client:
+        initialize_openai()
+        if not _client:
+            logger.error("OpenAI client initialization failed")
+
+def _request_key(task: str, model: str, messages: list, response_format: dict = None) -> str:
+    """Builds a stable key identifying a chat completion request."""
+    payload = json.dumps([task, model, messages, response_format], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _create_completion(task: str, model: str, messages: list, response_format: dict = None) -> str:
+    """
+    Creates a chat completion on the task's provider route, coalescing identical concurrent requests.
+
+    The first caller for a given (task, model, messages, response_format) makes
+    the call; callers arriving while it is in flight wait for and share the
+    same result (or exception) instead of issuing their own request.
+
+    Args:
+        task: The llm_providers task (parse, suggest or advise) that picks the providers
+        model: The preferred OpenAI model; configured fallbacks are tried after it
+        messages: The chat messages to send
+        response_format: Optional response format, e.g. {"type": "json_object"}
+
+    Returns:
+        The response content
+
+    Raises:
+        LLMUnavailableError: If no provider on the route answered
+    """
+    key = _request_key(task, model, messages, response_format)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not is_leader:
+        logger.info("Joining in-flight LLM request %s", key[:12])
+        return future.result()
+
+    try:
+        content = llm_providers.complete(task, messages, json_mode=response_format == JSON_OBJECT, model=model)
+        future.set_result(content)
+        return content
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+def build_goal_suggestion_messages(income: str, family_needs: str, current_situation: str, lang_code: str = "en") -> list:
+    """Builds the chat messages for a behavioral goal suggestion request."""
+    # Create a detailed system prompt using behavioral science principles
+    system_prompt = "You are a financial goal advisor for migrant workers in Singapore using behavioral science principles (specifically the COM-B model: Capability, Opportunity, Motivation -> Behavior).\n\n" + \
+    "Create contextual, meaningful financial goal suggestions based on the user's income level and family needs.\n\n" + \
+    "Use these behavioral science principles:\n" + \
+    "1. Make goals concrete and specific (rather than abstract)\n" + \
+    "2. Connect goals to family values and relationships\n" + \
+    "3. Focus on small wins and manageable steps\n" + \
+    "4. Create psychological ownership over goals\n" + \
+    "5. Reduce mental effort required for decision making\n\n" + \
+    f"Based on the provided income and family information, generate 3-4 contextual financial goals in {lang_code} language that would be most appropriate.\n\n" + \
+    "IMPORTANT: Return ONLY a JSON array with objects containing:\n" + \
+    "- \"goal\": Short goal name (3-5 words)\n" + \
+    "- \"description\": Brief description of the goal (10-15 words)\n" + \
+    "- \"rationale\": Why this goal matters using behavioral science (10-15 words)\n\n" + \
+    "The goals should be specific to the migrant worker context and address both short-term needs and long-term aspirations."
+
+    # Create a user prompt with the specific information
+    user_prompt = f"Income: {income}\nFamily needs: {family_needs}\nCurrent situation: {current_situation}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def build_advice_messages(prompt: str, lang_code: str = "en", summary: str = "", history: list = None) -> list:
+    """
+    Builds the chat messages for a financial advice request.
+
+    summary and history (earlier user/assistant messages, oldest first) carry
+    an advice session's earlier conversation (see utils/advice_sessions.py).
+    """
+    messages = [
+        {"role": "system", "content": f"You are a helpful financial advisor for migrant workers. Provide simple, practical financial advice in {lang_code} language."}
+    ]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of your earlier conversation with this user:\n{summary}"})
+    return messages + list(history or []) + [{"role": "user", "content": prompt}]
+
+def build_summary_messages(summary: str, turns: list, lang_code: str = "en", max_words: int = 150) -> list:
+    """Builds the chat messages that fold advice session turns into its running summary."""
+    conversation = "\n\n".join(f"User: {turn['question']}\nAdvisor: {turn['answer']}" for turn in turns)
+    return [
+        {"role": "system", "content": "You maintain the running summary of a financial advice conversation with a migrant worker. "
+                                      "Merge the earlier summary and the new exchanges into one summary. Keep the user's situation, "
+                                      "amounts, goals and decisions, and the advice already given; drop greetings and repetition. "
+                                      f"Write at most {max_words} words in {lang_code} language. Return only the summary."},
+        {"role": "user", "content": f"Earlier summary:\n{summary or '(none)'}\n\nNew exchanges:\n{conversation}"}
+    ]
+
+def build_expense_messages(text: str, lang_code: str = "en") -> list:
+    """Builds the chat messages for an expense extraction request."""
+    return [
+        {"role": "system", "content": f"Extract expense information from the following text in {lang_code} language. Return ONLY a JSON object with amount (number), currency (string), category (string), and description (string)."},
+        {"role": "user", "content": text}
+    ]
+
+def parse_goal_suggestions(result: str) -> list:
+    """Extracts the list of goal suggestions from a model response, or [] if it has none."""
+    try:
+        return structured_output.parse(result, structured_output.GOAL_SUGGESTIONS)
+    except structured_output.StructuredOutputError as e:
+        logger.error("Unusable goal suggestions (%s): %s", e, result)
+        return []
+
+def _structured_completion(task: str, model: str, messages: list, schema: structured_output.Schema):
+    """
+    Requests JSON for a schema, repairing the response locally. The model is
+    asked again, once, only if the response cannot be repaired.
+
+    Raises:
+        LLMUnavailableError: If no provider answered
+        StructuredOutputError: If neither response matched the schema
+    """
+    result = _create_completion(task, model=model, messages=messages, response_format=JSON_OBJECT)
+    try:
+        return structured_output.parse(result, schema)
+    except structured_output.StructuredOutputError as e:
+        logger.warning("Re-asking for %s after an unusable response (%s): %s", schema.name, e, result)
+        retry_messages = structured_output.reask_messages(messages, result, e, schema)
+    metrics.increment(f"structured.{schema.name}.reasked")
+    result = _create_completion(task, model=model, messages=retry_messages, response_format=JSON_OBJECT)
+    return structured_output.parse(result, schema)
+
 def get_behavioral_goal_suggestions(income: str, family_needs: str, current_situation: str, lang_code: str = "en", model: str = "gpt-3.5-turbo") -> list:
     """
     Gets personalized goal suggestions using behavioral science principles.
-    
+
     Args:
         income: The user's income level
         family_needs: The user's family needs description
         current_situation: Additional context about the user's situation
         lang_code: The language code for the response
         model: The model to use for generation
-        
+
     Returns:
-        A list of suggested goals with behavioral science rationale
+        A list of suggested goals with behavioral science rationale, or an empty
+        list if none could be generated (callers show the standard goal types)
     """
-    
-    if not _client:
-        initialize_openai()
-        if not _client:
-            logging.error("OpenAI client initialization failed")
-            raise Exception("Failed to initialize OpenAI client")
+    _ensure_client()
 
+    messages = build_goal_suggestion_messages(income, family_needs, current_situation, lang_code)
+    logger.debug("Requesting personalized goal suggestions")
     try:
-        # Create a detailed system prompt using behavioral science principles
-        system_prompt = "You are a financial goal advisor for migrant workers in Singapore using behavioral science principles (specifically the COM-B model: Capability, Opportunity, Motivation -> Behavior).\n\n" + \
-        "Create contextual, meaningful financial goal suggestions based on the user's income level and family needs.\n\n" + \
-        "Use these behavioral science principles:\n" + \
-        "1. Make goals concrete and specific (rather than abstract)\n" + \
-        "2. Connect goals to family values and relationships\n" + \
-        "3. Focus on small wins and manageable steps\n" + \
-        "4. Create psychological ownership over goals\n" + \
-        "5. Reduce mental effort required for decision making\n\n" + \
-        f"Based on the provided income and family information, generate 3-4 contextual financial goals in {lang_code} language that would be most appropriate.\n\n" + \
-        "IMPORTANT: Return ONLY a JSON array with objects containing:\n" + \
-        "- \"goal\": Short goal name (3-5 words)\n" + \
-        "- \"description\": Brief description of the goal (10-15 words)\n" + \
-        "- \"rationale\": Why this goal matters using behavioral science (10-15 words)\n\n" + \
-        "The goals should be specific to the migrant worker context and address both short-term needs and long-term aspirations."
-
-        # Create a user prompt with the specific information
-        user_prompt = f"Income: {income}\nFamily needs: {family_needs}\nCurrent situation: {current_situation}"
-        
-        logging.info(f"⭐⭐⭐ CALLING OPENAI API for personalized goal suggestions")
-        # Create the response - manually handle the JSON format to avoid errors
-        try:
-            response = _client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
-        except Exception as e:
-            logging.error(f"Error with response_format parameter: {e}")
-            # Fallback without response_format if it's not supported
-            response = _client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt + "\nReturn your response as a valid JSON object."},
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-        
-        if response.choices and len(response.choices) > 0:
-            result = response.choices[0].message.content.strip()
-            logging.debug(f"Generated goal suggestions: {result}")
-            import json
-            try:
-                parsed_result = json.loads(result)
-                if isinstance(parsed_result, dict) and "goals" in parsed_result:
-                    return parsed_result["goals"]
-                elif isinstance(parsed_result, list):
-                    return parsed_result
-                else:
-                    return [{"goal": "Emergency Fund", "description": "Save for unexpected expenses", "rationale": "Creates financial security"}]
-            except json.JSONDecodeError:
-                logging.error(f"Failed to parse JSON response: {result}")
-                return [{"goal": "Emergency Fund", "description": "Save for unexpected expenses", "rationale": "Creates financial security"}]
-        else:
-            logging.error("OpenAI response missing choices.")
-            return [{"goal": "Emergency Fund", "description": "Save for unexpected expenses", "rationale": "Creates financial security"}]
-    except Exception as e:
-        logging.error(f"Error calling OpenAI API for goal suggestions: {e}", exc_info=True)
-        return [{"goal": "Emergency Fund", "description": "Save for unexpected expenses", "rationale": "Creates financial security"}]
+        suggestions = _structured_completion("suggest", model, messages, structured_output.GOAL_SUGGESTIONS)
+    except LLMUnavailableError as e:
+        logger.error("No LLM answered the goal suggestion request: %s", e)
+        return []
+    except structured_output.StructuredOutputError as e:
+        logger.error("No usable goal suggestions: %s", e)
+        return []
+
+    logger.debug("Generated goal suggestions: %s", suggestions)
+    return suggestions
 
 def get_ai_advice(prompt: str, lang_code: str = "en", model: str = "gpt-3.5-turbo") -> str:
     """
-    Gets financial advice from OpenAI based on the prompt.
-    
+    Gets financial advice from the LLM routed for the advise task.
+
     Args:
         prompt: The prompt to send to the AI
         lang_code: The language code for the response
         model: The model to use for generation
-        
+
     Returns:
         The AI-generated advice as a string
     """
-    if not _client:
-        initialize_openai()
-        if not _client:
-            logging.error("OpenAI client initialization failed")
-            raise Exception("Failed to initialize OpenAI client")
-
     try:
-        response = _client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": f"You are a helpful financial advisor for migrant workers. Provide simple, practical financial advice in {lang_code} language."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        if response.choices and len(response.choices) > 0:
-            return response.choices[0].message.content.strip()
-        else:
-            logging.error("OpenAI response missing choices.")
-            return "Sorry, I couldn't generate advice at this time."
-    except Exception as e:
-        logging.error(f"Error calling OpenAI API: {e}", exc_info=True)
-        return "Sorry, I encountered an error while generating advice."
+        return complete_advice(build_advice_messages(prompt, lang_code), model)
+    except LLMUnavailableError as e:
+        logger.error("No LLM answered the advice request: %s", e)
+        return ADVICE_ERROR_MESSAGE
+
+def complete_advice(messages: list, model: str = "gpt-3.5-turbo") -> str:
+    """
+    Runs prebuilt advice messages (see build_advice_messages) on the advise route.
+
+    Raises:
+        LLMUnavailableError: If no provider answered
+    """
+    _ensure_client()
+    return _create_completion("advise", model=model, messages=messages)
 
 def parse_expense(text: str, lang_code: str = "en") -> dict:
     """
-    Parses expense information from text using OpenAI.
-    
+    Parses expense information from text with the LLM routed for the parse task.
+
     Args:
         text: The expense text to parse
         lang_code: The language code of the input text
-        
+
     Returns:
-        A dictionary with parsed expense information (amount, category, description)
+        A dictionary with parsed expense information (amount, currency, category, description),
+        or one with an "error" key
     """
-    if not _client:
-        initialize_openai()
-        if not _client:
-            logging.error("OpenAI client initialization failed")
-            raise Exception("Failed to initialize OpenAI client")
+    _ensure_client()
 
     try:
-        try:
-            response = _client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": f"Extract expense information from the following text in {lang_code} language. Return ONLY a JSON object with amount (number), currency (string), category (string), and description (string)."},
-                    {"role": "user", "content": text}
-                ],
-                response_format={"type": "json_object"}
-            )
-        except Exception as e:
-            logging.error(f"Error with expense parsing response_format: {e}")
-            # Fallback without response_format if it's not supported
-            try:
-                response = _client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": f"Extract expense information from the following text in {lang_code} language. Return ONLY a JSON object with amount (number), currency (string), category (string), and description (string). The response must be valid JSON."},
-                        {"role": "user", "content": text}
-                    ]
-                )
-            except Exception as e2:
-                logging.error(f"Error in fallback expense parsing: {e2}")
-                return {"error": f"Error parsing expense: {str(e2)}"}
-        if response.choices and len(response.choices) > 0:
-            result = response.choices[0].message.content.strip()
-            logging.debug(f"Parsed expense: {result}")
-            import json
-            try:
-                return json.loads(result)
-            except json.JSONDecodeError:
-                return {"error": "Failed to parse expense information"}
-        else:
-            logging.error("OpenAI response missing choices.")
-            return {"error": "Failed to process expense"}
-    except Exception as e:
-        logging.error(f"Error calling OpenAI API for expense parsing: {e}", exc_info=True)
+        expense = _structured_completion(
+            "parse", "gpt-3.5-turbo", build_expense_messages(text, lang_code), structured_output.EXPENSE
+        )
+    except LLMUnavailableError as e:
+        logger.error("No LLM answered the expense parsing request: %s", e)
         return {"error": f"Error parsing expense: {str(e)}"}
+    except structured_output.StructuredOutputError as e:
+        logger.error("Unusable expense extraction for %r: %s", text, e)
+        return {"error": "Failed to parse expense information"}
+
+    logger.debug("Parsed expense: %s", expense)
+    return expense
 
 # Initialize OpenAI when the module is imported
 try:
     initialize_openai()
 except Exception as e:
-    logging.error(f"Failed to initialize OpenAI: {e}")
\ No newline at end of file
+    logger.error("Failed to initialize OpenAI: %s", e)
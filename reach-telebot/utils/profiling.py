@@ -0,0 +1,201 @@
+# utils/profiling.py
+"""
+Diagnostics for latency spikes.
+
+Sampling profiler: samples every thread's Python stack (sys._current_frames)
+for N seconds and writes the counts in collapsed-stack format
+("root;caller;callee count" per line), which flamegraph.pl, inferno and
+speedscope render directly. Admins start it with /profiler N; SIGUSR1 starts
+a PROFILE_SIGNAL_SECONDS run and logs where the output was written.
+
+Slow-update tracer: each update is processed inside a trace, and span()
+records timed sections into it: Firestore reads and writes, LLM calls,
+Telegram API requests and handlers (e.g. goals.spending_assessment_callback).
+Updates slower than SLOW_UPDATE_SECONDS log their span breakdown. Outside a
+trace span() costs one context variable lookup.
+"""
+import contextvars
+import functools
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import HTTPXRequest
+from config import SLOW_UPDATE_SECONDS, PROFILE_DIR, PROFILE_SIGNAL_SECONDS
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 300
+# Span categories summarized in the slow-update log line
+IO_PREFIXES = ("firestore.", "llm.", "telegram.")
+
+class Trace:
+    __slots__ = ("name", "started", "spans")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []  # (offset, duration, depth, name)
+
+_trace = contextvars.ContextVar("trace", default=None)
+_depth = contextvars.ContextVar("trace_depth", default=0)
+
+@contextmanager
+def span(name: str):
+    """Times the enclosed block as a span of the current trace, if there is one."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth.reset(token)
+        trace.spans.append((started - trace.started, time.perf_counter() - started, depth, name))
+
+@contextmanager
+def trace(name: str):
+    """Traces the enclosed block; logs its spans if it takes longer than SLOW_UPDATE_SECONDS."""
+    if SLOW_UPDATE_SECONDS <= 0:
+        yield None
+        return
+    current = Trace(name)
+    token = _trace.set(current)
+    try:
+        yield current
+    finally:
+        _trace.reset(token)
+        elapsed = time.perf_counter() - current.started
+        if elapsed >= SLOW_UPDATE_SECONDS:
+            metrics.increment("trace.slow_updates")
+            logger.warning(format_trace(current, elapsed))
+
+def format_trace(current: Trace, elapsed: float) -> str:
+    """Formats a trace as a header with I/O totals followed by one line per span."""
+    totals = {prefix.rstrip("."): 0.0 for prefix in IO_PREFIXES}
+    for _, duration, _, name in current.spans:
+        for prefix in IO_PREFIXES:
+            if name.startswith(prefix):
+                totals[prefix.rstrip(".")] += duration
+    summary = " ".join(f"{kind}={seconds * 1000:.0f}ms" for kind, seconds in totals.items())
+    lines = [f"Slow update {current.name}: {elapsed * 1000:.0f}ms ({summary})"]
+    for offset, duration, depth, name in sorted(current.spans):
+        lines.append(f"  +{offset * 1000:6.0f}ms {duration * 1000:6.0f}ms {'  ' * depth}{name}")
+    return "\n".join(lines)
+
+def describe_update(update: object) -> str:
+    if not isinstance(update, Update):
+        return type(update).__name__
+    user = update.effective_user
+    if update.callback_query:
+        kind = f"callback {update.callback_query.data}"
+    elif update.message and update.message.text and update.message.text.startswith("/"):
+        kind = update.message.text.split()[0]
+    else:
+        kind = "message"
+    return f"{update.update_id} ({kind}, user {user.id if user else '-'})"
+
+def handler_name(callback) -> str:
+    """Short name for a handler callback, e.g. goals.spending_assessment_callback."""
+    module = (getattr(callback, "__module__", None) or "").rsplit(".", 1)[-1]
+    return f"{module}.{getattr(callback, '__qualname__', type(callback).__name__)}"
+
+def traced(callback, name: str = None):
+    """Wraps an async handler callback in a span."""
+    name = name or handler_name(callback)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        with span(name):
+            return await callback(update, context)
+    return wrapper
+
+def instrument_handlers(application: Application):
+    """Wraps the callback of every registered handler in a span; call after registering handlers."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = traced(handler.callback)
+
+class TracingApplication(Application):
+    """Application that processes each update inside a trace."""
+
+    async def process_update(self, update: object) -> None:
+        with trace(describe_update(update)):
+            await super().process_update(update)
+
+class TracingRequest(HTTPXRequest):
+    """Bot API request backend recording each call as a span, e.g. telegram.sendMessage."""
+
+    async def do_request(self, url: str, *args, **kwargs):
+        with span(f"telegram.{url.rsplit('/', 1)[-1]}"):
+            return await super().do_request(url, *args, **kwargs)
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse(frame, root: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(root)
+    return ";".join(reversed(labels))
+
+_profile_lock = threading.Lock()
+
+def profile(seconds: float) -> tuple:
+    """
+    Samples all other threads for `seconds` and writes a collapsed-stack file.
+
+    Blocks the calling thread. Returns (path, samples), or (None, 0) if a
+    profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None, 0
+    try:
+        seconds = min(seconds, MAX_PROFILE_SECONDS)
+        own = threading.get_ident()
+        thread_names = {}
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in thread_names:
+                    thread_names.update((t.ident, t.name) for t in threading.enumerate())
+                stacks[_collapse(frame, thread_names.get(ident, str(ident)))] += 1
+            samples += 1
+            time.sleep(SAMPLE_INTERVAL)
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        metrics.increment("profiler.runs")
+        logger.info("Wrote %s profile samples over %ss to %s", samples, seconds, path)
+        return path, samples
+    finally:
+        _profile_lock.release()
+
+def _on_signal(signum, frame):
+    threading.Thread(target=profile, args=(PROFILE_SIGNAL_SECONDS,), name="profiler", daemon=True).start()
+
+def install_signal_handler():
+    """Starts a profile on SIGUSR1 (where the platform has it); must run in the main thread."""
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _on_signal)
@@ -0,0 +1,94 @@
+# utils/rate_limit.py
+"""
+Token-bucket rate limiting for LLM-backed requests.
+
+Each user has a bucket, and one global bucket protects the shared OpenAI quota.
+Bucket state lives in the state store, so every bot process sees the same
+limits. A request that finds the bucket empty reserves the next token instead
+of failing; the caller waits for it, which queues bursts in arrival order. A
+request is rejected only when the wait would exceed LLM_MAX_QUEUE_SECONDS.
+"""
+import time
+from config import (
+    LLM_USER_RATE_PER_MINUTE, LLM_USER_BURST,
+    LLM_GLOBAL_RATE_PER_MINUTE, LLM_GLOBAL_BURST, LLM_MAX_QUEUE_SECONDS
+)
+from utils import metrics, state_store
+
+STORE_NAMESPACE = "rate_limit"
+GLOBAL_KEY = "global"
+
+class RateLimited(Exception):
+    """Raised when a request would have to wait longer than the queue allows."""
+
+    def __init__(self, scope: str, wait: float):
+        super().__init__(f"{scope} rate limit exceeded (wait {wait:.1f}s)")
+        self.scope = scope
+        self.wait = wait
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+
+    def reserve(self, key: str, max_wait: float) -> float:
+        """
+        Reserves one token for key.
+
+        Returns the seconds to wait before the token is available (0 if it is
+        available now). Raises RateLimited, without reserving, if the wait
+        would exceed max_wait.
+        """
+        result = {}
+
+        def apply(state):
+            now = time.time()
+            tokens, updated = (state["tokens"], state["updated"]) if state else (self.capacity, now)
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            # Tokens go negative while requests are queued behind an empty bucket
+            wait = max(0.0, (1 - tokens) / self.rate)
+            result["wait"] = wait
+            if wait > max_wait:
+                return {"tokens": tokens, "updated": now}
+            return {"tokens": tokens - 1, "updated": now}
+
+        state_store.update(STORE_NAMESPACE, key, apply)
+        if result["wait"] > max_wait:
+            raise RateLimited(key, result["wait"])
+        return result["wait"]
+
+    def refund(self, key: str):
+        """Returns a reserved token, e.g. when a later check rejected the request."""
+        def apply(state):
+            if not state:
+                return None
+            return {"tokens": min(self.capacity, state["tokens"] + 1), "updated": state["updated"]}
+
+        state_store.update(STORE_NAMESPACE, key, apply)
+
+_user_bucket = TokenBucket(LLM_USER_RATE_PER_MINUTE, LLM_USER_BURST)
+_global_bucket = TokenBucket(LLM_GLOBAL_RATE_PER_MINUTE, LLM_GLOBAL_BURST)
+
+def reserve_llm_call(user_id: int) -> float:
+    """
+    Reserves an LLM call for a user against both the per-user and global limits.
+
+    Returns the seconds the caller must wait before making the call; raises
+    RateLimited if either limit would queue it for too long.
+    """
+    user_key = f"user:{user_id}"
+    try:
+        user_wait = _user_bucket.reserve(user_key, LLM_MAX_QUEUE_SECONDS)
+        try:
+            global_wait = _global_bucket.reserve(GLOBAL_KEY, LLM_MAX_QUEUE_SECONDS)
+        except RateLimited:
+            _user_bucket.refund(user_key)
+            raise
+    except RateLimited as e:
+        metrics.increment(f"rate_limit.rejected.{'global' if e.scope == GLOBAL_KEY else 'user'}")
+        raise
+    wait = max(user_wait, global_wait)
+    if wait > 0:
+        metrics.increment("rate_limit.queued")
+        metrics.observe("rate_limit.wait", wait)
+    return wait
@@ -0,0 +1,171 @@
+# utils/segments.py
+"""
+Secondary indexes over user documents, for resolving broadcast segments.
+
+Each indexed term ("language=ta", "income=2", "goal_type=remittance") is a
+state store namespace whose keys are the matching user ids, so resolving a
+term reads only its members. A per-user record of the user's current terms
+lets a re-index remove the terms that no longer apply. Indexes are kept up
+to date through firebase_client write hooks on language, profile and goals
+writes, which re-index only the written field and skip users whose document
+could not be read; `python campaign.py backfill-index` builds them for
+existing users.
+
+Segments are comma-separated conditions that must all hold:
+
+    language=ta,income<=2,goal_type=remittance
+
+`=` and `!=` compare strings; `<`, `<=`, `>` and `>=` compare numerically
+against the values seen for that field. goal_type only covers goals that
+are not yet reached.
+"""
+import logging
+import re
+from utils import firebase_client, metrics, state_store
+from utils.models import UserProfile, Goal
+
+logger = logging.getLogger(__name__)
+
+USER_NAMESPACE = "segment_user"  # user id -> {field: [values]}
+TERMS_NAMESPACE = "segment_terms"  # field -> sorted values seen
+PROFILE_FIELDS = ("income", "goal", "debt", "family")
+INDEXED_FIELDS = ("language",) + PROFILE_FIELDS + ("goal_type",)
+_CONDITION = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(.+?)\s*$")
+
+def _term_namespace(field: str, value: str) -> str:
+    return f"segment:{field}={value}"
+
+def terms_for(data: dict) -> dict:
+    """Returns {field: [values]} for a user document."""
+    terms = {}
+    if data.get("language"):
+        terms["language"] = [data["language"]]
+    profile = UserProfile.from_firestore(data.get("profile") or {})
+    if profile:
+        for field in PROFILE_FIELDS:
+            value = getattr(profile, field)
+            if value is not None:
+                terms[field] = [str(value)]
+    goal_types = set()
+    for raw in data.get("goals") or []:
+        goal = Goal.from_firestore(raw)
+        if goal.type and goal.progress_minor < goal.amount_minor:
+            goal_types.add(goal.type)
+    if goal_types:
+        terms["goal_type"] = sorted(goal_types)
+    return terms
+
+def _register_values(field: str, values: list):
+    def apply(current):
+        return sorted(set(current or []) | set(values))
+
+    if values:
+        state_store.update(TERMS_NAMESPACE, field, apply)
+
+def index_user(user_id: int, data: dict, fields: tuple = INDEXED_FIELDS):
+    """Brings a user's index entries for `fields` in line with their document."""
+    key = str(user_id)
+    old_terms = state_store.get(USER_NAMESPACE, key, {})
+    document_terms = terms_for(data)
+    # Terms of fields not being re-indexed stay as they were
+    new_terms = {field: values for field, values in old_terms.items() if field not in fields}
+    new_terms.update({field: values for field, values in document_terms.items() if field in fields})
+    for field in fields:
+        old_values, new_values = set(old_terms.get(field, [])), set(new_terms.get(field, []))
+        for value in old_values - new_values:
+            state_store.delete(_term_namespace(field, value), key)
+        for value in new_values - old_values:
+            state_store.set(_term_namespace(field, value), key, 1)
+        _register_values(field, sorted(new_values - old_values))
+    if not new_terms:
+        state_store.delete(USER_NAMESPACE, key)
+    elif new_terms != old_terms:
+        state_store.set(USER_NAMESPACE, key, new_terms)
+    metrics.increment("segments.indexed")
+
+def user_terms(user_id: int) -> dict:
+    """The indexed terms for a user, e.g. {"language": ["ta"], ...}."""
+    return state_store.get(USER_NAMESPACE, str(user_id), {})
+
+def parse_segment(text: str) -> list:
+    """Parses a segment into [(field, op, value)]; raises ValueError on bad input."""
+    conditions = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        match = _CONDITION.match(part)
+        if not match:
+            raise ValueError(f"Invalid condition '{part.strip()}'")
+        field, op, value = match.groups()
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"Unknown field '{field}'; indexed fields are {', '.join(INDEXED_FIELDS)}")
+        if op in ("<", "<=", ">", ">="):
+            try:
+                float(value)
+            except ValueError:
+                raise ValueError(f"'{part.strip()}' compares against a non-number")
+        conditions.append((field, op, value))
+    if not conditions:
+        raise ValueError("Empty segment")
+    return conditions
+
+def _matches(candidate: str, op: str, value: str) -> bool:
+    if op in ("=", "!="):
+        return (candidate == value) == (op == "=")
+    try:
+        number, bound = float(candidate), float(value)
+    except ValueError:
+        return False
+    return {"<": number < bound, "<=": number <= bound, ">": number > bound, ">=": number >= bound}[op]
+
+def _members(field: str, values: list) -> set:
+    members = set()
+    for value in values:
+        members.update(key for key, _ in state_store.items(_term_namespace(field, value)))
+    return members
+
+def resolve(text: str) -> list:
+    """Returns the sorted user ids matching every condition of a segment."""
+    conditions = parse_segment(text)
+    result = None
+    # Positive conditions narrow the set; != conditions are applied last as exclusions
+    for field, op, value in sorted(conditions, key=lambda c: c[1] == "!="):
+        seen = state_store.get(TERMS_NAMESPACE, field, [])
+        if op == "!=":
+            excluded = _members(field, [value])
+            if result is None:
+                result = _members(field, [v for v in seen if v != value])
+            result -= excluded
+            continue
+        members = _members(field, [v for v in seen if _matches(v, op, value)])
+        result = members if result is None else result & members
+        if not result:
+            break
+    return sorted(int(user_id) for user_id in (result or ()))
+
+def backfill(page_size: int = 500) -> int:
+    """Indexes every existing user; returns the number of users indexed."""
+    count = 0
+    for page in firebase_client.iter_user_documents(page_size):
+        for user_id, data in page:
+            index_user(int(user_id), data)
+            count += 1
+        logger.info("Indexed %s users", count)
+    return count
+
+# The index fields each written document field feeds
+_WRITTEN_FIELDS = {"language": ("language",), "profile": PROFILE_FIELDS, "goals": ("goal_type",)}
+
+def _on_write(user_id: int, field_name: str):
+    fields = _WRITTEN_FIELDS.get(field_name)
+    if not fields:
+        return
+    data = firebase_client.get_user_data(user_id)
+    if firebase_client.is_fallback(data):
+        # Defaults from a failed read would drop the user from their segments; keep the old entries
+        logger.warning("Could not read user %s; %s index left as it was", user_id, field_name)
+        metrics.increment("segments.index_skipped")
+        return
+    index_user(user_id, data, fields)
+
+firebase_client.register_write_hook(_on_write)
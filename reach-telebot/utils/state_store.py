@@ -0,0 +1,200 @@
+# utils/state_store.py
+"""
+Small persistent key-value store for bot runtime state.
+
+Holds state that must survive restarts or be shared between processes but
+does not belong in the user's Firestore document: conversation flow state,
+rate-limit buckets, offloaded user_data, and so on. Values are JSON-serialisable
+and grouped by namespace.
+
+Backends (STATE_STORE_BACKEND):
+    sqlite    - a local SQLite file (default); safe across processes on one host
+    firestore - the `bot_state` collection, for multi-host deployments
+    memory    - a process-local dict, for tests and throwaway runs
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config import STATE_STORE_BACKEND, STATE_STORE_PATH
+
+logger = logging.getLogger(__name__)
+
+class MemoryStateStore:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.RLock()
+
+    def get(self, namespace: str, key: str, default=None):
+        with self._lock:
+            value = self._data.get((namespace, key))
+            return json.loads(value) if value is not None else default
+
+    def set(self, namespace: str, key: str, value):
+        with self._lock:
+            self._data[(namespace, key)] = json.dumps(value, default=str)
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def update(self, namespace: str, key: str, fn):
+        with self._lock:
+            value = fn(self.get(namespace, key))
+            if value is None:
+                self.delete(namespace, key)
+            else:
+                self.set(namespace, key, value)
+            return value
+
+    def items(self, namespace: str):
+        with self._lock:
+            entries = [(k, v) for (ns, k), v in self._data.items() if ns == namespace]
+        for key, value in entries:
+            yield key, json.loads(value)
+
+class SQLiteStateStore:
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; several processes may share the file
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str, default=None):
+        row = self._connection().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, namespace: str, key: str, value):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, default=str), time.time())
+        )
+
+    def delete(self, namespace: str, key: str):
+        self._connection().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def update(self, namespace: str, key: str, fn):
+        conn = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front so concurrent processes serialise
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = fn(self.get(namespace, key))
+            if value is None:
+                self.delete(namespace, key)
+            else:
+                self.set(namespace, key, value)
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def items(self, namespace: str):
+        rows = self._connection().execute(
+            "SELECT key, value FROM state WHERE namespace = ?", (namespace,)
+        ).fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+class FirestoreStateStore:
+    COLLECTION = "bot_state"
+
+    def __init__(self):
+        from utils.firebase_client import get_db
+        self._db = get_db()
+
+    def _ref(self, namespace: str, key: str):
+        return self._db.collection(self.COLLECTION).document(f"{namespace}:{key}")
+
+    def get(self, namespace: str, key: str, default=None):
+        snapshot = self._ref(namespace, key).get()
+        return json.loads(snapshot.to_dict()["value"]) if snapshot.exists else default
+
+    def set(self, namespace: str, key: str, value):
+        self._ref(namespace, key).set({
+            "namespace": namespace, "key": key,
+            "value": json.dumps(value, default=str), "updated_at": time.time()
+        })
+
+    def delete(self, namespace: str, key: str):
+        self._ref(namespace, key).delete()
+
+    def update(self, namespace: str, key: str, fn):
+        from google.cloud import firestore as cloud_firestore
+        ref = self._ref(namespace, key)
+
+        @cloud_firestore.transactional
+        def apply(transaction):
+            snapshot = ref.get(transaction=transaction)
+            current = json.loads(snapshot.to_dict()["value"]) if snapshot.exists else None
+            value = fn(current)
+            if value is None:
+                transaction.delete(ref)
+            else:
+                transaction.set(ref, {"namespace": namespace, "key": key,
+                                      "value": json.dumps(value, default=str), "updated_at": time.time()})
+            return value
+
+        return apply(self._db.transaction())
+
+    def items(self, namespace: str):
+        query = self._db.collection(self.COLLECTION).where("namespace", "==", namespace)
+        for snapshot in query.stream():
+            data = snapshot.to_dict()
+            yield data["key"], json.loads(data["value"])
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Returns the configured state store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if STATE_STORE_BACKEND == "memory":
+                    _store = MemoryStateStore()
+                elif STATE_STORE_BACKEND == "firestore":
+                    _store = FirestoreStateStore()
+                else:
+                    _store = SQLiteStateStore(STATE_STORE_PATH)
+                logger.info("State store initialized (%s backend).", STATE_STORE_BACKEND)
+    return _store
+
+def get(namespace: str, key: str, default=None):
+    return get_store().get(namespace, key, default)
+
+def set(namespace: str, key: str, value):
+    get_store().set(namespace, key, value)
+
+def delete(namespace: str, key: str):
+    get_store().delete(namespace, key)
+
+def update(namespace: str, key: str, fn):
+    """Atomically replaces a value with fn(current); returning None from fn deletes it."""
+    return get_store().update(namespace, key, fn)
+
+def items(namespace: str):
+    """Iterates (key, value) pairs in a namespace."""
+    return get_store().items(namespace)
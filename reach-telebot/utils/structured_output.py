@@ -0,0 +1,300 @@
+# utils/structured_output.py
+"""
+Schema-checked JSON output from LLMs.
+
+Each JSON task declares a Schema: the fields of an object (or of every item
+of a list), their types, defaults and accepted aliases. parse() turns a raw
+model response into validated data in three steps, all local:
+
+  1. json.loads, for well-behaved responses
+  2. repair: drop code fences and prose around the JSON, turn single-quoted
+     strings, unquoted keys and Python literals into JSON, drop trailing
+     commas, and close truncated output; the value the output was cut off in
+     (a string or number that may be incomplete) is dropped with its key,
+     never kept
+  3. validation with coercion: "12" or "SGD 12.50" for a number field becomes
+     12.0 or 12.5, numbers become strings, missing optional fields get their
+     defaults, and amounts must be positive
+
+Only if that fails does the caller re-ask the model (see reask_messages()),
+so a malformed answer costs a second round trip only when it is beyond repair.
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_TRIMS = 8  # Dangling elements dropped from truncated output before giving up
+
+class StructuredOutputError(ValueError):
+    """Raised when a response cannot be repaired into data matching its schema."""
+
+@dataclass(frozen=True, slots=True)
+class Field:
+    name: str
+    type: type  # str, float, int or bool
+    required: bool = False
+    default: object = None
+    aliases: tuple = ()
+    positive: bool = False  # Numbers must be greater than zero
+
+@dataclass(frozen=True, slots=True)
+class Schema:
+    name: str
+    fields: tuple
+    many: bool = False  # A list of objects rather than one object
+    wrapper: str = ""  # Key the list may come wrapped in, e.g. {"goals": [...]}
+    min_items: int = 1
+
+    def describe(self) -> str:
+        """The expected shape, for re-ask prompts."""
+        shape = "{" + ", ".join(f'"{f.name}": {_TYPE_NAMES[f.type]}' for f in self.fields) + "}"
+        if self.many:
+            return f'{{"{self.wrapper}": [{shape}, ...]}}' if self.wrapper else f"[{shape}, ...]"
+        return shape
+
+_TYPE_NAMES = {str: "string", float: "number", int: "integer", bool: "boolean"}
+
+EXPENSE = Schema("expense", (
+    Field("amount", float, required=True, aliases=("total", "price", "cost", "value"), positive=True),
+    Field("currency", str, default="", aliases=("currency_code",)),
+    Field("category", str, default="Other"),
+    Field("description", str, default="", aliases=("item", "note", "details")),
+))
+
+GOAL_SUGGESTIONS = Schema("goal_suggestions", (
+    Field("goal", str, required=True, aliases=("name", "title")),
+    Field("description", str, default=""),
+    Field("rationale", str, default="", aliases=("reason", "why")),
+), many=True, wrapper="goals")
+
+# Repair
+
+_FENCE = re.compile(r"```[a-zA-Z]*")
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+def _read_string(text: str, i: int) -> tuple:
+    """Reads a quoted string starting at text[i]; returns (value, next index, terminated)."""
+    if text[i] == '"':
+        try:
+            value, end = json.decoder.scanstring(text, i + 1)
+            return value, end, True
+        except json.JSONDecodeError:
+            pass  # Unterminated or with bad escapes; read it leniently below
+    quote = text[i]
+    chars = []
+    i += 1
+    while i < len(text):
+        c = text[i]
+        if c == "\\" and i + 1 < len(text):
+            chars.append({"n": "\n", "t": "\t"}.get(text[i + 1], text[i + 1]))
+            i += 2
+            continue
+        if c == quote:
+            return "".join(chars), i + 1, True
+        chars.append(c)
+        i += 1
+    return "".join(chars), i, False
+
+def _rewrite(text: str) -> tuple:
+    """Rewrites the first JSON-ish value in text as JSON; returns (json text, open brackets)."""
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise StructuredOutputError("no JSON object or array in the response")
+    out, stack = [], []
+    i = start
+    while i < len(text):
+        c = text[i]
+        if c in "\"'":
+            value, i, terminated = _read_string(text, i)
+            if not terminated:
+                break  # Cut off inside the string; the partial value is dropped below
+            out.append(json.dumps(value, ensure_ascii=False))
+            continue
+        if c in "{[":
+            stack.append(c)
+            out.append(c)
+        elif c in "}]":
+            if stack and _CLOSERS[stack[-1]] == c:
+                stack.pop()
+                _drop_trailing_comma(out)
+                out.append(c)
+                if not stack:
+                    break
+        elif (c.isalpha() or c == "_") and not (c in "eE" and out and out[-1][-1:].isdigit()):
+            match = re.match(r"[\w$-]+", text[i:])
+            word = match.group(0)
+            i += len(word)
+            # Unquoted keys and bare words become strings; Python literals become JSON ones
+            out.append(_LITERALS.get(word) or json.dumps(word, ensure_ascii=False))
+            continue
+        elif c == "/" and text.startswith("//", i):
+            i = text.find("\n", i) if "\n" in text[i:] else len(text)
+            continue
+        else:
+            out.append(c)
+        i += 1
+    if stack:
+        _drop_partial_value(out)
+    return "".join(out), stack
+
+def _drop_trailing_space(out: list):
+    while out and out[-1].isspace():
+        out.pop()
+
+def _drop_trailing_comma(out: list):
+    _drop_trailing_space(out)
+    if out and out[-1] == ",":
+        out.pop()
+
+def _drop_partial_value(out: list):
+    """Removes the number truncated output may have been cut off in, and the key of a cut-off value."""
+    _drop_trailing_space(out)
+    # Numbers are copied character by character; "12" could have been 120
+    while out and len(out[-1]) == 1 and out[-1] in "0123456789+-.eE":
+        out.pop()
+    _drop_trailing_space(out)
+    if out and out[-1] == ":":
+        out.pop()
+        _drop_trailing_space(out)
+        if out:
+            out.pop()  # The key
+
+def _close(body: str, stack: list) -> str:
+    body = body.rstrip().rstrip(",")
+    if body.endswith(":"):
+        body += " null"
+    return body + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+def repair(text: str) -> object:
+    """Parses a malformed JSON response, raising StructuredOutputError if it cannot be repaired."""
+    body, stack = _rewrite(_FENCE.sub("", text or ""))
+    for _ in range(MAX_TRIMS):
+        try:
+            return json.loads(_close(body, stack))
+        except json.JSONDecodeError:
+            if not stack:
+                break
+        # Truncated mid-element: drop everything after the last comma at any depth and retry
+        cut = body.rstrip().rstrip(",").rfind(",")
+        if cut < 0:
+            break
+        body = body[:cut]
+        stack = _open_brackets(body)
+    raise StructuredOutputError("response is not repairable JSON")
+
+def _open_brackets(body: str) -> list:
+    stack, in_string, escaped = [], False, False
+    for c in body:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append(c)
+        elif c in "}]" and stack:
+            stack.pop()
+    return stack
+
+# Validation
+
+_NUMBER = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+def _coerce(value, field: Field):
+    if field.type is str:
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f"{value:g}"
+        raise StructuredOutputError(f"{field.name} should be a string")
+    if field.type in (float, int):
+        if isinstance(value, str):
+            match = _NUMBER.search(value)
+            if not match:
+                raise StructuredOutputError(f"{field.name} should be a number, got {value!r}")
+            value = float(match.group(0).replace(",", ""))
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise StructuredOutputError(f"{field.name} should be a number")
+        if field.positive and not value > 0:
+            raise StructuredOutputError(f"{field.name} should be positive, got {value:g}")
+        return field.type(value)
+    if field.type is bool:
+        if isinstance(value, str) and value.strip().lower() in ("true", "yes", "false", "no"):
+            return value.strip().lower() in ("true", "yes")
+        if not isinstance(value, bool):
+            raise StructuredOutputError(f"{field.name} should be true or false")
+    return value
+
+def _validate_object(data, schema: Schema) -> dict:
+    if not isinstance(data, dict):
+        raise StructuredOutputError(f"expected an object, got {type(data).__name__}")
+    result = {}
+    for field in schema.fields:
+        key = next((k for k in (field.name,) + field.aliases if data.get(k) not in (None, "")), None)
+        if key is None:
+            if field.required:
+                raise StructuredOutputError(f"missing {field.name}")
+            result[field.name] = field.default
+            continue
+        result[field.name] = _coerce(data[key], field)
+    return result
+
+def validate(data, schema: Schema):
+    """Checks and coerces parsed JSON against a schema; returns a dict, or a list of dicts if schema.many."""
+    if not schema.many:
+        return _validate_object(data, schema)
+    if isinstance(data, dict):
+        items = data.get(schema.wrapper) if schema.wrapper in data else next(
+            (v for v in data.values() if isinstance(v, list)), [data])
+    else:
+        items = data
+    if not isinstance(items, list):
+        raise StructuredOutputError("expected a list")
+    # Keep the good items; one malformed suggestion should not sink the rest
+    valid = []
+    for item in items:
+        try:
+            valid.append(_validate_object(item, schema))
+        except StructuredOutputError as e:
+            logger.debug("Dropping invalid %s item: %s", schema.name, e)
+    if len(valid) < schema.min_items:
+        raise StructuredOutputError(f"expected at least {schema.min_items} valid items, got {len(valid)}")
+    return valid
+
+def parse(text: str, schema: Schema):
+    """Parses a model response against a schema, repairing it locally if needed."""
+    try:
+        data = json.loads(text)
+        repaired = False
+    except (json.JSONDecodeError, TypeError):
+        try:
+            data = repair(text)
+        except StructuredOutputError:
+            metrics.increment(f"structured.{schema.name}.invalid")
+            raise
+        repaired = True
+    try:
+        result = validate(data, schema)
+    except StructuredOutputError:
+        metrics.increment(f"structured.{schema.name}.invalid")
+        raise
+    metrics.increment(f"structured.{schema.name}.{'repaired' if repaired else 'valid'}")
+    return result
+
+def reask_messages(messages: list, response: str, error: Exception, schema: Schema) -> list:
+    """The original messages plus the bad response and a request to fix it."""
+    return messages + [
+        {"role": "assistant", "content": response},
+        {"role": "user", "content": f"That reply could not be used ({error}). Reply with only valid JSON "
+                                    f"of this shape: {schema.describe()}"},
+    ]
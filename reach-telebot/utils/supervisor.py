@@ -0,0 +1,211 @@
+# utils/supervisor.py
+"""
+Sharded multi-process mode (python main.py --workers N).
+
+The supervisor process is the only one calling getUpdates. It routes each
+update to one of N worker processes by hashing the user id, so all of a
+user's updates are handled in order by the same worker. That worker also
+holds the user's user_data and warm in-process caches. Workers run a normal
+Application without an updater and feed the routed updates into its update
+queue. State shared between workers (flows, rate limits, ...) lives in the
+state store.
+
+Workers that exit are restarted with exponential backoff. Failed getUpdates
+calls are retried with backoff too, except for a rejected bot token, which
+stops the supervisor like any other error that ends polling. SIGINT/SIGTERM stop
+polling, confirm the last fetched offset, let every worker drain its queue,
+then wait for the workers to exit.
+"""
+import asyncio
+import logging
+import multiprocessing
+import queue as queue_module
+import signal
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 1000  # Per worker; a full queue applies backpressure to polling
+POLL_TIMEOUT = 30
+SHUTDOWN_TIMEOUT = 30
+MAX_RESTART_DELAY = 60
+MAX_POLL_DELAY = 30
+STABLE_AFTER = 60  # A worker that ran this long resets its restart backoff
+
+def shard_for(user_id: int, workers: int) -> int:
+    """Returns the worker index that owns a user."""
+    return zlib.crc32(str(user_id).encode()) % workers
+
+def _routing_id(update) -> int:
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return 0
+
+def _worker_main(index: int, updates, build_application):
+    """Entry point of a worker process."""
+    # The supervisor coordinates shutdown; Ctrl+C in a terminal must not kill workers mid-update
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    asyncio.run(_serve(index, updates, build_application, stopping))
+
+async def _serve(index: int, updates, build_application, stopping: threading.Event):
+    from telegram import Update
+
+    application = build_application(with_updater=False)
+    loop = asyncio.get_running_loop()
+    async with application:
+        await application.start()
+        logger.info("Worker %s started", index)
+        while not stopping.is_set():
+            try:
+                data = await loop.run_in_executor(None, updates.get, True, 1.0)
+            except queue_module.Empty:
+                continue
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        # Processes updates already handed to the application before returning
+        await application.stop()
+    logger.info("Worker %s stopped", index)
+
+class Supervisor:
+    def __init__(self, workers: int, build_application, token: str, base_url: str = None):
+        self._context = multiprocessing.get_context("spawn")
+        self._build_application = build_application
+        self._token = token
+        self._base_url = base_url
+        self._queues = [self._context.Queue(QUEUE_SIZE) for _ in range(workers)]
+        self._processes = [None] * workers
+        self._started_at = [0.0] * workers
+        self._restarts = [0] * workers
+        self._restart_at = [0.0] * workers
+        self._stop_event = None
+
+    def _start_worker(self, index: int):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self._queues[index], self._build_application),
+            name=f"bot-worker-{index}"
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        logger.info("Started worker %s (pid %s)", index, process.pid)
+
+    def _check_workers(self):
+        """Restarts workers that exited, backing off if they keep crashing."""
+        now = time.monotonic()
+        for index, process in enumerate(self._processes):
+            if process is not None:
+                if process.is_alive():
+                    continue
+                uptime = now - self._started_at[index]
+                self._restarts[index] = 0 if uptime > STABLE_AFTER else self._restarts[index] + 1
+                delay = min(MAX_RESTART_DELAY, 2 ** (self._restarts[index] - 1)) if self._restarts[index] else 0
+                logger.error("Worker %s exited with code %s after %.0fs; restarting in %ss",
+                             index, process.exitcode, uptime, delay)
+                self._processes[index] = None
+                self._restart_at[index] = now + delay
+            if now >= self._restart_at[index]:
+                self._start_worker(index)
+
+    async def _monitor(self):
+        while not self._stop_event.is_set():
+            self._check_workers()
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, bot, state: dict):
+        from telegram import Update
+        from telegram.error import InvalidToken, NetworkError, RetryAfter, TelegramError
+
+        loop = asyncio.get_running_loop()
+        delay = 1
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=state["offset"], timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES
+                )
+            except InvalidToken:
+                # Retrying cannot help; let _run stop the supervisor instead of idling without updates
+                raise
+            except RetryAfter as e:
+                wait = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                logger.warning("getUpdates rate limited; retrying in %ss", wait)
+                await asyncio.sleep(wait)
+                continue
+            except TelegramError as e:
+                # Network errors, Conflict (another getUpdates call or a webhook), server errors...
+                log = logger.warning if isinstance(e, NetworkError) else logger.error
+                log("getUpdates failed (%s): %s; retrying in %ss", type(e).__name__, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(MAX_POLL_DELAY, delay * 2)
+                continue
+            delay = 1
+            for update in updates:
+                index = shard_for(_routing_id(update), len(self._queues))
+                await loop.run_in_executor(None, self._queues[index].put, update.to_dict())
+                state["offset"] = update.update_id + 1
+
+    async def _run(self):
+        from telegram import Bot
+
+        self._stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stop_event.set)
+
+        bot = Bot(self._token, base_url=self._base_url) if self._base_url else Bot(self._token)
+        state = {"offset": None}
+        async with bot:
+            await bot.delete_webhook()
+            monitor = asyncio.create_task(self._monitor())
+            poller = asyncio.create_task(self._poll(bot, state))
+            poller.add_done_callback(self._on_poller_done)
+            await self._stop_event.wait()
+            logger.info("Shutting down: stopping polling")
+            poller.cancel()
+            await asyncio.gather(poller, monitor, return_exceptions=True)
+            if state["offset"] is not None:
+                # Confirms the routed updates so Telegram does not redeliver them
+                await bot.get_updates(offset=state["offset"], timeout=0, limit=1)
+
+    def _on_poller_done(self, poller: asyncio.Task):
+        if poller.cancelled():
+            return
+        error = poller.exception()
+        if error is None:
+            logger.critical("Polling stopped unexpectedly; shutting down")
+        else:
+            logger.critical("Polling stopped: %s: %s; shutting down", type(error).__name__, error, exc_info=error)
+        self._stop_event.set()
+
+    def _stop_workers(self):
+        for index, process in enumerate(self._processes):
+            if process is not None and process.is_alive():
+                self._queues[index].put(None)
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker %s did not stop in time; terminating", index)
+                process.terminate()
+                process.join()
+        logger.info("All workers stopped")
+
+    def run(self):
+        """Runs the supervisor until SIGINT/SIGTERM."""
+        logger.info("Starting supervisor with %s workers", len(self._queues))
+        try:
+            asyncio.run(self._run())
+        finally:
+            self._stop_workers()
@@ -0,0 +1,55 @@
+# utils/update_processor.py
+"""
+Concurrent update processing that keeps each user's updates in order.
+
+python-telegram-bot handles updates one at a time by default, so a handler
+waiting on the LLM, a rate-limit queue or a profile run would stall every
+user. PerUserUpdateProcessor lets up to CONCURRENT_UPDATES updates run at
+once, but serializes the updates of one user (or chat, for updates without a
+user) so flows, prompts and user_data still see them in arrival order. A
+user's queued updates wait on their own lock before taking one of the
+shared slots, so one user flooding the bot cannot use up the slots.
+"""
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+def update_key(update: object) -> int:
+    """The id whose updates must run in order: the user's, else the chat's, else 0."""
+    if not isinstance(update, Update):
+        return 0
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return 0
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}  # key -> [asyncio.Lock, updates holding or waiting for it]
+
+    async def process_update(self, update: object, coroutine) -> None:
+        key = update_key(update)
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # asyncio.Lock wakes waiters first come, first served, which keeps the user's order
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,238 @@
+# utils/write_journal.py
+"""
+Local write-ahead journal for user document writes.
+
+firebase_client.update_user_data appends each write to a SQLite journal
+(WRITE_JOURNAL_PATH, synchronous commits) before touching Firestore, so a
+write is durable on local disk before the user is told it was saved. If the
+Firestore write succeeds the entry is acknowledged (deleted); if it fails the
+entry stays and the replayer drains it later. Until then get_user_data merges
+a user's pending entries into what Firestore returns, so users see their own
+writes during an outage.
+
+Entries are applied per user in sequence order. An entry is leased while a
+writer works on it, so the direct write path and replayers in other processes
+never apply the same user's entries concurrently or out of order; a write for
+a user who already has pending entries goes straight to the replayer. Every
+applied entry also records its sequence number in the document under
+_journal_seq.<journal id> (the idempotency key), and the replayer skips entries
+the document already has, e.g. after a crash between the write and the ack.
+
+Additions to array fields (goals, expenses) are journaled as ArrayAppend
+values holding only the new items and written with Firestore's ArrayUnion,
+never as the whole array: a writer that read the array during an outage
+would otherwise replay a stale or empty copy over the stored one.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from config import WRITE_JOURNAL_PATH, WRITE_JOURNAL_REPLAY_SECONDS
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_FIELD = "_journal_seq"
+LEASE_SECONDS = 60
+REPLAY_BATCH = 200
+
+class ArrayAppend:
+    """Items to add to an array field; like ArrayUnion, items the array already holds are not added again."""
+    __slots__ = ("items",)
+
+    def __init__(self, items: list):
+        self.items = list(items)
+
+    def __eq__(self, other):
+        return isinstance(other, ArrayAppend) and self.items == other.items
+
+    def __repr__(self):
+        return f"ArrayAppend({self.items!r})"
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, ArrayAppend):
+        return {"__append__": value.items}
+    raise TypeError(f"Cannot journal {type(value).__name__}")
+
+def _decode(obj: dict):
+    if len(obj) == 1 and "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if len(obj) == 1 and "__append__" in obj:
+        return ArrayAppend(obj["__append__"])
+    return obj
+
+def dumps(data: dict) -> str:
+    return json.dumps(data, default=_encode, ensure_ascii=False)
+
+def loads(text: str) -> dict:
+    return json.loads(text, object_hook=_decode)
+
+def merge_into(target: dict, updates: dict) -> dict:
+    """Merges nested dicts the way Firestore's set(merge=True) does, applying ArrayAppend values."""
+    for key, value in updates.items():
+        if isinstance(value, ArrayAppend):
+            current = target.get(key) if isinstance(target.get(key), list) else []
+            target[key] = current + [item for item in value.items if item not in current]
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_into(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+class WriteJournal:
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, data TEXT NOT NULL, "
+            "created_at REAL NOT NULL, lease_until REAL NOT NULL DEFAULT 0, "
+            "attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS journal_user ON journal (user_id, seq)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('journal_id', ?)", (uuid.uuid4().hex[:12],))
+        self.journal_id = conn.execute("SELECT value FROM meta WHERE key = 'journal_id'").fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; worker processes share the file
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            # Commits reach the disk before append() returns
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, user_id: int, data: dict) -> tuple:
+        """
+        Durably records a write. Returns (seq, leased): leased entries are for the
+        caller to apply and then ack() or release(); others are left to the replayer.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            behind = conn.execute("SELECT 1 FROM journal WHERE user_id = ? LIMIT 1", (str(user_id),)).fetchone()
+            lease_until = 0 if behind else time.time() + LEASE_SECONDS
+            seq = conn.execute(
+                "INSERT INTO journal (user_id, data, created_at, lease_until) VALUES (?, ?, ?, ?)",
+                (str(user_id), dumps(data), time.time(), lease_until)
+            ).lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return seq, not behind
+
+    def ack(self, seq: int):
+        self._connection().execute("DELETE FROM journal WHERE seq = ?", (seq,))
+
+    def release(self, seq: int, error: str = None):
+        """Hands an entry back to the replayer, recording the error if writing it failed."""
+        if error is None:
+            self._connection().execute("UPDATE journal SET lease_until = 0 WHERE seq = ?", (seq,))
+            return
+        self._connection().execute(
+            "UPDATE journal SET lease_until = 0, attempts = attempts + 1, last_error = ? WHERE seq = ?",
+            (error[:500], seq)
+        )
+
+    def pending(self, user_id: int) -> list:
+        """A user's unacknowledged writes, oldest first."""
+        rows = self._connection().execute(
+            "SELECT data FROM journal WHERE user_id = ? ORDER BY seq", (str(user_id),)
+        ).fetchall()
+        return [loads(data) for (data,) in rows]
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+    def claim(self, limit: int = REPLAY_BATCH) -> dict:
+        """Leases the oldest pending entries of users nobody else is writing; returns {user_id: [(seq, data)]}."""
+        conn = self._connection()
+        now = time.time()
+        claimed, blocked = {}, set()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT seq, user_id, data, lease_until FROM journal ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+            for seq, user_id, data, lease_until in rows:
+                # A leased entry holds back every later entry of the same user
+                if user_id in blocked or lease_until > now:
+                    blocked.add(user_id)
+                    continue
+                claimed.setdefault(user_id, []).append((seq, loads(data)))
+            seqs = [seq for entries in claimed.values() for seq, _ in entries]
+            conn.executemany("UPDATE journal SET lease_until = ? WHERE seq = ?",
+                             [(now + LEASE_SECONDS, seq) for seq in seqs])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return claimed
+
+def replay(apply) -> int:
+    """
+    Drains pending entries with apply(user_id, [(seq, data)]), which must write
+    them in order and return how many it applied. Stops at the first failure.
+    Returns the number of entries applied.
+    """
+    journal = get_journal()
+    applied_total = 0
+    failed = False
+    for user_id, entries in journal.claim().items():
+        applied, error = 0, None
+        if not failed:
+            try:
+                applied = apply(int(user_id), entries)
+            except Exception as e:
+                # Most likely Firestore is still unavailable; the rest waits for the next round
+                logger.warning("Replaying journal for user %s failed: %s", user_id, e)
+                failed, error = True, str(e)
+        for seq, _ in entries[:applied]:
+            journal.ack(seq)
+        for seq, _ in entries[applied:]:
+            journal.release(seq, error)
+        applied_total += applied
+    if applied_total:
+        metrics.increment("journal.replayed", applied_total)
+        logger.info("Replayed %s journaled writes", applied_total)
+    return applied_total
+
+def schedule(application, apply):
+    """Runs replay(apply) in a worker thread every WRITE_JOURNAL_REPLAY_SECONDS."""
+    async def drain(context) -> None:
+        await asyncio.to_thread(replay, apply)
+
+    if application.job_queue is None:
+        logger.warning("JobQueue unavailable; journaled writes are not replayed in the background")
+        return
+    application.job_queue.run_repeating(drain, interval=WRITE_JOURNAL_REPLAY_SECONDS, first=1)
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_journal() -> WriteJournal:
+    """Returns the write journal, opening it on first use."""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = WriteJournal(WRITE_JOURNAL_PATH)
+    return _journal
+
+metrics.register_gauge("journal.pending", lambda: get_journal().count())